@@ -0,0 +1,123 @@
+"""Motor de alertas de expiração de viaturas (seguro, IPO, vistoria, revisão e KMs).
+
+Calcula os alertas de um lote inteiro de viaturas de uma só vez com arrays NumPy
+(datetime64), em vez de interpretar cada data com `datetime.fromisoformat` por viatura.
+Os limites são parâmetros para que cada endpoint use os seus.
+"""
+from datetime import date
+from typing import Iterable, List, Optional
+
+import numpy as np
+
+# Tipo de alerta -> campo da viatura com a data de expiração
+CAMPOS_DATA = {
+    "seguro": "data_seguro",
+    "ipo": "data_ipo",
+    "vistoria": "data_vistoria",
+    "revisao": "data_proxima_revisao",
+}
+
+KMS_ANTECEDENCIA = 1000
+
+def _data_ou_nat(valor: str) -> np.datetime64:
+    try:
+        return np.datetime64(valor, "D")
+    except ValueError:
+        return np.datetime64("NaT")
+
+
+def datas_para_array(viaturas: List[dict], campos: List[str]) -> np.ndarray:
+    """Datas dos `campos` de todas as viaturas numa matriz datetime64[D] (viatura x campo),
+    com NaT quando a data está vazia ou é inválida.
+
+    As datas são guardadas em ISO ("2026-03-01" ou "2026-03-01T00:00:00Z"): fica só a parte
+    da data, que o NumPy converte de uma vez. Só quando há alguma data inválida (a conversão
+    da lista inteira falha) se converte valor a valor.
+    """
+    valores = [
+        valor[:10] if isinstance(valor, str) else ""
+        for valor in (v.get(c) for v in viaturas for c in campos)
+    ]
+    try:
+        datas = np.array(valores, dtype="datetime64[D]")
+    except ValueError:
+        datas = np.array([_data_ou_nat(valor) for valor in valores], dtype="datetime64[D]")
+    return datas.reshape(len(viaturas), len(campos))
+
+
+def datas_expiracao(viaturas: List[dict], tipos: Iterable[str] = tuple(CAMPOS_DATA)) -> List[dict]:
+    """Datas válidas de cada viatura por tipo ({tipo: date}), na ordem das viaturas"""
+    tipos = list(tipos)
+    if not viaturas:
+        return []
+    matriz = datas_para_array(viaturas, [CAMPOS_DATA[tipo] for tipo in tipos])
+    validas = ~np.isnat(matriz)
+    return [
+        {tipo: data for tipo, data, valida in zip(tipos, linha, linha_validas) if valida}
+        for linha, linha_validas in zip(matriz.tolist(), validas.tolist())
+    ]
+
+
+def calcular_alertas(
+    viaturas: List[dict],
+    hoje: date,
+    dias_antecedencia: int,
+    tipos: Iterable[str] = tuple(CAMPOS_DATA),
+    kms_antecedencia: Optional[int] = None,
+    incluir_kms_ultrapassados: bool = True,
+) -> List[dict]:
+    """Alertas de um lote de viaturas.
+
+    - Alertas de data para cada tipo em `tipos` cuja data expira em `dias_antecedencia`
+      dias ou menos (inclui datas já expiradas).
+    - Com `kms_antecedencia`, alerta de revisão por KMs quando faltam esse número de km
+      ou menos (viaturas com `kms_atual` e `kms_proxima_revisao` definidos);
+      `incluir_kms_ultrapassados=False` ignora revisões já ultrapassadas.
+
+    Devolve dicts {"indice", "tipo", "data", "dias_restantes"} ou {"indice", "tipo": "kms",
+    "kms_restantes"}, ordenados por viatura e pela ordem de `tipos` (KMs no fim).
+    """
+    if not viaturas:
+        return []
+
+    tipos = list(tipos)
+    hoje_np = np.datetime64(hoje, "D")
+    # Cada bloco: (índices das viaturas, ordem do tipo, colunas do alerta já como listas Python)
+    blocos = []
+
+    matriz = datas_para_array(viaturas, [CAMPOS_DATA[tipo] for tipo in tipos])
+    for ordem, tipo in enumerate(tipos):
+        datas = matriz[:, ordem]
+        dias = (datas - hoje_np).astype(np.int64)
+        sel = np.flatnonzero(~np.isnat(datas) & (dias <= dias_antecedencia))
+        if sel.size:
+            blocos.append((sel, ordem, tipo, datas[sel].tolist(), dias[sel].tolist()))
+
+    if kms_antecedencia is not None:
+        kms_atual = np.array([v.get("kms_atual") or 0 for v in viaturas], dtype=np.float64)
+        kms_revisao = np.array([v.get("kms_proxima_revisao") or 0 for v in viaturas], dtype=np.float64)
+        kms_faltam = kms_revisao - kms_atual
+        mascara = (kms_atual != 0) & (kms_revisao != 0) & (kms_faltam <= kms_antecedencia)
+        if not incluir_kms_ultrapassados:
+            mascara &= kms_faltam > 0
+        sel = np.flatnonzero(mascara)
+        if sel.size:
+            blocos.append((sel, len(tipos), "kms", None, kms_faltam[sel].astype(np.int64).tolist()))
+
+    if not blocos:
+        return []
+
+    alertas = []
+    for sel, _, tipo, datas, valores in blocos:
+        if tipo == "kms":
+            alertas.extend({"indice": i, "tipo": tipo, "kms_restantes": k} for i, k in zip(sel.tolist(), valores))
+        else:
+            alertas.extend(
+                {"indice": i, "tipo": tipo, "data": d, "dias_restantes": n}
+                for i, d, n in zip(sel.tolist(), datas, valores)
+            )
+
+    # Ordenar por viatura e, dentro da viatura, pela ordem dos tipos
+    indices = np.concatenate([b[0] for b in blocos])
+    ordens = np.concatenate([np.full(b[0].size, b[1]) for b in blocos])
+    return [alertas[k] for k in np.lexsort((ordens, indices)).tolist()]
@@ -0,0 +1,135 @@
+"""Compressão das respostas HTTP (brotli ou gzip, conforme o Accept-Encoding do cliente).
+
+Middleware ASGI no lugar do GZipMiddleware do Starlette: acrescenta brotli, só comprime tipos
+de conteúdo compressíveis (JSON, CSV, NDJSON, texto) - PDFs, imagens e .xlsx já vêm comprimidos -
+e nas respostas em streaming (exportações CSV/NDJSON) envia cada bloco comprimido logo que chega.
+"""
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Por ordem de preferência quando o cliente aceita ambas
+CODIFICACOES = ("br", "gzip")
+
+TIPOS_COMPRESSIVEIS = ("application/json", "application/x-ndjson", "text/")
+
+
+def escolher_codificacao(accept_encoding: str) -> Optional[str]:
+    """Codificação a usar para um cabeçalho Accept-Encoding (None se nenhuma é aceite)"""
+    aceites = {}
+    for parte in accept_encoding.lower().split(","):
+        nome, _, parametros = parte.strip().partition(";")
+        qualidade = 1.0
+        parametros = parametros.strip()
+        if parametros.startswith("q="):
+            try:
+                qualidade = float(parametros[2:])
+            except ValueError:
+                qualidade = 0.0
+        aceites[nome.strip()] = qualidade
+
+    candidatas = [c for c in CODIFICACOES if aceites.get(c, aceites.get("*", 0)) > 0]
+    if not candidatas:
+        return None
+    # Maior q primeiro; em empate fica a ordem de CODIFICACOES (brotli antes de gzip)
+    return max(candidatas, key=lambda c: (aceites.get(c, aceites.get("*", 0)), -CODIFICACOES.index(c)))
+
+
+def compressivel(headers: Headers) -> bool:
+    tipo = headers.get("content-type", "").lower()
+    return "content-encoding" not in headers and tipo.startswith(TIPOS_COMPRESSIVEIS)
+
+
+class Compressor:
+    """Compressão incremental com a mesma interface para brotli e gzip"""
+
+    def __init__(self, codificacao: str, nivel_gzip: int, qualidade_brotli: int):
+        if codificacao == "br":
+            self._brotli = brotli.Compressor(mode=brotli.MODE_TEXT, quality=qualidade_brotli)
+            self._zlib = None
+        else:
+            self._brotli = None
+            # wbits=31: formato gzip (cabeçalho e CRC) em vez de zlib
+            self._zlib = zlib.compressobj(nivel_gzip, zlib.DEFLATED, 31)
+
+    def comprimir(self, dados: bytes, fim: bool) -> bytes:
+        """Comprimir `dados`; sem `fim` faz flush para o bloco sair já descodificável"""
+        if self._brotli:
+            saida = self._brotli.process(dados)
+            return saida + (self._brotli.finish() if fim else self._brotli.flush())
+        saida = self._zlib.compress(dados)
+        return saida + self._zlib.flush(zlib.Z_FINISH if fim else zlib.Z_SYNC_FLUSH)
+
+
+class CompressaoMiddleware:
+    def __init__(self, app: ASGIApp, minimo: int = 1024, nivel_gzip: int = 6, qualidade_brotli: int = 4):
+        self.app = app
+        self.minimo = minimo
+        self.nivel_gzip = nivel_gzip
+        self.qualidade_brotli = qualidade_brotli
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        codificacao = escolher_codificacao(Headers(scope=scope).get("accept-encoding", ""))
+        if not codificacao:
+            await self.app(scope, receive, send)
+            return
+        await RespostaComprimida(self, codificacao, send)(scope, receive)
+
+
+class RespostaComprimida:
+    """Intercepta as mensagens de uma resposta e decide no primeiro bloco do corpo se a comprime"""
+
+    def __init__(self, config: CompressaoMiddleware, codificacao: str, send: Send):
+        self.config = config
+        self.codificacao = codificacao
+        self.send = send
+        self.inicio: Message = {}
+        self.compressor: Optional[Compressor] = None
+        self.direto = False
+
+    async def __call__(self, scope: Scope, receive: Receive) -> None:
+        await self.config.app(scope, receive, self.enviar)
+
+    async def enviar(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            # O início só sai quando se souber se o corpo vai ser comprimido
+            self.inicio = message
+            self.direto = not compressivel(Headers(raw=message["headers"]))
+            return
+        if message["type"] != "http.response.body" or self.direto:
+            await self._enviar_inicio()
+            await self.send(message)
+            return
+
+        corpo = message.get("body", b"")
+        mais = message.get("more_body", False)
+        if self.compressor is None:
+            if not mais and len(corpo) < self.config.minimo:
+                # Respostas pequenas não compensam a compressão
+                self.direto = True
+                await self._enviar_inicio()
+                await self.send(message)
+                return
+            self.compressor = Compressor(self.codificacao, self.config.nivel_gzip, self.config.qualidade_brotli)
+            headers = MutableHeaders(raw=self.inicio["headers"])
+            headers["Content-Encoding"] = self.codificacao
+            headers.add_vary_header("Accept-Encoding")
+            del headers["Content-Length"]
+            corpo = self.compressor.comprimir(corpo, fim=not mais)
+            if not mais:
+                headers["Content-Length"] = str(len(corpo))
+            await self._enviar_inicio()
+        else:
+            corpo = self.compressor.comprimir(corpo, fim=not mais)
+        await self.send({"type": "http.response.body", "body": corpo, "more_body": mais})
+
+    async def _enviar_inicio(self) -> None:
+        if self.inicio:
+            await self.send(self.inicio)
+            self.inicio = {}
@@ -0,0 +1,89 @@
+"""Renderização do relatório PDF do armazém (ReportLab).
+
+Corre num processo separado (ProcessPoolExecutor): recebe apenas dados simples já lidos
+da base de dados - listas de linhas por secção - e devolve os bytes do PDF, para que o
+`doc.build()` não bloqueie o event loop da API.
+"""
+from io import BytesIO
+from typing import List, Optional
+from xml.sax.saxutils import escape
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4, landscape
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import cm
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+LARANJA = colors.Color(0.976, 0.451, 0.086)
+
+ESTILO_CELULA = ParagraphStyle("celula", fontName="Helvetica", fontSize=8, leading=10)
+
+ESTILO_TABELA = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), LARANJA),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 8),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.Color(0.95, 0.95, 0.95)]),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+])
+
+ESTILO_RESUMO = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), LARANJA),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+
+def _tabela(cabecalho: List[str], linhas: List[list], larguras: Optional[List[float]], estilo) -> Table:
+    # Texto dentro de Paragraph para quebrar linhas longas em vez de sair da página
+    celulas = [[Paragraph(escape(str(v)) if v not in (None, "") else "-", ESTILO_CELULA) for v in linha] for linha in linhas]
+    tabela = Table([cabecalho] + celulas, colWidths=larguras, repeatRows=1)
+    tabela.setStyle(estilo)
+    return tabela
+
+
+def gerar_pdf(titulo: str, gerado_em: str, resumo: List[list], seccoes: List[dict]) -> bytes:
+    """Construir o PDF: página de resumo e uma secção (tabela multi-página) por entrada de `seccoes`.
+
+    Cada secção é {"titulo", "cabecalho", "linhas", "larguras" (em cm, opcional), "vazio"}.
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, pagesize=landscape(A4), title=titulo,
+        leftMargin=1.5 * cm, rightMargin=1.5 * cm, topMargin=1.5 * cm, bottomMargin=1.5 * cm
+    )
+    styles = getSampleStyleSheet()
+
+    def rodape(canvas, doc_):
+        canvas.saveState()
+        canvas.setFont('Helvetica', 8)
+        canvas.drawString(doc_.leftMargin, 0.8 * cm, f"{titulo} - {gerado_em}")
+        canvas.drawRightString(doc_.pagesize[0] - doc_.rightMargin, 0.8 * cm, f"Página {doc_.page}")
+        canvas.restoreState()
+
+    elements = [
+        Paragraph(titulo, styles['Title']),
+        Paragraph(f"Data: {gerado_em}", styles['Normal']),
+        Spacer(1, 20),
+    ]
+    resumo_tabela = Table(resumo)
+    resumo_tabela.setStyle(ESTILO_RESUMO)
+    elements.append(resumo_tabela)
+
+    for seccao in seccoes:
+        elements.append(PageBreak())
+        elements.append(Paragraph(f"{seccao['titulo']} ({len(seccao['linhas'])})", styles['Heading2']))
+        elements.append(Spacer(1, 8))
+        if not seccao["linhas"]:
+            elements.append(Paragraph(seccao.get("vazio", "Sem registos"), styles['Normal']))
+            continue
+        larguras = [largura * cm for largura in seccao["larguras"]] if seccao.get("larguras") else None
+        elements.append(_tabela(seccao["cabecalho"], seccao["linhas"], larguras, ESTILO_TABELA))
+
+    doc.build(elements, onFirstPage=rodape, onLaterPages=rodape)
+    return buffer.getvalue()
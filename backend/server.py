@@ -1,26 +1,48 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Response, UploadFile, File, BackgroundTasks
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Response, UploadFile, File, BackgroundTasks, Query
+from fastapi.responses import FileResponse, ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
+from starlette.background import BackgroundTask
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, DeleteMany, DeleteOne, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
 import os
 import logging
 import asyncio
+import anyio
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
+from collections import Counter, OrderedDict
+import base64
+import csv
+import hashlib
+import json
+import re
+import shutil
+import tempfile
+import time
 import uuid
 from datetime import datetime, timezone, timedelta
+from email.utils import parsedate_to_datetime
+from stat import S_ISREG
 import jwt
 import bcrypt
-from io import BytesIO
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet
+from io import StringIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+import orjson
 from openpyxl import Workbook, load_workbook
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
 import resend
 
+from alertas import calcular_alertas, datas_expiracao, CAMPOS_DATA, KMS_ANTECEDENCIA
+from compressao import CompressaoMiddleware
+from relatorios_pdf import gerar_pdf
+
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
@@ -31,9 +53,38 @@ db = client[os.environ['DB_NAME']]
 resend.api_key = os.environ.get('RESEND_API_KEY', '')
 ALERT_EMAIL = os.environ.get('ALERT_EMAIL', '')
 ALERT_DAYS_BEFORE = int(os.environ.get('ALERT_DAYS_BEFORE', 7))
+# Rejeitar saídas de stock que deixariam o stock negativo
+BLOQUEAR_STOCK_NEGATIVO = os.environ.get('BLOQUEAR_STOCK_NEGATIVO', 'false').lower() in ("1", "true", "sim", "yes")
 SENDER_EMAIL = "onboarding@resend.dev"
+# Jobs de importação concluídos são apagados (índice TTL) ao fim deste número de dias
+JOB_RETENCAO_DIAS = int(os.environ.get('JOB_RETENCAO_DIAS', 7))
+# Processos dedicados à renderização de PDFs
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))
+# Cache de resultados dos relatórios (segundos de validade e número máximo de entradas)
+RELATORIOS_CACHE_TTL = int(os.environ.get('RELATORIOS_CACHE_TTL', 300))
+RELATORIOS_CACHE_MAX = int(os.environ.get('RELATORIOS_CACHE_MAX', 256))
+# max-age (segundos) dos ficheiros em /api/uploads; os nomes são UUIDs que nunca mudam de conteúdo
+UPLOADS_CACHE_MAX_AGE = int(os.environ.get('UPLOADS_CACHE_MAX_AGE', 365 * 24 * 3600))
+# Respostas com corpo abaixo deste número de bytes não são comprimidas
+COMPRESSAO_MINIMO = int(os.environ.get('COMPRESSAO_MINIMO', 1024))
+
+class RespostaJSON(ORJSONResponse):
+    """JSON serializado com orjson; tipos que não conhece (ObjectId, Decimal) saem como texto"""
+    def render(self, content) -> bytes:
+        return orjson.dumps(content, default=str, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY)
+
+def json_pronto(conteudo, response: Optional[Response] = None) -> RespostaJSON:
+    """Resposta JSON sem a passagem pelo jsonable_encoder do FastAPI.
+    
+    Para documentos lidos com {"_id": 0} (só tipos nativos) essa passagem apenas copia a estrutura
+    inteira antes da serialização. Os headers postos por dependências em `response` (ETag) mantêm-se.
+    """
+    resposta = RespostaJSON(conteudo)
+    if response is not None:
+        resposta.headers.raw.extend(response.headers.raw)
+    return resposta
 
-app = FastAPI()
+app = FastAPI(default_response_class=RespostaJSON)
 api_router = APIRouter(prefix="/api")
 security = HTTPBearer()
 
@@ -181,6 +232,23 @@ class DevolverRecursoRequest(BaseModel):
     data_devolucao: Optional[str] = None
     observacoes: str = ""
 
+class RecursoRef(BaseModel):
+    recurso_id: str
+    tipo_recurso: str  # equipamento, viatura
+
+class AtribuirRecursosBulkRequest(BaseModel):
+    recursos: List[RecursoRef]
+    obra_id: str
+    responsavel_levantou: str = ""
+    data_levantamento: Optional[str] = None
+    observacoes: str = ""
+
+class DevolverRecursosBulkRequest(BaseModel):
+    recursos: List[RecursoRef]
+    responsavel_devolveu: str = ""
+    data_devolucao: Optional[str] = None
+    observacoes: str = ""
+
 class Movimento(MovimentoCreate):
     model_config = ConfigDict(extra="ignore")
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -217,6 +285,247 @@ class MovimentoViatura(MovimentoViaturaCreate):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     created_at: str = Field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
+# ==================== DATABASE INDEXES ====================
+# Índices declarados por coleção; garantidos no arranque da aplicação
+INDEXES = {
+    "users": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+    ],
+    "equipamentos": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("codigo", ASCENDING)], name="codigo_unique", unique=True),
+        IndexModel([("obra_id", ASCENDING)], name="obra_id"),
+        IndexModel(
+            [("codigo", TEXT), ("descricao", TEXT), ("marca", TEXT), ("modelo", TEXT),
+             ("categoria", TEXT), ("numero_serie", TEXT)],
+            name="pesquisa_texto",
+            weights={"codigo": 10, "numero_serie": 8, "descricao": 5, "marca": 3, "modelo": 3, "categoria": 2},
+            default_language="portuguese"
+        ),
+    ],
+    "viaturas": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("matricula", ASCENDING)], name="matricula_unique", unique=True),
+        IndexModel([("obra_id", ASCENDING)], name="obra_id"),
+        IndexModel(
+            [("matricula", TEXT), ("marca", TEXT), ("modelo", TEXT)],
+            name="pesquisa_texto",
+            weights={"matricula": 10, "marca": 3, "modelo": 3},
+            default_language="portuguese"
+        ),
+    ],
+    "materiais": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("codigo", ASCENDING)], name="codigo_unique", unique=True),
+        IndexModel([("stock_minimo", ASCENDING)], name="stock_minimo"),
+        IndexModel(
+            [("codigo", TEXT), ("descricao", TEXT)],
+            name="pesquisa_texto",
+            weights={"codigo": 10, "descricao": 5},
+            default_language="portuguese"
+        ),
+    ],
+    "obras": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("codigo", ASCENDING)], name="codigo_unique", unique=True),
+    ],
+    "movimentos": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel(
+            [("recurso_id", ASCENDING), ("tipo_recurso", ASCENDING), ("created_at", DESCENDING)],
+            name="recurso_created_at"
+        ),
+        IndexModel([("obra_id", ASCENDING), ("created_at", DESCENDING)], name="obra_created_at"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "movimentos_stock": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("material_id", ASCENDING), ("data_hora", DESCENDING)], name="material_data_hora"),
+        IndexModel([("obra_id", ASCENDING), ("data_hora", DESCENDING)], name="obra_data_hora"),
+        IndexModel([("data_hora", DESCENDING), ("id", DESCENDING)], name="data_hora_id"),
+    ],
+    "movimentos_viaturas": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("viatura_id", ASCENDING), ("created_at", DESCENDING)], name="viatura_created_at"),
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="created_at_id"),
+    ],
+    "expiracoes": [
+        IndexModel([("viatura_id", ASCENDING), ("tipo", ASCENDING)], name="viatura_tipo_unique", unique=True),
+        IndexModel([("tipo", ASCENDING), ("data", ASCENDING)], name="tipo_data"),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("expira_em", ASCENDING)], name="expira_em_ttl", expireAfterSeconds=0),
+    ],
+}
+
+async def ensure_indexes():
+    """Criar os índices em falta (idempotente; índices já existentes são ignorados)"""
+    for collection_name, indexes in INDEXES.items():
+        collection = db[collection_name]
+        for index in indexes:
+            try:
+                await collection.create_indexes([index])
+            except OperationFailure as e:
+                # Ex.: dados duplicados impedem um índice único - a API continua a funcionar sem ele
+                logger.warning(f"Não foi possível criar o índice {index.document['name']} em {collection_name}: {e}")
+
+# ==================== TRANSACTIONS ====================
+# Transações só existem em replica sets / sharded clusters; detetado no arranque
+TRANSACOES_DISPONIVEIS = False
+
+async def detetar_transacoes() -> bool:
+    try:
+        hello = await client.admin.command("hello")
+    except OperationFailure as e:
+        logger.warning(f"Não foi possível detetar o tipo de deployment do MongoDB: {e}")
+        return False
+    return bool(hello.get("setName")) or hello.get("msg") == "isdbgrid"
+
+async def executar_transacao(operacao):
+    """Executar `operacao(session)` numa transação quando disponível (senão com session=None)"""
+    if not TRANSACOES_DISPONIVEIS:
+        return await operacao(None)
+    async with await client.start_session() as session:
+        # with_transaction repete a operação em erros transitórios (ex.: conflitos de escrita)
+        return await session.with_transaction(operacao)
+
+# ==================== PAGINATION ====================
+PAGE_SIZE_DEFAULT = 50
+PAGE_SIZE_MAX = 200
+# Limite da lista completa (pedidos sem limit nem after) usada pelas páginas que ainda não paginam
+LISTA_COMPLETA_MAX = int(os.environ.get('LISTA_COMPLETA_MAX', 5000))
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+def decode_cursor(cursor: str) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    if not isinstance(values, list):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    return values
+
+def keyset_filter(sort: list, values: list) -> dict:
+    """Filtro que devolve os documentos estritamente depois de `values` na ordenação `sort`"""
+    if len(values) != len(sort):
+        raise HTTPException(status_code=400, detail="Cursor inválido")
+    
+    condicoes = []
+    for i, (campo, direcao) in enumerate(sort):
+        condicao = {sort[j][0]: values[j] for j in range(i)}
+        condicao[campo] = {"$gt" if direcao == ASCENDING else "$lt": values[i]}
+        condicoes.append(condicao)
+    return {"$or": condicoes}
+
+async def paginate(
+    collection,
+    query: dict,
+    sort: list,
+    limit: Optional[int],
+    after: Optional[str],
+    total: bool = False,
+    projection: Optional[dict] = None,
+    transform=None,
+    response: Optional[Response] = None
+):
+    """Listagem com paginação keyset sobre uma ordenação indexada.
+    
+    Sem `limit` nem `after` devolve a lista completa, até LISTA_COMPLETA_MAX documentos; quando
+    corta, avisa o cliente em `response` com X-Truncated e X-Total-Count. Caso contrário devolve
+    {"items", "next_cursor", "total"} com no máximo `limit` documentos.
+    """
+    projection = projection or {"_id": 0}
+    
+    if limit is None and after is None:
+        items = await collection.find(query, projection).sort(sort).limit(LISTA_COMPLETA_MAX + 1).to_list(None)
+        if len(items) > LISTA_COMPLETA_MAX:
+            logger.warning(f"Lista completa de {collection.name} truncada a {LISTA_COMPLETA_MAX} documentos; usar limit/after")
+            items = items[:LISTA_COMPLETA_MAX]
+            if response is not None:
+                response.headers["X-Truncated"] = "true"
+                response.headers["X-Total-Count"] = str(await collection.count_documents(query))
+        return [transform(item) for item in items] if transform else items
+    
+    limit = limit or PAGE_SIZE_DEFAULT
+    page_query = query
+    if after:
+        page_query = {"$and": [query, keyset_filter(sort, decode_cursor(after))]} if query else keyset_filter(sort, decode_cursor(after))
+    
+    items = await collection.find(page_query, projection).sort(sort).limit(limit + 1).to_list(limit + 1)
+    
+    next_cursor = None
+    if len(items) > limit:
+        items = items[:limit]
+        next_cursor = encode_cursor([items[-1].get(campo) for campo, _ in sort])
+    if transform:
+        items = [transform(item) for item in items]
+    
+    return {
+        "items": items,
+        "next_cursor": next_cursor,
+        "total": await collection.count_documents(query) if total else None
+    }
+
+# ==================== SEARCH ====================
+async def search_collection(
+    collection,
+    q: str,
+    key_field: str,
+    limit: int,
+    after: Optional[str],
+    transform=None
+):
+    """Pesquisa ordenada por relevância: primeiro os documentos cujo campo chave começa
+    pelo termo (índice único), depois os resultados do índice de texto por textScore.
+    
+    Limitação: fora do prefixo do campo chave, $text só encontra palavras inteiras (após
+    stemming) - "Bosc" não encontra "Bosch" nem um fragmento encontra um nº de série. Uma
+    pesquisa por substring obrigaria a percorrer a coleção inteira.
+    
+    O cursor `after` guarda o deslocamento na lista ordenada.
+    """
+    offset = 0
+    if after:
+        values = decode_cursor(after)
+        if len(values) != 1 or not isinstance(values[0], int) or values[0] < 0:
+            raise HTTPException(status_code=400, detail="Cursor inválido")
+        offset = values[0]
+    
+    termo = q.strip()
+    janela = offset + limit + 1
+    prefixos = [re.compile("^" + re.escape(termo)), re.compile("^" + re.escape(termo.upper()))]
+    # Hífens e aspas têm significado especial em $text (negação/frase)
+    termo_texto = re.sub(r'[-"]', " ", termo)
+    
+    por_prefixo, por_texto = await asyncio.gather(
+        collection.find({key_field: {"$in": prefixos}}, {"_id": 0})
+            .sort(key_field, ASCENDING).limit(janela).to_list(janela),
+        collection.find({"$text": {"$search": termo_texto}}, {"_id": 0, "score": {"$meta": "textScore"}})
+            .sort([("score", {"$meta": "textScore"})]).limit(janela).to_list(janela)
+    )
+    
+    vistos = set()
+    resultados = []
+    for item in por_prefixo + por_texto:
+        if item["id"] in vistos:
+            continue
+        vistos.add(item["id"])
+        item.pop("score", None)
+        resultados.append(item)
+    
+    items = resultados[offset:offset + limit]
+    if transform:
+        items = [transform(item) for item in items]
+    
+    return {
+        "items": items,
+        "next_cursor": encode_cursor([offset + limit]) if len(resultados) > offset + limit else None
+    }
+
 # ==================== AUTH FUNCTIONS ====================
 def hash_password(password: str) -> str:
     return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
@@ -341,103 +650,562 @@ async def get_me(user=Depends(get_current_user)):
     return UserResponse(id=user["id"], name=user["name"], email=user["email"])
 
 # ==================== UPLOAD ROUTES ====================
-@api_router.post("/upload")
-async def upload_file(file: UploadFile = File(...), user=Depends(get_current_user)):
-    if not file.content_type.startswith("image/"):
-        raise HTTPException(status_code=400, detail="Only image files are allowed")
-    
-    ext = file.filename.split(".")[-1] if "." in file.filename else "jpg"
-    filename = f"{uuid.uuid4()}.{ext}"
-    filepath = UPLOAD_DIR / filename
-    
-    content = await file.read()
-    with open(filepath, "wb") as f:
-        f.write(content)
-    
+UPLOAD_MAX_IMAGEM = 5 * 1024 * 1024
+UPLOAD_MAX_PDF = 10 * 1024 * 1024
+# Margem para os cabeçalhos multipart na verificação antecipada do Content-Length
+UPLOAD_FOLGA_MULTIPART = 16 * 1024
+
+# O tipo de ficheiro é decidido pelos primeiros bytes (magic bytes), não pelo content_type do cliente
+BYTES_ASSINATURA = 12
+ASSINATURAS_IMAGEM = {
+    "jpg": lambda c: c.startswith(b"\xff\xd8\xff"),
+    "png": lambda c: c.startswith(b"\x89PNG\r\n\x1a\n"),
+    "gif": lambda c: c[:6] in (b"GIF87a", b"GIF89a"),
+    "webp": lambda c: c[:4] == b"RIFF" and c[8:12] == b"WEBP",
+}
+ASSINATURAS_PDF = {"pdf": lambda c: c.startswith(b"%PDF-")}
+
+# Corpo do pedido para a documentação OpenAPI (os handlers leem o multipart diretamente)
+OPENAPI_UPLOAD = {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {
+    "type": "object", "required": ["file"], "properties": {"file": {"type": "string", "format": "binary"}}
+}}}}}
+
+class UploadStreaming:
+    """Receção do campo `file` de um pedido multipart direto para UPLOAD_DIR.
+    
+    O corpo é processado à medida que chega (MultipartParser do python-multipart) e escrito em
+    disco fora do event loop, sem nunca ter o ficheiro inteiro em memória. O pedido é abortado
+    logo que o ficheiro passa o `limite` ou que os primeiros bytes não correspondem a nenhuma
+    das `assinaturas`; nesses casos o ficheiro parcial é apagado.
+    """
+    def __init__(self, assinaturas: dict, limite: int, erro_tipo: str, erro_tamanho: str):
+        self.assinaturas = assinaturas
+        self.limite = limite
+        self.erro_tipo = erro_tipo
+        self.erro_tamanho = erro_tamanho
+        self.cabecalhos = {}
+        self.cabecalho_nome = b""
+        self.cabecalho_valor = b""
+        self.no_ficheiro = False
+        self.original_name = None
+        self.completo = False
+        self.pendente = bytearray()
+        self.tamanho = 0
+        self.filename = None
+        self.ficheiro = None
+
+    # Callbacks do parser (síncronos): só acumulam; a escrita é feita em `receber`
+    def on_part_begin(self):
+        self.cabecalhos = {}
+
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.cabecalho_nome += data[start:end]
+
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.cabecalho_valor += data[start:end]
+
+    def on_header_end(self):
+        self.cabecalhos[self.cabecalho_nome.lower()] = self.cabecalho_valor
+        self.cabecalho_nome = self.cabecalho_valor = b""
+
+    def on_headers_finished(self):
+        _, opcoes = parse_options_header(self.cabecalhos.get(b"content-disposition", b""))
+        # Só conta o primeiro campo `file`; outros campos do formulário são ignorados
+        self.no_ficheiro = opcoes.get(b"name") == b"file" and self.original_name is None
+        if self.no_ficheiro:
+            self.original_name = opcoes.get(b"filename", b"").decode("utf-8", "replace")
+
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.no_ficheiro:
+            self.pendente += data[start:end]
+            self.tamanho += end - start
+
+    def on_part_end(self):
+        if self.no_ficheiro:
+            self.no_ficheiro = False
+            self.completo = True
+
+    async def _escrever(self):
+        if self.tamanho > self.limite:
+            raise HTTPException(status_code=400, detail=self.erro_tamanho)
+        if self.ficheiro is None:
+            if not self.completo and len(self.pendente) < BYTES_ASSINATURA:
+                return
+            cabeca = bytes(self.pendente[:BYTES_ASSINATURA])
+            ext = next((ext for ext, corresponde in self.assinaturas.items() if corresponde(cabeca)), None)
+            if not ext:
+                raise HTTPException(status_code=400, detail=self.erro_tipo)
+            self.filename = f"{uuid.uuid4()}.{ext}"
+            self.ficheiro = await asyncio.to_thread(open, UPLOAD_DIR / self.filename, "wb")
+        if self.pendente:
+            dados, self.pendente = bytes(self.pendente), bytearray()
+            await asyncio.to_thread(self.ficheiro.write, dados)
+
+    async def receber(self, request: Request) -> tuple:
+        """Gravar o ficheiro do pedido; devolve (nome gravado, nome original)"""
+        tamanho_pedido = request.headers.get("content-length", "")
+        if tamanho_pedido.isdigit() and int(tamanho_pedido) > self.limite + UPLOAD_FOLGA_MULTIPART:
+            raise HTTPException(status_code=400, detail=self.erro_tamanho)
+        content_type, opcoes = parse_options_header(request.headers.get("content-type", ""))
+        if content_type != b"multipart/form-data" or not opcoes.get(b"boundary"):
+            raise HTTPException(status_code=400, detail="Pedido multipart inválido")
+        
+        parser = MultipartParser(opcoes[b"boundary"], callbacks={
+            nome: getattr(self, nome) for nome in (
+                "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+                "on_headers_finished", "on_part_data", "on_part_end"
+            )
+        })
+        try:
+            async for bloco in request.stream():
+                parser.write(bloco)
+                await self._escrever()
+            parser.finalize()
+            if self.original_name is None:
+                raise HTTPException(status_code=400, detail="Ficheiro em falta")
+            if not self.completo:
+                raise HTTPException(status_code=400, detail="Pedido multipart inválido")
+            await self._escrever()
+            await asyncio.to_thread(self.ficheiro.close)
+        except MultipartParseError:
+            await self._descartar()
+            raise HTTPException(status_code=400, detail="Pedido multipart inválido")
+        except BaseException:
+            await self._descartar()
+            raise
+        return self.filename, self.original_name
+
+    async def _descartar(self):
+        if self.ficheiro is not None:
+            await asyncio.to_thread(self.ficheiro.close)
+            (UPLOAD_DIR / self.filename).unlink(missing_ok=True)
+
+@api_router.post("/upload", openapi_extra=OPENAPI_UPLOAD)
+async def upload_file(request: Request, user=Depends(get_current_user)):
+    filename, _ = await UploadStreaming(
+        ASSINATURAS_IMAGEM, UPLOAD_MAX_IMAGEM, "Only image files are allowed", "Ficheiro demasiado grande (máx. 5MB)"
+    ).receber(request)
     return {"url": f"/api/uploads/{filename}", "filename": filename}
 
-@api_router.post("/upload/pdf")
-async def upload_pdf(file: UploadFile = File(...), user=Depends(get_current_user)):
+@api_router.post("/upload/pdf", openapi_extra=OPENAPI_UPLOAD)
+async def upload_pdf(request: Request, user=Depends(get_current_user)):
     """Upload PDF documents (manuals, certificates, etc.)"""
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="Apenas ficheiros PDF são permitidos")
-    
-    # Max 10MB
-    content = await file.read()
-    if len(content) > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="Ficheiro demasiado grande (máx. 10MB)")
-    
-    filename = f"{uuid.uuid4()}.pdf"
-    filepath = UPLOAD_DIR / filename
-    
-    with open(filepath, "wb") as f:
-        f.write(content)
-    
-    return {"url": f"/api/uploads/{filename}", "filename": filename, "original_name": file.filename}
+    filename, original_name = await UploadStreaming(
+        ASSINATURAS_PDF, UPLOAD_MAX_PDF, "Apenas ficheiros PDF são permitidos", "Ficheiro demasiado grande (máx. 10MB)"
+    ).receber(request)
+    return {"url": f"/api/uploads/{filename}", "filename": filename, "original_name": original_name}
+
+UPLOAD_TIPOS = {
+    "jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png",
+    "gif": "image/gif", "webp": "image/webp", "pdf": "application/pdf"
+}
+UPLOAD_BLOCO_LEITURA = 64 * 1024
+
+def intervalo_pedido(range_header: str, tamanho: int) -> Optional[tuple]:
+    """Intervalo (início, fim inclusive) de um cabeçalho Range com um só intervalo de bytes.
+    
+    None quando não se aplica (outra unidade, vários intervalos ou sintaxe inválida): serve-se
+    o ficheiro inteiro. Intervalos fora do ficheiro dão 416.
+    """
+    unidade, _, especificacao = range_header.partition("=")
+    inicio, separador, fim = especificacao.strip().partition("-")
+    if unidade.strip().lower() != "bytes" or "," in especificacao or not separador:
+        return None
+    try:
+        if inicio:
+            inicio, fim = int(inicio), int(fim) if fim else None
+            if fim is None:
+                fim = tamanho - 1
+            elif fim < inicio:
+                return None
+        else:
+            # Sufixo "-N": os últimos N bytes ("-0" não é satisfazível)
+            sufixo = int(fim)
+            inicio, fim = max(tamanho - sufixo, 0) if sufixo else tamanho, tamanho - 1
+    except ValueError:
+        return None
+    if inicio >= tamanho:
+        raise HTTPException(status_code=416, detail="Intervalo inválido", headers={"Content-Range": f"bytes */{tamanho}"})
+    return inicio, min(fim, tamanho - 1)
+
+def modificado_desde(request: Request, mtime: float) -> bool:
+    """Falso quando o pedido traz If-Modified-Since igual ou posterior a `mtime`"""
+    valor = request.headers.get("if-modified-since")
+    if not valor:
+        return True
+    try:
+        data = parsedate_to_datetime(valor)
+    except (TypeError, ValueError):
+        return True
+    return int(mtime) > data.timestamp()
+
+async def ler_intervalo(filepath: Path, inicio: int, fim: int):
+    async with await anyio.open_file(filepath, "rb") as f:
+        await f.seek(inicio)
+        restante = fim - inicio + 1
+        while restante > 0:
+            bloco = await f.read(min(UPLOAD_BLOCO_LEITURA, restante))
+            if not bloco:
+                break
+            restante -= len(bloco)
+            yield bloco
 
 @api_router.get("/uploads/{filename}")
-async def get_upload(filename: str):
+async def get_upload(filename: str, request: Request):
+    """Servir um ficheiro carregado.
+    
+    Os nomes são UUIDs e nunca são reescritos, por isso a resposta é cacheável para sempre
+    (immutable). Suporta GET condicional (ETag / Last-Modified) e pedidos Range de um intervalo,
+    para os browsers lerem manuais PDF grandes por partes.
+    """
     filepath = UPLOAD_DIR / filename
-    if not filepath.exists():
+    try:
+        estado = await asyncio.to_thread(filepath.stat)
+    except OSError:
+        raise HTTPException(status_code=404, detail="File not found")
+    if filepath.parent != UPLOAD_DIR or not S_ISREG(estado.st_mode):
         raise HTTPException(status_code=404, detail="File not found")
     
-    ext = filename.split(".")[-1].lower()
-    content_types = {
-        "jpg": "image/jpeg", "jpeg": "image/jpeg", "png": "image/png", 
-        "gif": "image/gif", "webp": "image/webp", "pdf": "application/pdf"
-    }
+    media_type = UPLOAD_TIPOS.get(filename.split(".")[-1].lower(), "application/octet-stream")
+    # O FileResponse envia o ficheiro em blocos (ou com http.response.pathsend, se o servidor o suportar)
+    resposta = FileResponse(filepath, media_type=media_type, stat_result=estado)
+    resposta.headers["Cache-Control"] = f"public, max-age={UPLOADS_CACHE_MAX_AGE}, immutable"
+    resposta.headers["Accept-Ranges"] = "bytes"
+    validadores = {campo: resposta.headers[campo] for campo in ("etag", "last-modified", "cache-control", "accept-ranges")}
     
-    with open(filepath, "rb") as f:
-        content = f.read()
+    nao_modificado = (
+        etag_corresponde(request, validadores["etag"]) if "if-none-match" in request.headers
+        else not modificado_desde(request, estado.st_mtime)
+    )
+    if nao_modificado:
+        return Response(status_code=304, headers=validadores)
+    
+    # If-Range: só responde com o intervalo se a cópia parcial do cliente ainda for a atual
+    if_range = request.headers.get("if-range")
+    intervalo = None
+    if "range" in request.headers and (not if_range or if_range in (validadores["etag"], validadores["last-modified"])):
+        intervalo = intervalo_pedido(request.headers["range"], estado.st_size)
+    if intervalo is None:
+        return resposta
+    
+    inicio, fim = intervalo
+    return StreamingResponse(
+        ler_intervalo(filepath, inicio, fim), status_code=206, media_type=media_type,
+        headers={
+            **validadores,
+            "Content-Range": f"bytes {inicio}-{fim}/{estado.st_size}",
+            "Content-Length": str(fim - inicio + 1)
+        }
+    )
+
+# ==================== DASHBOARD STATS ====================
+# Contadores do dashboard mantidos incrementalmente na coleção `stats` (um documento por tipo).
+# Cada campo tem a contribuição de um documento (Python) e a expressão $group equivalente (rebuild).
+def _stat_total():
+    return (lambda doc: 1, {"$sum": 1})
+
+def _stat_flag(predicado, condicao: dict):
+    return (lambda doc: int(predicado(doc)), {"$sum": {"$cond": [condicao, 1, 0]}})
+
+def _stat_ativo(campo: str):
+    return _stat_flag(lambda doc: doc.get(campo) is not False, {"$ne": [f"${campo}", False]})
+
+_STAT_EM_OBRA = _stat_flag(lambda doc: doc.get("obra_id") not in (None, ""), {"$not": [{"$in": [{"$ifNull": ["$obra_id", None]}, [None, ""]]}]})
+_STAT_EM_MANUTENCAO = _stat_flag(lambda doc: bool(doc.get("em_manutencao")), "$em_manutencao")
+
+STATS_CAMPOS = {
+    "equipamentos": {
+        "total": _stat_total(),
+        "ativos": _stat_ativo("ativo"),
+        "em_obra": _STAT_EM_OBRA,
+        "em_manutencao": _STAT_EM_MANUTENCAO,
+    },
+    "viaturas": {
+        "total": _stat_total(),
+        "ativas": _stat_ativo("ativa"),
+        "em_obra": _STAT_EM_OBRA,
+        "em_manutencao": _STAT_EM_MANUTENCAO,
+    },
+    "materiais": {
+        "total": _stat_total(),
+        "stock_total": (lambda doc: doc.get("stock_atual") or 0, {"$sum": "$stock_atual"}),
+    },
+    "obras": {
+        "total": _stat_total(),
+        "ativas": _stat_flag(lambda doc: doc.get("estado") == "Ativa", {"$eq": ["$estado", "Ativa"]}),
+    },
+}
+
+def stats_delta(tipo: str, antes: Optional[dict] = None, depois: Optional[dict] = None) -> dict:
+    """Variação dos contadores quando um documento passa de `antes` para `depois` (None = não existe)"""
+    delta = {}
+    for campo, (contrib, _) in STATS_CAMPOS[tipo].items():
+        valor = (contrib(depois) if depois else 0) - (contrib(antes) if antes else 0)
+        if valor:
+            delta[campo] = valor
+    return delta
+
+async def inc_stats(tipo: str, delta: dict):
+    # Todas as escritas nas coleções de recursos passam por aqui: a versão de dados sobe sempre
+    await db.stats.update_one({"_id": tipo}, {"$inc": {**delta, "versao": 1}}, upsert=True)
+
+async def track_stats(tipo: str, antes: Optional[dict] = None, depois: Optional[dict] = None):
+    await inc_stats(tipo, stats_delta(tipo, antes, depois))
+
+async def rebuild_stats() -> dict:
+    """Recalcular todos os contadores a partir das coleções"""
+    resultado = {}
+    for tipo, campos in STATS_CAMPOS.items():
+        grupo = await db[tipo].aggregate([
+            {"$group": {"_id": None, **{campo: expr for campo, (_, expr) in campos.items()}}}
+        ]).to_list(1)
+        valores = {campo: (grupo[0].get(campo, 0) if grupo else 0) for campo in campos}
+        await db.stats.update_one({"_id": tipo}, {"$set": valores}, upsert=True)
+        resultado[tipo] = valores
+    return resultado
+
+# ==================== VERSÕES DE DADOS ====================
+# Cada documento de stats guarda também `versao`, incrementada em cada escrita na coleção
+# (via inc_stats nos recursos, bump_versoes nos movimentos): carimbo para resultados em cache
+async def bump_versoes(*colecoes: str):
+    await db.stats.bulk_write([UpdateOne({"_id": c}, {"$inc": {"versao": 1}}, upsert=True) for c in colecoes])
+
+async def versoes_dados(*colecoes: str) -> tuple:
+    """Versões atuais das coleções, pela ordem pedida (0 se ainda não houve escritas)"""
+    docs = await db.stats.find({"_id": {"$in": list(colecoes)}}, {"versao": 1}).to_list(None)
+    versoes = {doc["_id"]: doc.get("versao", 0) for doc in docs}
+    return tuple(versoes.get(c, 0) for c in colecoes)
+
+# ==================== CACHE DE RELATÓRIOS ====================
+class CacheRelatorios:
+    """Cache TTL + LRU em memória dos resultados dos relatórios, com chave (endpoint, filtros).
+    
+    Cada entrada guarda as versões das coleções de que o relatório depende: uma escrita numa
+    dessas coleções sobe a versão e a entrada deixa de servir, sem ser preciso apagá-la.
+    """
     
-    return Response(content=content, media_type=content_types.get(ext, "application/octet-stream"))
+    def __init__(self, max_entradas: int, ttl: float):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.entradas = OrderedDict()  # chave -> (expira_em, versões, resultado)
+        self.metricas = Counter()
+    
+    def obter(self, chave, versoes: tuple):
+        """Resultado guardado para a chave, ou None se não existe, expirou ou ficou desatualizado"""
+        entrada = self.entradas.get(chave)
+        if entrada is None:
+            self.metricas["misses"] += 1
+            return None
+        expira_em, versoes_entrada, resultado = entrada
+        if expira_em < time.monotonic() or versoes_entrada != versoes:
+            del self.entradas[chave]
+            self.metricas["expiradas" if versoes_entrada == versoes else "invalidadas"] += 1
+            self.metricas["misses"] += 1
+            return None
+        self.entradas.move_to_end(chave)
+        self.metricas["hits"] += 1
+        return resultado
+    
+    def guardar(self, chave, versoes: tuple, resultado):
+        self.entradas[chave] = (time.monotonic() + self.ttl, versoes, resultado)
+        self.entradas.move_to_end(chave)
+        while len(self.entradas) > self.max_entradas:
+            self.entradas.popitem(last=False)
+            self.metricas["removidas"] += 1
+    
+    def limpar(self):
+        self.entradas.clear()
+    
+    def estado(self) -> dict:
+        pedidos = self.metricas["hits"] + self.metricas["misses"]
+        return {
+            "entradas": len(self.entradas),
+            "max_entradas": self.max_entradas,
+            "ttl": self.ttl,
+            "hits": self.metricas["hits"],
+            "misses": self.metricas["misses"],
+            "taxa_hits": round(self.metricas["hits"] / pedidos, 4) if pedidos else None,
+            "expiradas": self.metricas["expiradas"],
+            "invalidadas": self.metricas["invalidadas"],
+            "removidas": self.metricas["removidas"],
+        }
 
-# ==================== EQUIPAMENTO ROUTES ====================
-@api_router.get("/equipamentos")
-async def get_equipamentos(user=Depends(get_current_user)):
-    items = await db.equipamentos.find({}, {"_id": 0}).to_list(1000)
-    # Garantir que os campos novos têm valores por defeito
-    for item in items:
-        item.setdefault("em_manutencao", False)
-        item.setdefault("descricao_avaria", "")
-        item.setdefault("manual_url", "")
-        item.setdefault("certificado_url", "")
-        item.setdefault("ficha_manutencao_url", "")
-    return items
-
-@api_router.get("/equipamentos/{equipamento_id}")
-async def get_equipamento(equipamento_id: str, user=Depends(get_current_user)):
-    item = await db.equipamentos.find_one({"id": equipamento_id}, {"_id": 0})
-    if not item:
-        raise HTTPException(status_code=404, detail="Equipamento não encontrado")
+relatorios_cache = CacheRelatorios(RELATORIOS_CACHE_MAX, RELATORIOS_CACHE_TTL)
+
+async def relatorio_em_cache(endpoint: str, filtros: dict, colecoes: tuple, calcular):
+    """Servir o relatório da cache ou calculá-lo com `calcular()` e guardá-lo.
     
-    # Garantir que os campos novos têm valores por defeito
+    A versão das `colecoes` é lida antes do cálculo: uma escrita a meio invalida logo o resultado.
+    """
+    chave = (endpoint, tuple(sorted(filtros.items())))
+    versoes = await versoes_dados(*colecoes)
+    resultado = relatorios_cache.obter(chave, versoes)
+    if resultado is None:
+        resultado = await calcular()
+        relatorios_cache.guardar(chave, versoes, resultado)
+    return resultado
+
+# ==================== GET CONDICIONAL (ETag) ====================
+def etag_pedido(request: Request, versoes: tuple) -> str:
+    # O dia entra na chave: detalhes de viaturas calculam alertas em relação a hoje
+    hoje = datetime.now(timezone.utc).date().isoformat()
+    chave = f"{request.url.path}?{request.url.query}|{versoes}|{hoje}"
+    return f'W/"{hashlib.sha1(chave.encode()).hexdigest()[:24]}"'
+
+def etag_corresponde(request: Request, etag: str) -> bool:
+    """If-None-Match do pedido inclui `etag` (comparação fraca: ignora o prefixo W/)"""
+    pedidas = [valor.strip().removeprefix("W/") for valor in request.headers.get("if-none-match", "").split(",")]
+    return etag.removeprefix("W/") in pedidas or "*" in pedidas
+
+def condicional(*colecoes: str):
+    """Dependência para GETs cujo resultado só muda com escritas nas `colecoes`.
+    
+    O ETag sai das versões de dados das coleções (sem ler nem serializar os documentos);
+    se o cliente envia If-None-Match com o mesmo ETag a resposta é 304 sem corpo.
+    """
+    async def verificar(request: Request, response: Response, user=Depends(get_current_user)):
+        etag = etag_pedido(request, await versoes_dados(*colecoes))
+        # no-cache: o browser guarda a resposta mas revalida-a sempre com If-None-Match
+        headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if etag_corresponde(request, etag):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return verificar
+
+# ==================== EXPIRAÇÕES ====================
+# Calendário derivado das viaturas: um documento por (viatura_id, tipo) com a data como Date
+# do BSON, para que "expira nos próximos N dias" seja um range scan no índice tipo_data.
+# Inclui as viaturas inativas (o /summary continua a alertá-las); quem só quer as ativas filtra nas viaturas.
+def expiracoes_ops(viaturas: list, agora: Optional[datetime] = None) -> list:
+    """Operações que põem o calendário de expirações em linha com os documentos das viaturas"""
+    agora = agora or datetime.now(timezone.utc)
+    ops = []
+    for viatura, datas in zip(viaturas, datas_expiracao(viaturas)):
+        for tipo in CAMPOS_DATA:
+            filtro = {"viatura_id": viatura["id"], "tipo": tipo}
+            if tipo in datas:
+                data = datetime.combine(datas[tipo], datetime.min.time(), tzinfo=timezone.utc)
+                ops.append(UpdateOne(filtro, {"$set": {"data": data, "atualizado_em": agora}}, upsert=True))
+            else:
+                ops.append(DeleteOne(filtro))
+    return ops
+
+async def sync_expiracoes(viaturas: list = (), removidas: list = (), agora: Optional[datetime] = None):
+    """Atualizar as expirações de viaturas criadas/alteradas e remover as de viaturas eliminadas"""
+    ops = expiracoes_ops(list(viaturas), agora)
+    if removidas:
+        ops.append(DeleteMany({"viatura_id": {"$in": list(removidas)}}))
+    if ops:
+        await db.expiracoes.bulk_write(ops, ordered=False)
+
+async def rebuild_expiracoes() -> int:
+    """Reconstruir o calendário de expirações a partir da coleção de viaturas.
+
+    As entradas são reescritas por cima das atuais e só no fim se apagam as que ficaram por
+    tocar (viaturas que já não existem), para o /alerts/check nunca ver o calendário vazio.
+    """
+    inicio = datetime.now(timezone.utc)
+    projection = {"_id": 0, "id": 1, **{campo: 1 for campo in CAMPOS_DATA.values()}}
+    lote = []
+    async for viatura in db.viaturas.find({}, projection):
+        lote.append(viatura)
+        if len(lote) == 1000:
+            await sync_expiracoes(lote, agora=inicio)
+            lote = []
+    await sync_expiracoes(lote, agora=inicio)
+    # Entradas escritas durante a reconstrução (por ela ou por pedidos concorrentes) têm atualizado_em >= inicio
+    await db.expiracoes.delete_many({"atualizado_em": {"$not": {"$gte": inicio}}})
+    return await db.expiracoes.count_documents({})
+
+async def viaturas_a_expirar(
+    tipos, dias: int, hoje, projection: Optional[dict] = None, extra: Optional[dict] = None, apenas_ativas: bool = True
+) -> list:
+    """Viaturas com alguma data de `tipos` até `dias` dias após `hoje` (inclui expiradas).
+
+    `extra` acrescenta (em $or) outro critério sobre as viaturas, ex. revisão por KMs.
+    Com `apenas_ativas=False` também devolve as viaturas inativas.
+    """
+    limite = datetime.combine(hoje + timedelta(days=dias + 1), datetime.min.time(), tzinfo=timezone.utc)
+    ids = await db.expiracoes.distinct("viatura_id", {"tipo": {"$in": list(tipos)}, "data": {"$lt": limite}})
+    criterios = [{"id": {"$in": ids}}] + ([extra] if extra else [])
+    query = {"$or": criterios} if len(criterios) > 1 else criterios[0]
+    if apenas_ativas:
+        query = {"ativa": True, **query}
+    return await db.viaturas.find(query, projection or {"_id": 0}).sort("matricula", ASCENDING).to_list(None)
+
+# ==================== OBRA LOOKUP ====================
+async def get_obras_map(obra_ids, projection: Optional[dict] = None) -> dict:
+    """Carregar várias obras numa só query ($in), indexadas por id"""
+    ids = list({obra_id for obra_id in obra_ids if obra_id})
+    if not ids:
+        return {}
+    # Projeções de inclusão precisam de incluir o id para construir o mapa
+    projection = {**projection, "id": 1} if projection else {"_id": 0}
+    obras = await db.obras.find({"id": {"$in": ids}}, projection).to_list(None)
+    return {obra["id"]: obra for obra in obras}
+
+def enrich_obra(movimentos: list, obras_map: dict):
+    """Acrescentar obra_nome/obra_codigo aos movimentos a partir de um mapa de obras"""
+    for mov in movimentos:
+        obra_mov = obras_map.get(mov.get("obra_id"))
+        if obra_mov:
+            mov["obra_nome"] = obra_mov.get("nome", "")
+            mov["obra_codigo"] = obra_mov.get("codigo", "")
+    return movimentos
+
+# ==================== EQUIPAMENTO ROUTES ====================
+def set_equipamento_defaults(item):
+    """Garantir valores por defeito nos campos novos"""
     item.setdefault("em_manutencao", False)
     item.setdefault("descricao_avaria", "")
     item.setdefault("manual_url", "")
     item.setdefault("certificado_url", "")
     item.setdefault("ficha_manutencao_url", "")
+    return item
+
+@api_router.get("/equipamentos", dependencies=[Depends(condicional("equipamentos"))])
+async def get_equipamentos(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(
+        db.equipamentos, {}, [("codigo", ASCENDING)], limit, after, total,
+        transform=set_equipamento_defaults, response=response
+    ), response)
+
+@api_router.get("/equipamentos/search")
+async def search_equipamentos(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Pesquisar equipamentos por código, descrição, marca, modelo, categoria ou nº de série"""
+    return await search_collection(db.equipamentos, q, "codigo", limit, after, transform=set_equipamento_defaults)
+
+@api_router.get("/equipamentos/{equipamento_id}", dependencies=[Depends(condicional("equipamentos", "movimentos", "obras"))])
+async def get_equipamento(equipamento_id: str, user=Depends(get_current_user)):
+    # Equipamento e histórico em paralelo
+    item, movimentos = await asyncio.gather(
+        db.equipamentos.find_one({"id": equipamento_id}, {"_id": 0}),
+        db.movimentos.find(
+            {"recurso_id": equipamento_id, "tipo_recurso": "equipamento"},
+            {"_id": 0}
+        ).sort("created_at", -1).to_list(100)
+    )
+    if not item:
+        raise HTTPException(status_code=404, detail="Equipamento não encontrado")
     
-    # Get obra info if assigned
-    obra = None
-    if item.get("obra_id"):
-        obra = await db.obras.find_one({"id": item["obra_id"]}, {"_id": 0})
-    
-    # Get movement history
-    movimentos = await db.movimentos.find(
-        {"recurso_id": equipamento_id, "tipo_recurso": "equipamento"}, 
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    set_equipamento_defaults(item)
     
-    # Enrich movements with obra name
-    for mov in movimentos:
-        if mov.get("obra_id"):
-            obra_mov = await db.obras.find_one({"id": mov["obra_id"]}, {"_id": 0, "nome": 1, "codigo": 1})
-            if obra_mov:
-                mov["obra_nome"] = obra_mov.get("nome", "")
-                mov["obra_codigo"] = obra_mov.get("codigo", "")
+    # Obra atual e obras do histórico numa só query
+    obras_map = await get_obras_map([item.get("obra_id")] + [mov.get("obra_id") for mov in movimentos])
+    enrich_obra(movimentos, obras_map)
     
-    return {"equipamento": item, "obra_atual": obra, "historico": movimentos}
+    return {"equipamento": item, "obra_atual": obras_map.get(item.get("obra_id")), "historico": movimentos}
 
 class ManutencaoUpdate(BaseModel):
     em_manutencao: bool
@@ -446,14 +1214,14 @@ class ManutencaoUpdate(BaseModel):
 @api_router.patch("/equipamentos/{equipamento_id}/manutencao")
 async def update_equipamento_manutencao(equipamento_id: str, data: ManutencaoUpdate, user=Depends(get_current_user)):
     """Atualizar estado de manutenção de um equipamento (sem editar outros campos)"""
-    existing = await db.equipamentos.find_one({"id": equipamento_id}, {"_id": 0})
+    update_data = {"em_manutencao": data.em_manutencao, "descricao_avaria": data.descricao_avaria}
+    existing = await db.equipamentos.find_one_and_update({"id": equipamento_id}, {"$set": update_data}, {"_id": 0})
     if not existing:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
     
-    update_data = {"em_manutencao": data.em_manutencao, "descricao_avaria": data.descricao_avaria}
-    await db.equipamentos.update_one({"id": equipamento_id}, {"$set": update_data})
-    
-    updated = await db.equipamentos.find_one({"id": equipamento_id}, {"_id": 0})
+    # Estado depois da escrita a partir da pré-imagem (uma leitura à parte podia já ver outra escrita)
+    updated = {**existing, **update_data}
+    await track_stats("equipamentos", existing, updated)
     return updated
 
 @api_router.post("/equipamentos")
@@ -463,23 +1231,33 @@ async def create_equipamento(data: EquipamentoCreate, user=Depends(get_current_u
         raise HTTPException(status_code=400, detail="Código já existe")
     
     equipamento = Equipamento(**data.model_dump())
-    await db.equipamentos.insert_one(equipamento.model_dump())
+    try:
+        await db.equipamentos.insert_one(equipamento.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Código já existe")
+    await track_stats("equipamentos", depois=equipamento.model_dump())
     return equipamento
 
 @api_router.put("/equipamentos/{equipamento_id}")
 async def update_equipamento(equipamento_id: str, data: EquipamentoCreate, user=Depends(get_current_user)):
-    existing = await db.equipamentos.find_one({"id": equipamento_id}, {"_id": 0})
+    update_data = data.model_dump()
+    try:
+        existing = await db.equipamentos.find_one_and_update({"id": equipamento_id}, {"$set": update_data}, {"_id": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Código já existe")
     if not existing:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
     
-    await db.equipamentos.update_one({"id": equipamento_id}, {"$set": data.model_dump()})
-    return await db.equipamentos.find_one({"id": equipamento_id}, {"_id": 0})
+    updated = {**existing, **update_data}
+    await track_stats("equipamentos", existing, updated)
+    return updated
 
 @api_router.delete("/equipamentos/{equipamento_id}")
 async def delete_equipamento(equipamento_id: str, user=Depends(get_current_user)):
-    result = await db.equipamentos.delete_one({"id": equipamento_id})
-    if result.deleted_count == 0:
+    deleted = await db.equipamentos.find_one_and_delete({"id": equipamento_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Equipamento não encontrado")
+    await track_stats("equipamentos", antes=deleted)
     return {"message": "Equipamento eliminado"}
 
 # ==================== VIATURA ROUTES ====================
@@ -498,93 +1276,82 @@ def set_viatura_defaults(item):
     item.setdefault("kms_proxima_revisao", 0)
     return item
 
-@api_router.get("/viaturas")
-async def get_viaturas(user=Depends(get_current_user)):
-    items = await db.viaturas.find({}, {"_id": 0}).to_list(1000)
-    for item in items:
-        set_viatura_defaults(item)
-    return items
+@api_router.get("/viaturas", dependencies=[Depends(condicional("viaturas"))])
+async def get_viaturas(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(
+        db.viaturas, {}, [("matricula", ASCENDING)], limit, after, total,
+        transform=set_viatura_defaults, response=response
+    ), response)
+
+@api_router.get("/viaturas/search")
+async def search_viaturas(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Pesquisar viaturas por matrícula, marca ou modelo"""
+    return await search_collection(db.viaturas, q, "matricula", limit, after, transform=set_viatura_defaults)
 
-@api_router.get("/viaturas/{viatura_id}")
+@api_router.get("/viaturas/{viatura_id}", dependencies=[Depends(condicional("viaturas", "movimentos", "movimentos_viaturas", "obras"))])
 async def get_viatura(viatura_id: str, user=Depends(get_current_user)):
-    item = await db.viaturas.find_one({"id": viatura_id}, {"_id": 0})
+    # Viatura, histórico e histórico de KMs em paralelo
+    item, movimentos, km_movimentos = await asyncio.gather(
+        db.viaturas.find_one({"id": viatura_id}, {"_id": 0}),
+        db.movimentos.find(
+            {"recurso_id": viatura_id, "tipo_recurso": "viatura"},
+            {"_id": 0}
+        ).sort("created_at", -1).to_list(100),
+        db.movimentos_viaturas.find(
+            {"viatura_id": viatura_id}, {"_id": 0}
+        ).sort("created_at", -1).to_list(100)
+    )
     if not item:
         raise HTTPException(status_code=404, detail="Viatura não encontrada")
     
     set_viatura_defaults(item)
     
-    obra = None
-    if item.get("obra_id"):
-        obra = await db.obras.find_one({"id": item["obra_id"]}, {"_id": 0})
-    
-    movimentos = await db.movimentos.find(
-        {"recurso_id": viatura_id, "tipo_recurso": "viatura"}, 
-        {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
-    
-    # Enrich movements with obra name
-    for mov in movimentos:
-        if mov.get("obra_id"):
-            obra_mov = await db.obras.find_one({"id": mov["obra_id"]}, {"_id": 0, "nome": 1, "codigo": 1})
-            if obra_mov:
-                mov["obra_nome"] = obra_mov.get("nome", "")
-                mov["obra_codigo"] = obra_mov.get("codigo", "")
-    
-    km_movimentos = await db.movimentos_viaturas.find(
-        {"viatura_id": viatura_id}, {"_id": 0}
-    ).sort("created_at", -1).to_list(100)
+    # Obra atual e obras do histórico numa só query
+    obras_map = await get_obras_map([item.get("obra_id")] + [mov.get("obra_id") for mov in movimentos])
+    enrich_obra(movimentos, obras_map)
+    obra = obras_map.get(item.get("obra_id"))
     
     # Calcular alertas
+    mensagens = {
+        "seguro": "Seguro expira em {} dias",
+        "ipo": "IPO expira em {} dias",
+        "revisao": "Revisão em {} dias",
+        "kms": "Revisão em {} km"
+    }
     alertas = []
-    from datetime import datetime, timedelta
-    hoje = datetime.now()
-    
-    # Alerta seguro
-    if item.get("data_seguro"):
-        try:
-            data_seg = datetime.fromisoformat(item["data_seguro"].replace("Z", "+00:00"))
-            dias_seguro = (data_seg - hoje).days
-            if dias_seguro <= 30:
-                alertas.append({"tipo": "seguro", "mensagem": f"Seguro expira em {dias_seguro} dias", "urgente": dias_seguro <= 7})
-        except: pass
-    
-    # Alerta IPO
-    if item.get("data_ipo"):
-        try:
-            data_ipo = datetime.fromisoformat(item["data_ipo"].replace("Z", "+00:00"))
-            dias_ipo = (data_ipo - hoje).days
-            if dias_ipo <= 30:
-                alertas.append({"tipo": "ipo", "mensagem": f"IPO expira em {dias_ipo} dias", "urgente": dias_ipo <= 7})
-        except: pass
-    
-    # Alerta revisão por data
-    if item.get("data_proxima_revisao"):
-        try:
-            data_rev = datetime.fromisoformat(item["data_proxima_revisao"].replace("Z", "+00:00"))
-            dias_rev = (data_rev - hoje).days
-            if dias_rev <= 30:
-                alertas.append({"tipo": "revisao", "mensagem": f"Revisão em {dias_rev} dias", "urgente": dias_rev <= 7})
-        except: pass
-    
-    # Alerta revisão por KMs
-    if item.get("kms_proxima_revisao") and item.get("kms_atual"):
-        kms_faltam = item["kms_proxima_revisao"] - item["kms_atual"]
-        if kms_faltam <= 1000 and kms_faltam > 0:
-            alertas.append({"tipo": "kms", "mensagem": f"Revisão em {kms_faltam} km", "urgente": kms_faltam <= 500})
+    for alerta in calcular_alertas(
+        [item], datetime.now(timezone.utc).date(), 30,
+        tipos=("seguro", "ipo", "revisao"), kms_antecedencia=KMS_ANTECEDENCIA, incluir_kms_ultrapassados=False
+    ):
+        if alerta["tipo"] == "kms":
+            valor, urgente = alerta["kms_restantes"], alerta["kms_restantes"] <= 500
+        else:
+            valor, urgente = alerta["dias_restantes"], alerta["dias_restantes"] <= 7
+        alertas.append({"tipo": alerta["tipo"], "mensagem": mensagens[alerta["tipo"]].format(valor), "urgente": urgente})
     
     return {"viatura": item, "obra_atual": obra, "historico": movimentos, "km_historico": km_movimentos, "alertas": alertas}
 
 @api_router.patch("/viaturas/{viatura_id}/manutencao")
 async def update_viatura_manutencao(viatura_id: str, data: ManutencaoUpdate, user=Depends(get_current_user)):
     """Atualizar estado de manutenção de uma viatura (sem editar outros campos)"""
-    existing = await db.viaturas.find_one({"id": viatura_id}, {"_id": 0})
+    update_data = {"em_manutencao": data.em_manutencao, "descricao_avaria": data.descricao_avaria}
+    existing = await db.viaturas.find_one_and_update({"id": viatura_id}, {"$set": update_data}, {"_id": 0})
     if not existing:
         raise HTTPException(status_code=404, detail="Viatura não encontrada")
     
-    update_data = {"em_manutencao": data.em_manutencao, "descricao_avaria": data.descricao_avaria}
-    await db.viaturas.update_one({"id": viatura_id}, {"$set": update_data})
-    
-    updated = await db.viaturas.find_one({"id": viatura_id}, {"_id": 0})
+    updated = {**existing, **update_data}
+    await track_stats("viaturas", existing, updated)
     return updated
 
 @api_router.post("/viaturas")
@@ -594,29 +1361,58 @@ async def create_viatura(data: ViaturaCreate, user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Matrícula já existe")
     
     viatura = Viatura(**data.model_dump())
-    await db.viaturas.insert_one(viatura.model_dump())
+    try:
+        await db.viaturas.insert_one(viatura.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Matrícula já existe")
+    await track_stats("viaturas", depois=viatura.model_dump())
+    await sync_expiracoes([viatura.model_dump()])
     return viatura
 
 @api_router.put("/viaturas/{viatura_id}")
 async def update_viatura(viatura_id: str, data: ViaturaCreate, user=Depends(get_current_user)):
-    existing = await db.viaturas.find_one({"id": viatura_id}, {"_id": 0})
+    update_data = data.model_dump()
+    try:
+        existing = await db.viaturas.find_one_and_update({"id": viatura_id}, {"$set": update_data}, {"_id": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Matrícula já existe")
     if not existing:
         raise HTTPException(status_code=404, detail="Viatura não encontrada")
     
-    await db.viaturas.update_one({"id": viatura_id}, {"$set": data.model_dump()})
-    return await db.viaturas.find_one({"id": viatura_id}, {"_id": 0})
+    updated = {**existing, **update_data}
+    await track_stats("viaturas", existing, updated)
+    await sync_expiracoes([updated])
+    return updated
 
 @api_router.delete("/viaturas/{viatura_id}")
 async def delete_viatura(viatura_id: str, user=Depends(get_current_user)):
-    result = await db.viaturas.delete_one({"id": viatura_id})
-    if result.deleted_count == 0:
+    deleted = await db.viaturas.find_one_and_delete({"id": viatura_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Viatura não encontrada")
+    await track_stats("viaturas", antes=deleted)
+    await sync_expiracoes(removidas=[viatura_id])
     return {"message": "Viatura eliminada"}
 
 # ==================== MATERIAL ROUTES ====================
-@api_router.get("/materiais")
-async def get_materiais(user=Depends(get_current_user)):
-    return await db.materiais.find({}, {"_id": 0}).to_list(1000)
+@api_router.get("/materiais", dependencies=[Depends(condicional("materiais"))])
+async def get_materiais(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(db.materiais, {}, [("codigo", ASCENDING)], limit, after, total, response=response), response)
+
+@api_router.get("/materiais/search")
+async def search_materiais(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(PAGE_SIZE_DEFAULT, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Pesquisar materiais por código ou descrição"""
+    return await search_collection(db.materiais, q, "codigo", limit, after)
 
 @api_router.post("/materiais")
 async def create_material(data: MaterialCreate, user=Depends(get_current_user)):
@@ -625,19 +1421,28 @@ async def create_material(data: MaterialCreate, user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Código já existe")
     
     material = Material(**data.model_dump())
-    await db.materiais.insert_one(material.model_dump())
+    try:
+        await db.materiais.insert_one(material.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Código já existe")
+    await track_stats("materiais", depois=material.model_dump())
     return material
 
 @api_router.put("/materiais/{material_id}")
 async def update_material(material_id: str, data: MaterialCreate, user=Depends(get_current_user)):
-    existing = await db.materiais.find_one({"id": material_id}, {"_id": 0})
+    update_data = data.model_dump()
+    try:
+        existing = await db.materiais.find_one_and_update({"id": material_id}, {"$set": update_data}, {"_id": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Código já existe")
     if not existing:
         raise HTTPException(status_code=404, detail="Material não encontrado")
     
-    await db.materiais.update_one({"id": material_id}, {"$set": data.model_dump()})
-    return await db.materiais.find_one({"id": material_id}, {"_id": 0})
+    updated = {**existing, **update_data}
+    await track_stats("materiais", existing, updated)
+    return updated
 
-@api_router.get("/materiais/{material_id}")
+@api_router.get("/materiais/{material_id}", dependencies=[Depends(condicional("materiais", "movimentos_stock"))])
 async def get_material_detail(material_id: str, user=Depends(get_current_user)):
     """Get material with movement history"""
     material = await db.materiais.find_one({"id": material_id}, {"_id": 0})
@@ -654,17 +1459,24 @@ async def get_material_detail(material_id: str, user=Depends(get_current_user)):
 
 @api_router.delete("/materiais/{material_id}")
 async def delete_material(material_id: str, user=Depends(get_current_user)):
-    result = await db.materiais.delete_one({"id": material_id})
-    if result.deleted_count == 0:
+    deleted = await db.materiais.find_one_and_delete({"id": material_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Material não encontrado")
+    await track_stats("materiais", antes=deleted)
     return {"message": "Material eliminado"}
 
 # ==================== OBRA ROUTES ====================
-@api_router.get("/obras")
-async def get_obras(user=Depends(get_current_user)):
-    return await db.obras.find({}, {"_id": 0}).to_list(1000)
+@api_router.get("/obras", dependencies=[Depends(condicional("obras"))])
+async def get_obras(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(db.obras, {}, [("codigo", ASCENDING)], limit, after, total, response=response), response)
 
-@api_router.get("/obras/{obra_id}")
+@api_router.get("/obras/{obra_id}", dependencies=[Depends(condicional("obras", "equipamentos", "viaturas"))])
 async def get_obra(obra_id: str, user=Depends(get_current_user)):
     obra = await db.obras.find_one({"id": obra_id}, {"_id": 0})
     if not obra:
@@ -682,29 +1494,49 @@ async def create_obra(data: ObraCreate, user=Depends(get_current_user)):
         raise HTTPException(status_code=400, detail="Código já existe")
     
     obra = Obra(**data.model_dump())
-    await db.obras.insert_one(obra.model_dump())
+    try:
+        await db.obras.insert_one(obra.model_dump())
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Código já existe")
+    await track_stats("obras", depois=obra.model_dump())
     return obra
 
 @api_router.put("/obras/{obra_id}")
 async def update_obra(obra_id: str, data: ObraCreate, user=Depends(get_current_user)):
-    existing = await db.obras.find_one({"id": obra_id}, {"_id": 0})
+    update_data = data.model_dump()
+    try:
+        existing = await db.obras.find_one_and_update({"id": obra_id}, {"$set": update_data}, {"_id": 0})
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Código já existe")
     if not existing:
         raise HTTPException(status_code=404, detail="Obra não encontrada")
     
-    await db.obras.update_one({"id": obra_id}, {"$set": data.model_dump()})
-    return await db.obras.find_one({"id": obra_id}, {"_id": 0})
+    updated = {**existing, **update_data}
+    await track_stats("obras", existing, updated)
+    return updated
 
 @api_router.delete("/obras/{obra_id}")
 async def delete_obra(obra_id: str, user=Depends(get_current_user)):
-    result = await db.obras.delete_one({"id": obra_id})
-    if result.deleted_count == 0:
+    deleted = await db.obras.find_one_and_delete({"id": obra_id}, {"_id": 0})
+    if not deleted:
         raise HTTPException(status_code=404, detail="Obra não encontrada")
+    await track_stats("obras", antes=deleted)
     
     # Remove obra association from resources
-    await db.equipamentos.update_many({"obra_id": obra_id}, {"$set": {"obra_id": None}})
-    await db.viaturas.update_many({"obra_id": obra_id}, {"$set": {"obra_id": None}})
+    eq_result = await db.equipamentos.update_many({"obra_id": obra_id}, {"$set": {"obra_id": None}})
+    vt_result = await db.viaturas.update_many({"obra_id": obra_id}, {"$set": {"obra_id": None}})
+    await inc_stats("equipamentos", {"em_obra": -eq_result.modified_count} if eq_result.modified_count else {})
+    await inc_stats("viaturas", {"em_obra": -vt_result.modified_count} if vt_result.modified_count else {})
     return {"message": "Obra eliminada"}
 
+# ==================== MOVIMENTOS EM LOTE ====================
+MAX_LINHAS_BULK = 1000
+
+def resposta_bulk(resultados: list) -> dict:
+    """Resposta dos endpoints /bulk: contagens e o resultado de cada linha"""
+    criados = sum(1 for resultado in resultados if resultado["status"] == "ok")
+    return {"criados": criados, "rejeitados": len(resultados) - criados, "resultados": resultados}
+
 # ==================== MOVIMENTO (Atribuição) ROUTES ====================
 @api_router.post("/movimentos/atribuir")
 async def atribuir_recurso(data: AtribuirRecursoRequest, user=Depends(get_current_user)):
@@ -734,9 +1566,12 @@ async def atribuir_recurso(data: AtribuirRecursoRequest, user=Depends(get_curren
         observacoes=data.observacoes
     )
     await db.movimentos.insert_one(movimento.model_dump())
+    await bump_versoes("movimentos")
     
     # Update resource
-    await collection.update_one({"id": data.recurso_id}, {"$set": {"obra_id": data.obra_id}})
+    antes = await collection.find_one_and_update({"id": data.recurso_id}, {"$set": {"obra_id": data.obra_id}}, {"_id": 0})
+    if antes:
+        await track_stats(collection.name, antes, {**antes, "obra_id": data.obra_id})
     
     return {"message": "Recurso atribuído com sucesso", "movimento_id": movimento.id}
 
@@ -760,73 +1595,353 @@ async def devolver_recurso(data: DevolverRecursoRequest, user=Depends(get_curren
         observacoes=data.observacoes
     )
     await db.movimentos.insert_one(movimento.model_dump())
+    await bump_versoes("movimentos")
     
     # Remove obra association
-    await collection.update_one({"id": data.recurso_id}, {"$set": {"obra_id": None}})
+    antes = await collection.find_one_and_update({"id": data.recurso_id}, {"$set": {"obra_id": None}}, {"_id": 0})
+    if antes:
+        await track_stats(collection.name, antes, {**antes, "obra_id": None})
     
     return {"message": "Recurso devolvido com sucesso", "movimento_id": movimento.id}
 
+COLECOES_RECURSO = {"equipamento": "equipamentos", "viatura": "viaturas"}
+
+async def carregar_recursos(recursos: List[RecursoRef]) -> dict:
+    """Carregar os recursos pedidos com uma query $in por coleção, indexados por (tipo_recurso, id)"""
+    ids_por_tipo = {}
+    for ref in recursos:
+        if ref.tipo_recurso in COLECOES_RECURSO:
+            ids_por_tipo.setdefault(ref.tipo_recurso, set()).add(ref.recurso_id)
+    
+    tipos = list(ids_por_tipo)
+    encontrados = await asyncio.gather(*[
+        db[COLECOES_RECURSO[tipo]].find({"id": {"$in": list(ids_por_tipo[tipo])}}, {"_id": 0}).to_list(None)
+        for tipo in tipos
+    ])
+    return {(tipo, item["id"]): item for tipo, items in zip(tipos, encontrados) for item in items}
+
+def validar_recursos_bulk(recursos: List[RecursoRef], existentes: dict, conflito) -> tuple:
+    """Resultados por linha e recursos aceites; `conflito(recurso)` devolve a mensagem de erro ou None"""
+    if not recursos:
+        raise HTTPException(status_code=400, detail="Nenhum recurso indicado")
+    if len(recursos) > MAX_LINHAS_BULK:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_LINHAS_BULK} recursos por pedido")
+    
+    resultados, aceites, vistos = [], [], set()
+    for i, ref in enumerate(recursos):
+        chave = (ref.tipo_recurso, ref.recurso_id)
+        base = {"linha": i, "recurso_id": ref.recurso_id, "tipo_recurso": ref.tipo_recurso}
+        if ref.tipo_recurso not in COLECOES_RECURSO:
+            erro = "Tipo de recurso inválido"
+        elif chave not in existentes:
+            erro = "Recurso não encontrado"
+        elif chave in vistos:
+            erro = "Recurso repetido no pedido"
+        else:
+            erro = conflito(existentes[chave])
+        if erro:
+            resultados.append({**base, "status": "erro", "erro": erro})
+            continue
+        vistos.add(chave)
+        resultados.append({**base, "status": "ok"})
+        aceites.append((resultados[-1], existentes[chave]))
+    return resultados, aceites
+
+async def aplicar_movimentos_bulk(aceites: list, movimentos: list, obra_id: Optional[str]):
+    """Mudar a obra dos recursos (um bulk_write por coleção) e gravar (insert_many) os movimentos
+    dos que foram mesmo alterados.
+    
+    Cada recurso só é atualizado se ainda estiver na obra lida em `carregar_recursos`; os que
+    mudaram entretanto ficam como erro na sua linha, sem movimento nem efeito nas estatísticas.
+    """
+    pares = list(zip(aceites, movimentos))
+    if not pares:
+        return
+    por_colecao = {}
+    for i, ((_, recurso), movimento) in enumerate(pares):
+        por_colecao.setdefault(COLECOES_RECURSO[movimento["tipo_recurso"]], []).append((i, recurso))
+    
+    async def registar(session):
+        aplicados = [True] * len(pares)
+        for nome, itens in por_colecao.items():
+            escrita = await db[nome].bulk_write([
+                UpdateOne({"id": recurso["id"], "obra_id": recurso.get("obra_id")}, {"$set": {"obra_id": obra_id}})
+                for _, recurso in itens
+            ], ordered=False, session=session)
+            if escrita.matched_count < len(itens):
+                # Falhou algum: os aplicados são os que estão agora na obra de destino
+                ids = set(await db[nome].distinct(
+                    "id", {"id": {"$in": [recurso["id"] for _, recurso in itens]}, "obra_id": obra_id}, session=session
+                ))
+                for i, recurso in itens:
+                    aplicados[i] = recurso["id"] in ids
+        if any(aplicados):
+            await db.movimentos.insert_many(
+                [dict(movimento) for (_, movimento), ok in zip(pares, aplicados) if ok], ordered=False, session=session
+            )
+        return aplicados
+    
+    aplicados = await executar_transacao(registar)
+    deltas = {}
+    for ((resultado, recurso), movimento), ok in zip(pares, aplicados):
+        if not ok:
+            resultado.update(status="erro", erro="Recurso alterado por outro pedido entretanto, repita o pedido")
+            continue
+        resultado["movimento_id"] = movimento["id"]
+        tipo = COLECOES_RECURSO[movimento["tipo_recurso"]]
+        deltas.setdefault(tipo, Counter()).update(stats_delta(tipo, recurso, {**recurso, "obra_id": obra_id}))
+    if any(aplicados):
+        await bump_versoes("movimentos")
+    for tipo, delta in deltas.items():
+        await inc_stats(tipo, dict(delta))
+
+@api_router.post("/movimentos/atribuir/bulk")
+async def atribuir_recursos_bulk(data: AtribuirRecursosBulkRequest, user=Depends(get_current_user)):
+    """Atribuir vários equipamentos/viaturas a uma obra num só pedido (conflitos reportados por recurso)"""
+    existentes = await carregar_recursos(data.recursos)
+    obras_map = await get_obras_map(
+        [data.obra_id] + [r.get("obra_id") for r in existentes.values()], {"_id": 0, "nome": 1}
+    )
+    if data.obra_id not in obras_map:
+        raise HTTPException(status_code=404, detail="Obra não encontrada")
+    
+    def conflito(recurso):
+        if recurso.get("obra_id") and recurso["obra_id"] != data.obra_id:
+            obra_atual = obras_map.get(recurso["obra_id"])
+            return f"Este recurso já está atribuído à obra: {obra_atual['nome'] if obra_atual else 'Desconhecida'}"
+        return None
+    
+    resultados, aceites = validar_recursos_bulk(data.recursos, existentes, conflito)
+    data_levantamento = data.data_levantamento or datetime.now(timezone.utc).isoformat()
+    movimentos = [
+        Movimento(
+            recurso_id=recurso["id"],
+            tipo_recurso=resultado["tipo_recurso"],
+            tipo_movimento="Saida",
+            obra_id=data.obra_id,
+            responsavel_levantou=data.responsavel_levantou,
+            data_levantamento=data_levantamento,
+            observacoes=data.observacoes
+        ).model_dump()
+        for resultado, recurso in aceites
+    ]
+    await aplicar_movimentos_bulk(aceites, movimentos, data.obra_id)
+    return resposta_bulk(resultados)
+
+@api_router.post("/movimentos/devolver/bulk")
+async def devolver_recursos_bulk(data: DevolverRecursosBulkRequest, user=Depends(get_current_user)):
+    """Devolver vários equipamentos/viaturas num só pedido (ex.: fecho de uma obra)"""
+    existentes = await carregar_recursos(data.recursos)
+    
+    def conflito(recurso):
+        return None if recurso.get("obra_id") else "Este recurso não está atribuído a nenhuma obra"
+    
+    resultados, aceites = validar_recursos_bulk(data.recursos, existentes, conflito)
+    data_devolucao = data.data_devolucao or datetime.now(timezone.utc).isoformat()
+    movimentos = [
+        Movimento(
+            recurso_id=recurso["id"],
+            tipo_recurso=resultado["tipo_recurso"],
+            tipo_movimento="Devolucao",
+            obra_id=recurso.get("obra_id"),
+            responsavel_devolveu=data.responsavel_devolveu,
+            data_devolucao=data_devolucao,
+            observacoes=data.observacoes
+        ).model_dump()
+        for resultado, recurso in aceites
+    ]
+    await aplicar_movimentos_bulk(aceites, movimentos, None)
+    return resposta_bulk(resultados)
+
 @api_router.get("/movimentos")
-async def get_movimentos(user=Depends(get_current_user)):
-    return await db.movimentos.find({}, {"_id": 0}).sort("created_at", -1).to_list(1000)
+async def get_movimentos(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(
+        db.movimentos, {}, [("created_at", DESCENDING), ("id", DESCENDING)], limit, after, total, response=response
+    ), response)
 
 # ==================== MOVIMENTO STOCK ROUTES ====================
 @api_router.get("/movimentos/stock")
-async def get_movimentos_stock(user=Depends(get_current_user)):
-    return await db.movimentos_stock.find({}, {"_id": 0}).to_list(1000)
+async def get_movimentos_stock(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(
+        db.movimentos_stock, {}, [("data_hora", DESCENDING), ("id", DESCENDING)], limit, after, total, response=response
+    ), response)
+
+def filtro_stock(material_id: str, delta: float) -> dict:
+    """Filtro do $inc de stock de um material, com a guarda de stock negativo quando ativa"""
+    filtro = {"id": material_id}
+    if BLOQUEAR_STOCK_NEGATIVO and delta < 0:
+        filtro["stock_atual"] = {"$gte": -delta}
+    return filtro
 
 @api_router.post("/movimentos/stock")
 async def create_movimento_stock(data: MovimentoStockCreate, user=Depends(get_current_user)):
     movimento = MovimentoStock(**data.model_dump())
-    await db.movimentos_stock.insert_one(movimento.model_dump())
+    delta = data.quantidade if data.tipo_movimento == "Entrada" else -data.quantidade
     
-    material = await db.materiais.find_one({"id": data.material_id}, {"_id": 0})
-    if material:
-        new_stock = material.get("stock_atual", 0)
-        if data.tipo_movimento == "Entrada":
-            new_stock += data.quantidade
-        else:
-            new_stock -= data.quantidade
-        await db.materiais.update_one({"id": data.material_id}, {"$set": {"stock_atual": new_stock}})
+    async def registar(session):
+        # $inc atómico: movimentos simultâneos no mesmo material não se sobrepõem
+        material = await db.materiais.find_one_and_update(
+            filtro_stock(data.material_id, delta), {"$inc": {"stock_atual": delta}},
+            {"_id": 0, "stock_atual": 1}, return_document=ReturnDocument.AFTER, session=session
+        )
+        if material:
+            await db.movimentos_stock.insert_one(movimento.model_dump(), session=session)
+        return material
     
-    return movimento
+    material = await executar_transacao(registar)
+    if not material:
+        if await db.materiais.find_one({"id": data.material_id}, {"_id": 0, "id": 1}):
+            raise HTTPException(status_code=400, detail="Stock insuficiente para a saída")
+        raise HTTPException(status_code=404, detail="Material não encontrado")
+    
+    await inc_stats("materiais", {"stock_total": delta})
+    await bump_versoes("movimentos_stock")
+    return {**movimento.model_dump(), "stock_atual": material["stock_atual"]}
+
+async def aplicar_stock_sem_transacao(deltas: dict) -> dict:
+    """Aplicar os $inc de stock sem transação; devolve {material_id: erro} dos que falharam.
+    
+    Os $inc que só falham se o material tiver sido apagado seguem num único bulk_write e, se
+    faltarem correspondências, uma releitura dos ids diz quais foram. As saídas com a guarda de
+    stock negativo ativa vão à parte (find_one_and_update), porque uma contagem não diz qual falhou.
+    """
+    com_guarda = {m: d for m, d in deltas.items() if BLOQUEAR_STOCK_NEGATIVO and d < 0}
+    sem_guarda = {m: d for m, d in deltas.items() if m not in com_guarda}
+    
+    async def bulk():
+        if not sem_guarda:
+            return {}
+        escrita = await db.materiais.bulk_write([
+            UpdateOne({"id": material_id}, {"$inc": {"stock_atual": delta}})
+            for material_id, delta in sem_guarda.items()
+        ], ordered=False)
+        if escrita.matched_count == len(sem_guarda):
+            return {}
+        existentes = set(await db.materiais.distinct("id", {"id": {"$in": list(sem_guarda)}}))
+        return {material_id: "Material não encontrado" for material_id in sem_guarda if material_id not in existentes}
+    
+    async def guardado(material_id, delta):
+        return await db.materiais.find_one_and_update(
+            filtro_stock(material_id, delta), {"$inc": {"stock_atual": delta}}, {"_id": 0, "id": 1}
+        )
+    
+    falhados, *aplicados = await asyncio.gather(bulk(), *[guardado(m, d) for m, d in com_guarda.items()])
+    falhados.update({m: "Stock insuficiente para a saída" for m, ok in zip(com_guarda, aplicados) if not ok})
+    return falhados
+
+@api_router.post("/movimentos/stock/bulk")
+async def create_movimentos_stock_bulk(linhas: List[MovimentoStockCreate], user=Depends(get_current_user)):
+    """Registar vários movimentos de stock (ex.: todas as linhas de uma guia) num só pedido.
+    
+    Devolve o resultado de cada linha; linhas inválidas são rejeitadas sem impedir as restantes.
+    """
+    if not linhas:
+        raise HTTPException(status_code=400, detail="Nenhum movimento indicado")
+    if len(linhas) > MAX_LINHAS_BULK:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_LINHAS_BULK} movimentos por pedido")
+    
+    async def registar(session):
+        materiais = await db.materiais.find(
+            {"id": {"$in": list({linha.material_id for linha in linhas})}},
+            {"_id": 0, "id": 1, "stock_atual": 1}, session=session
+        ).to_list(None)
+        stock = {m["id"]: m.get("stock_atual") or 0 for m in materiais}
+        
+        resultados, movimentos, deltas = [], {}, {}
+        for i, linha in enumerate(linhas):
+            if linha.material_id not in stock:
+                resultados.append({"linha": i, "status": "erro", "erro": "Material não encontrado"})
+                continue
+            delta = linha.quantidade if linha.tipo_movimento == "Entrada" else -linha.quantidade
+            if BLOQUEAR_STOCK_NEGATIVO and stock[linha.material_id] + delta < 0:
+                resultados.append({"linha": i, "status": "erro", "erro": "Stock insuficiente para a saída"})
+                continue
+            stock[linha.material_id] += delta
+            deltas[linha.material_id] = deltas.get(linha.material_id, 0) + delta
+            movimentos[i] = MovimentoStock(**linha.model_dump()).model_dump()
+            resultados.append({"linha": i, "status": "ok", "movimento": movimentos[i]})
+        
+        # Um $inc por material com a soma das suas linhas
+        if session is None:
+            # Sem transação é preciso saber que materiais falharam para rejeitar só as suas linhas
+            falhados = await aplicar_stock_sem_transacao(deltas)
+            for resultado in resultados:
+                material_id = resultado.get("movimento", {}).get("material_id")
+                if resultado["status"] == "ok" and material_id in falhados:
+                    del movimentos[resultado["linha"]]
+                    resultado.update(status="erro", erro=falhados[material_id])
+                    resultado.pop("movimento")
+            deltas = {material_id: delta for material_id, delta in deltas.items() if material_id not in falhados}
+        elif deltas:
+            escrita = await db.materiais.bulk_write([
+                UpdateOne(filtro_stock(material_id, delta), {"$inc": {"stock_atual": delta}})
+                for material_id, delta in deltas.items()
+            ], ordered=False, session=session)
+            if escrita.matched_count < len(deltas):
+                # Material apagado ou stock alterado entretanto: a transação anula os $inc já feitos
+                raise HTTPException(status_code=409, detail="Stock alterado por outro movimento, repita o pedido")
+        
+        if movimentos:
+            # insert_many acrescenta _id aos documentos: inserir cópias para não o devolver
+            await db.movimentos_stock.insert_many([dict(m) for m in movimentos.values()], ordered=False, session=session)
+        return resultados, deltas
+    
+    resultados, deltas = await executar_transacao(registar)
+    stock_total = sum(deltas.values())
+    await inc_stats("materiais", {"stock_total": stock_total} if stock_total else {})
+    await bump_versoes("movimentos_stock")
+    return resposta_bulk(resultados)
 
 # ==================== MOVIMENTO VIATURA ROUTES ====================
 @api_router.get("/movimentos/viaturas")
-async def get_movimentos_viaturas(user=Depends(get_current_user)):
-    return await db.movimentos_viaturas.find({}, {"_id": 0}).to_list(1000)
+async def get_movimentos_viaturas(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=PAGE_SIZE_MAX),
+    after: Optional[str] = None,
+    total: bool = False,
+    user=Depends(get_current_user)
+):
+    return json_pronto(await paginate(
+        db.movimentos_viaturas, {}, [("created_at", DESCENDING), ("id", DESCENDING)], limit, after, total, response=response
+    ), response)
 
 @api_router.post("/movimentos/viaturas")
 async def create_movimento_viatura(data: MovimentoViaturaCreate, user=Depends(get_current_user)):
     movimento = MovimentoViatura(**data.model_dump())
     await db.movimentos_viaturas.insert_one(movimento.model_dump())
+    await bump_versoes("movimentos_viaturas")
     return movimento
 
 # ==================== ALERTS ROUTES ====================
 @api_router.get("/alerts/check")
 async def check_alerts(user=Depends(get_current_user)):
-    viaturas = await db.viaturas.find({"ativa": True}, {"_id": 0}).to_list(1000)
     today = datetime.now(timezone.utc).date()
+    viaturas = await viaturas_a_expirar(("vistoria", "seguro"), ALERT_DAYS_BEFORE, today)
     alerts = []
     
-    for v in viaturas:
-        for field, tipo in [("data_vistoria", "vistoria"), ("data_seguro", "seguro")]:
-            if v.get(field):
-                try:
-                    date = datetime.fromisoformat(v[field].replace("Z", "+00:00")).date()
-                    days_until = (date - today).days
-                    if days_until <= ALERT_DAYS_BEFORE:
-                        alerts.append({
-                            "viatura_id": v["id"],
-                            "matricula": v["matricula"],
-                            "marca": v.get("marca", ""),
-                            "modelo": v.get("modelo", ""),
-                            "tipo_alerta": tipo,
-                            "data_expiracao": date.strftime("%d/%m/%Y"),
-                            "dias_restantes": days_until
-                        })
-                except:
-                    pass
+    for alerta in calcular_alertas(viaturas, today, ALERT_DAYS_BEFORE, tipos=("vistoria", "seguro")):
+        v = viaturas[alerta["indice"]]
+        alerts.append({
+            "viatura_id": v["id"],
+            "matricula": v["matricula"],
+            "marca": v.get("marca", ""),
+            "modelo": v.get("modelo", ""),
+            "tipo_alerta": alerta["tipo"],
+            "data_expiracao": alerta["data"].strftime("%d/%m/%Y"),
+            "dias_restantes": alerta["dias_restantes"]
+        })
     
     return {"alerts": alerts, "total": len(alerts)}
 
@@ -850,280 +1965,809 @@ async def send_alerts(user=Depends(get_current_user)):
             raise HTTPException(status_code=400, detail=f"Para enviar emails para {ALERT_EMAIL}, precisa de verificar o domínio em resend.com/domains")
         raise HTTPException(status_code=500, detail=f"Erro ao enviar email: {error_msg}")
 
+# ==================== JOBS ====================
+# Estados: pendente -> a_importar (leitura e gravação por blocos) -> concluido | erro
+JOB_ESTADOS_ATIVOS = ("pendente", "a_importar")
+
+async def criar_job(tipo: str, user: dict, **extra) -> dict:
+    """Registar um job pendente na coleção jobs"""
+    agora = datetime.now(timezone.utc)
+    job = {
+        "id": str(uuid.uuid4()),
+        "tipo": tipo,
+        "estado": "pendente",
+        "progresso": {"processadas": 0, "total": None},
+        "resultado": None,
+        "erro": None,
+        "user_id": user["id"],
+        "created_at": agora.isoformat(),
+        "updated_at": agora.isoformat(),
+        "expira_em": agora + timedelta(days=JOB_RETENCAO_DIAS),
+        **extra
+    }
+    await db.jobs.insert_one(dict(job))
+    return job
+
+async def atualizar_job(job_id: str, **campos):
+    campos["updated_at"] = datetime.now(timezone.utc).isoformat()
+    await db.jobs.update_one({"id": job_id}, {"$set": campos})
+
+@api_router.get("/jobs/{job_id}")
+async def get_job(job_id: str, user=Depends(get_current_user)):
+    """Estado, progresso e resultado de um job em segundo plano"""
+    # Só o utilizador que criou o job o pode consultar
+    job = await db.jobs.find_one({"id": job_id, "user_id": user["id"]}, {"_id": 0, "expira_em": 0})
+    if not job:
+        raise HTTPException(status_code=404, detail="Job não encontrado")
+    return job
+
 # ==================== IMPORT/EXPORT ROUTES ====================
-@api_router.post("/import/excel")
-async def import_excel(file: UploadFile = File(...), user=Depends(get_current_user)):
-    """Import data from Excel file"""
-    if not file.filename.endswith(('.xlsx', '.xls')):
-        raise HTTPException(status_code=400, detail="Apenas ficheiros Excel são permitidos")
+# Importação Excel por tipo: folhas aceites, modelo, campo chave e colunas (campo -> nomes alternativos)
+IMPORT_TIPOS = {
+    "equipamentos": {
+        "folhas": ("Equipamentos", "Equipamento"),
+        "modelo": Equipamento,
+        "chave": "codigo",
+        "nome_chave": "Código",
+        "colunas": {
+            "codigo": ("Codigo", "codigo", "Código"),
+            "descricao": ("Descricao", "descricao", "Descrição"),
+            "marca": ("Marca", "marca"),
+            "modelo": ("Modelo", "modelo"),
+            "categoria": ("Categoria", "categoria"),
+            "numero_serie": ("Numero_Serie", "numero_serie", "Nº Série"),
+            "estado_conservacao": ("Estado_Conservacao", "estado_conservacao", "Estado"),
+            "ativo": ("Ativo", "ativo"),
+        },
+    },
+    "viaturas": {
+        "folhas": ("Viaturas", "Viatura"),
+        "modelo": Viatura,
+        "chave": "matricula",
+        "nome_chave": "Matrícula",
+        "colunas": {
+            "matricula": ("Matricula", "matricula", "Matrícula"),
+            "marca": ("Marca", "marca"),
+            "modelo": ("Modelo", "modelo"),
+            "combustivel": ("Combustivel", "combustivel", "Combustível"),
+            "ativa": ("Ativa", "ativa"),
+        },
+    },
+    "materiais": {
+        "folhas": ("Materiais", "Material"),
+        "modelo": Material,
+        "chave": "codigo",
+        "nome_chave": "Código",
+        "colunas": {
+            "codigo": ("Codigo", "codigo", "Código", "ID_Material"),
+            "descricao": ("Descricao", "descricao", "Descrição"),
+            "unidade": ("Unidade", "unidade"),
+            "stock_minimo": ("Stock_Minimo", "stock_minimo", "Stock Mínimo"),
+        },
+    },
+    "obras": {
+        "folhas": ("Obras", "Obra"),
+        "modelo": Obra,
+        "chave": "codigo",
+        "nome_chave": "Código",
+        "colunas": {
+            "codigo": ("Codigo", "codigo", "ID_Obra"),
+            "nome": ("Nome", "nome"),
+            "estado": ("Estado", "estado"),
+        },
+    },
+}
+IMPORT_CHUNK = 1000
+MAX_REJEITADOS = 1000
+MAX_EXEMPLOS_DIFF = 20
+VALORES_SIM = ("sim", "true", "1", "yes")
+
+def converter_celula(modelo, campo: str, valor):
+    """Converter o valor de uma célula para o tipo do campo no modelo (ValueError se inválido)"""
+    tipo = modelo.model_fields[campo].annotation
+    if tipo is bool:
+        return str(valor).strip().lower() in VALORES_SIM
+    if tipo in (int, float):
+        return tipo(valor)
+    return str(valor).strip()
+
+def ler_folha(tipo: str, ws):
+    """Ler e validar as linhas de uma folha, em blocos de até IMPORT_CHUNK linhas.
+    
+    Gerador de (linhas [(nº da linha, campos)], rejeições) por bloco; só inclui os campos cujas
+    colunas existem e têm valor. Da folha inteira só ficam em memória as chaves já vistas.
+    """
+    config = IMPORT_TIPOS[tipo]
+    chave = config["chave"]
+    rows = ws.iter_rows(values_only=True)
+    headers = [str(h).strip() if h is not None else "" for h in next(rows, ())]
+    indices = {}
+    for campo, nomes in config["colunas"].items():
+        indice = next((headers.index(nome) for nome in nomes if nome in headers), None)
+        if indice is not None:
+            indices[campo] = indice
+    
+    linhas, rejeitados, vistas = [], [], set()
+    for n, row in enumerate(rows, start=2):
+        if all(valor in (None, "") for valor in row):
+            continue
+        campos, erros = {}, []
+        for campo, indice in indices.items():
+            valor = row[indice] if indice < len(row) else None
+            if valor in (None, ""):
+                continue
+            try:
+                campos[campo] = converter_celula(config["modelo"], campo, valor)
+            except (TypeError, ValueError):
+                erros.append(campo)
+        
+        rejeicao = {"folha": ws.title, "linha": n, "chave": campos.get(chave, "")}
+        if not campos.get(chave):
+            rejeitados.append({**rejeicao, "motivo": f"{config['nome_chave']} em falta"})
+        elif erros:
+            rejeitados.append({**rejeicao, "motivo": f"Valor inválido em: {', '.join(erros)}"})
+        elif campos[chave] in vistas:
+            rejeitados.append({**rejeicao, "motivo": f"{config['nome_chave']} repetido no ficheiro"})
+        else:
+            vistas.add(campos[chave])
+            linhas.append((n, campos))
+        if len(linhas) + len(rejeitados) >= IMPORT_CHUNK:
+            yield linhas, rejeitados
+            linhas, rejeitados = [], []
+    if linhas or rejeitados:
+        yield linhas, rejeitados
+
+def ler_workbook(wb):
+    """Gerador de blocos (tipo, folha, linhas, rejeições) de cada tipo presente no workbook"""
+    for tipo, config in IMPORT_TIPOS.items():
+        folha = next((nome for nome in config["folhas"] if nome in wb.sheetnames), None)
+        if folha:
+            for linhas, rejeitados in ler_folha(tipo, wb[folha]):
+                yield tipo, folha, linhas, rejeitados
+
+def documento_importado(tipo: str, campos: dict) -> dict:
+    """Documento completo para uma linha nova (campos obrigatórios em falta ficam vazios, ex.: descrição)"""
+    modelo = IMPORT_TIPOS[tipo]["modelo"]
+    obrigatorios = {campo: "" for campo, info in modelo.model_fields.items() if info.is_required()}
+    return modelo(**{**obrigatorios, **campos}).model_dump()
+
+async def comparar_linhas(tipo: str, linhas: list) -> tuple:
+    """Classificar as linhas contra os documentos existentes, obtidos num único $in.
+    
+    Devolve (novos, alterados, inalterados): novos e inalterados são [(nº da linha, campos)];
+    alterados são [(nº da linha, campos, documento existente, {campo: {"antes", "depois"}})].
+    """
+    chave = IMPORT_TIPOS[tipo]["chave"]
+    existentes = {
+        doc[chave]: doc for doc in
+        await db[tipo].find({chave: {"$in": [campos[chave] for _, campos in linhas]}}, {"_id": 0}).to_list(None)
+    }
     
-    content = await file.read()
-    wb = load_workbook(BytesIO(content))
-    imported = {"equipamentos": 0, "viaturas": 0, "materiais": 0, "obras": 0}
+    novos, alterados, inalterados = [], [], []
+    for n, campos in linhas:
+        existente = existentes.get(campos[chave])
+        if existente is None:
+            novos.append((n, campos))
+            continue
+        alteracoes = {
+            campo: {"antes": existente.get(campo), "depois": valor}
+            for campo, valor in campos.items() if existente.get(campo) != valor
+        }
+        if alteracoes:
+            alterados.append((n, campos, existente, alteracoes))
+        else:
+            inalterados.append((n, campos))
+    return novos, alterados, inalterados
+
+def rejeicao_escrita(tipo: str, folha: str, n: int, campos: dict, erro: dict) -> dict:
+    config = IMPORT_TIPOS[tipo]
+    motivo = f"{config['nome_chave']} já existe" if erro.get("code") == 11000 else "Erro ao gravar a linha"
+    return {"folha": folha, "linha": n, "chave": campos[config["chave"]], "motivo": motivo}
+
+async def inserir_linhas(tipo: str, folha: str, novos: list, rejeitados: list) -> list:
+    """Inserir as linhas novas com insert_many por blocos; devolve os documentos inseridos"""
+    inseridos = []
+    for i in range(0, len(novos), IMPORT_CHUNK):
+        bloco = [(n, campos, documento_importado(tipo, campos)) for n, campos in novos[i:i + IMPORT_CHUNK]]
+        try:
+            # Cópias: insert_many acrescenta _id aos documentos
+            await db[tipo].insert_many([dict(doc) for _, _, doc in bloco], ordered=False)
+            erros = {}
+        except BulkWriteError as e:
+            # Ex.: a mesma chave criada entretanto por outro pedido
+            erros = {erro["index"]: erro for erro in e.details.get("writeErrors", [])}
+        for j, (n, campos, doc) in enumerate(bloco):
+            if j in erros:
+                rejeitados.append(rejeicao_escrita(tipo, folha, n, campos, erros[j]))
+            else:
+                inseridos.append(doc)
+    return inseridos
+
+async def upsert_linhas(tipo: str, folha: str, novos: list, alterados: list, rejeitados: list) -> tuple:
+    """Gravar linhas novas e alteradas com UpdateOne(upsert=True) em bulk_write por blocos.
     
-    # Import Equipamentos
-    if "Equipamentos" in wb.sheetnames or "Equipamento" in wb.sheetnames:
-        ws = wb["Equipamentos"] if "Equipamentos" in wb.sheetnames else wb["Equipamento"]
-        headers = [cell.value for cell in ws[1]]
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-            data = dict(zip(headers, row))
-            codigo = str(data.get("Codigo", data.get("codigo", data.get("Código", ""))))
-            if not codigo:
-                continue
-            
-            existing = await db.equipamentos.find_one({"codigo": codigo})
-            if existing:
-                continue
-            
-            equipamento = Equipamento(
-                codigo=codigo,
-                descricao=str(data.get("Descricao", data.get("descricao", data.get("Descrição", "")))),
-                marca=str(data.get("Marca", data.get("marca", "")) or ""),
-                modelo=str(data.get("Modelo", data.get("modelo", "")) or ""),
-                categoria=str(data.get("Categoria", data.get("categoria", "")) or ""),
-                numero_serie=str(data.get("Numero_Serie", data.get("numero_serie", data.get("Nº Série", ""))) or ""),
-                estado_conservacao=str(data.get("Estado_Conservacao", data.get("estado_conservacao", data.get("Estado", "Bom"))) or "Bom"),
-                ativo=str(data.get("Ativo", data.get("ativo", "Sim"))).lower() in ["sim", "true", "1", "yes"]
-            )
-            await db.equipamentos.insert_one(equipamento.model_dump())
-            imported["equipamentos"] += 1
+    Só os campos alterados vão em $set; o resto do documento novo vai em $setOnInsert.
+    Devolve (documentos inseridos, [(antes, depois)] dos atualizados).
+    """
+    chave = IMPORT_TIPOS[tipo]["chave"]
+    linhas = [(n, campos, None, campos) for n, campos in novos]
+    linhas += [(n, campos, existente, {campo: a["depois"] for campo, a in alteracoes.items()})
+               for n, campos, existente, alteracoes in alterados]
+    
+    inseridos, atualizados = [], []
+    for i in range(0, len(linhas), IMPORT_CHUNK):
+        bloco = linhas[i:i + IMPORT_CHUNK]
+        ops = []
+        for _, campos, _, alterar in bloco:
+            doc = documento_importado(tipo, campos)
+            ops.append(UpdateOne(
+                {chave: campos[chave]},
+                {"$set": alterar, "$setOnInsert": {c: v for c, v in doc.items() if c not in alterar}},
+                upsert=True
+            ))
+        try:
+            await db[tipo].bulk_write(ops, ordered=False)
+            erros = {}
+        except BulkWriteError as e:
+            erros = {erro["index"]: erro for erro in e.details.get("writeErrors", [])}
+        for j, (n, campos, existente, alterar) in enumerate(bloco):
+            if j in erros:
+                rejeitados.append(rejeicao_escrita(tipo, folha, n, campos, erros[j]))
+            elif existente is None:
+                inseridos.append(documento_importado(tipo, campos))
+            else:
+                atualizados.append((existente, {**existente, **alterar}))
+    return inseridos, atualizados
+
+async def importar_dados(blocos, progresso=None, mode: str = "insert", dry_run: bool = False) -> dict:
+    """Gravar os blocos lidos de um workbook e atualizar contadores e calendário de expirações.
     
-    # Import Viaturas
-    if "Viaturas" in wb.sheetnames or "Viatura" in wb.sheetnames:
-        ws = wb["Viaturas"] if "Viaturas" in wb.sheetnames else wb["Viatura"]
-        headers = [cell.value for cell in ws[1]]
-        
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-            data = dict(zip(headers, row))
-            matricula = str(data.get("Matricula", data.get("matricula", data.get("Matrícula", ""))))
-            if not matricula:
-                continue
-            
-            existing = await db.viaturas.find_one({"matricula": matricula})
-            if existing:
-                continue
-            
-            viatura = Viatura(
-                matricula=matricula,
-                marca=str(data.get("Marca", data.get("marca", "")) or ""),
-                modelo=str(data.get("Modelo", data.get("modelo", "")) or ""),
-                combustivel=str(data.get("Combustivel", data.get("combustivel", data.get("Combustível", "Gasoleo"))) or "Gasoleo"),
-                ativa=str(data.get("Ativa", data.get("ativa", "Sim"))).lower() in ["sim", "true", "1", "yes"]
-            )
-            await db.viaturas.insert_one(viatura.model_dump())
-            imported["viaturas"] += 1
+    `blocos` é um iterável assíncrono de (tipo, folha, linhas, rejeições), como o de `blocos_excel`:
+    cada bloco é comparado, gravado e descartado antes de ler o seguinte. `progresso`, se indicado,
+    é aguardado com o número de linhas tratadas após cada bloco.
     
-    # Import Materiais
-    if "Materiais" in wb.sheetnames or "Material" in wb.sheetnames:
-        ws = wb["Materiais"] if "Materiais" in wb.sheetnames else wb["Material"]
-        headers = [cell.value for cell in ws[1]]
+    mode="insert" só cria linhas novas (chaves existentes são rejeitadas); mode="upsert" também
+    atualiza os campos alterados. Com dry_run nada é gravado: devolve o resumo novos/alterados/
+    inalterados por tipo e exemplos das alterações.
+    """
+    imported = {tipo: 0 for tipo in IMPORT_TIPOS}
+    atualizados = {tipo: 0 for tipo in IMPORT_TIPOS}
+    inalterados = {tipo: 0 for tipo in IMPORT_TIPOS}
+    resumo = {tipo: {"novos": 0, "alterados": 0, "inalterados": 0} for tipo in IMPORT_TIPOS}
+    exemplos, rejeitados, total_rejeitados = {}, [], 0
+    async for tipo, folha, linhas, rejeitados_bloco in blocos:
+        config = IMPORT_TIPOS[tipo]
+        lidas = len(linhas) + len(rejeitados_bloco)
+        novos, alterados, iguais = await comparar_linhas(tipo, linhas) if linhas else ([], [], [])
         
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-            data = dict(zip(headers, row))
-            codigo = str(data.get("Codigo", data.get("codigo", data.get("Código", "")))  or data.get("ID_Material", ""))
-            if not codigo:
-                continue
-            
-            existing = await db.materiais.find_one({"codigo": codigo})
-            if existing:
-                continue
-            
-            material = Material(
-                codigo=codigo,
-                descricao=str(data.get("Descricao", data.get("descricao", data.get("Descrição", ""))) or ""),
-                unidade=str(data.get("Unidade", data.get("unidade", "unidade")) or "unidade"),
-                stock_minimo=float(data.get("Stock_Minimo", data.get("stock_minimo", 0)) or 0)
-            )
-            await db.materiais.insert_one(material.model_dump())
-            imported["materiais"] += 1
-    
-    # Import Obras
-    if "Obras" in wb.sheetnames or "Obra" in wb.sheetnames:
-        ws = wb["Obras"] if "Obras" in wb.sheetnames else wb["Obra"]
-        headers = [cell.value for cell in ws[1]]
+        if dry_run:
+            resumo[tipo]["novos"] += len(novos)
+            resumo[tipo]["alterados"] += len(alterados)
+            resumo[tipo]["inalterados"] += len(iguais)
+            if alterados and len(exemplos.get(tipo, [])) < MAX_EXEMPLOS_DIFF:
+                lista = exemplos.setdefault(tipo, [])
+                lista.extend(
+                    {"folha": folha, "linha": n, "chave": campos[config["chave"]], "alteracoes": alteracoes}
+                    for n, campos, _, alteracoes in alterados[:MAX_EXEMPLOS_DIFF - len(lista)]
+                )
+        elif mode == "upsert":
+            inseridos, atualizacoes = await upsert_linhas(tipo, folha, novos, alterados, rejeitados_bloco)
+            inalterados[tipo] += len(iguais)
+        else:
+            for n, campos in [(n, campos) for n, campos, _, _ in alterados] + iguais:
+                rejeitados_bloco.append({"folha": folha, "linha": n, "chave": campos[config["chave"]],
+                                         "motivo": f"{config['nome_chave']} já existe"})
+            inseridos, atualizacoes = await inserir_linhas(tipo, folha, novos, rejeitados_bloco), []
         
-        for row in ws.iter_rows(min_row=2, values_only=True):
-            if not row[0]:
-                continue
-            data = dict(zip(headers, row))
-            codigo = str(data.get("Codigo", data.get("codigo", data.get("ID_Obra", ""))))
-            if not codigo:
-                continue
-            
-            existing = await db.obras.find_one({"codigo": codigo})
-            if existing:
-                continue
-            
-            obra = Obra(
-                codigo=codigo,
-                nome=str(data.get("Nome", data.get("nome", "")) or ""),
-                estado=str(data.get("Estado", data.get("estado", "Ativa")) or "Ativa")
-            )
-            await db.obras.insert_one(obra.model_dump())
-            imported["obras"] += 1
+        if not dry_run:
+            imported[tipo] += len(inseridos)
+            atualizados[tipo] += len(atualizacoes)
+            delta = Counter()
+            for doc in inseridos:
+                delta.update(stats_delta(tipo, depois=doc))
+            for antes, depois in atualizacoes:
+                delta.update(stats_delta(tipo, antes=antes, depois=depois))
+            await inc_stats(tipo, dict(delta))
+            if tipo == "viaturas":
+                await sync_expiracoes(inseridos + [depois for _, depois in atualizacoes])
+        
+        # Só as primeiras MAX_REJEITADOS rejeições ficam guardadas; as restantes só contam
+        total_rejeitados += len(rejeitados_bloco)
+        rejeitados.extend(sorted(rejeitados_bloco, key=lambda r: r["linha"])[:MAX_REJEITADOS - len(rejeitados)])
+        if progresso:
+            await progresso(lidas)
+    
+    rejeicoes = {"rejeitados": rejeitados, "total_rejeitados": total_rejeitados}
+    if dry_run:
+        return {
+            "message": "Simulação concluída - nada foi gravado",
+            "dry_run": True,
+            "mode": mode,
+            "resumo": resumo,
+            "exemplos": exemplos,
+            **rejeicoes
+        }
+    return {
+        "message": "Importação concluída",
+        "mode": mode,
+        "imported": imported,
+        "atualizados": atualizados,
+        "inalterados": inalterados,
+        **rejeicoes
+    }
+
+def ler_ficheiro_excel(origem):
+    """Gerador dos blocos de `ler_workbook` com o workbook aberto em modo streaming (read_only)"""
+    wb = load_workbook(origem, read_only=True, data_only=True)
+    try:
+        yield from ler_workbook(wb)
+    finally:
+        wb.close()
+
+async def blocos_excel(origem):
+    """Blocos de `ler_ficheiro_excel`, cada um lido numa thread para não bloquear o event loop"""
+    blocos = ler_ficheiro_excel(origem)
+    try:
+        while (bloco := await asyncio.to_thread(next, blocos, None)) is not None:
+            yield bloco
+    finally:
+        await asyncio.to_thread(blocos.close)
+
+def contar_linhas_excel(origem) -> Optional[int]:
+    """Estimativa das linhas a importar pela dimensão declarada das folhas (None se não a tiverem)"""
+    wb = load_workbook(origem, read_only=True, data_only=True)
+    try:
+        total = 0
+        for config in IMPORT_TIPOS.values():
+            folha = next((nome for nome in config["folhas"] if nome in wb.sheetnames), None)
+            if folha:
+                if wb[folha].max_row is None:
+                    return None
+                total += max(wb[folha].max_row - 1, 0)
+        return total
+    finally:
+        wb.close()
+
+async def executar_job_importacao(job_id: str, caminho: str, mode: str = "insert", dry_run: bool = False):
+    """Processar uma importação em segundo plano, registando o progresso no job"""
+    try:
+        total = await asyncio.to_thread(contar_linhas_excel, caminho)
+        await atualizar_job(job_id, estado="a_importar", progresso={"processadas": 0, "total": total})
+        
+        async def progresso(n):
+            await db.jobs.update_one({"id": job_id}, {"$inc": {"progresso.processadas": n}})
+        
+        resultado = await importar_dados(blocos_excel(caminho), progresso, mode, dry_run)
+        await atualizar_job(job_id, estado="concluido", resultado=resultado)
+    except Exception as e:
+        logger.exception(f"Erro no job de importação {job_id}")
+        await atualizar_job(job_id, estado="erro", erro=str(e))
+    finally:
+        Path(caminho).unlink(missing_ok=True)
+
+@api_router.post("/import/excel")
+async def import_excel(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    file: UploadFile = File(...),
+    assincrono: bool = Query(False),
+    mode: str = Query("insert", pattern="^(insert|upsert)$"),
+    dry_run: bool = Query(False),
+    user=Depends(get_current_user)
+):
+    """Import data from Excel file
     
-    return {"message": "Importação concluída", "imported": imported}
+    mode=upsert atualiza os registos existentes; dry_run=true só calcula as diferenças.
+    Com assincrono=true o ficheiro é guardado em disco e processado em segundo plano;
+    a resposta (202) traz o job_id a consultar em GET /api/jobs/{job_id}.
+    """
+    if not file.filename.endswith(('.xlsx', '.xls')):
+        raise HTTPException(status_code=400, detail="Apenas ficheiros Excel são permitidos")
+    
+    if not assincrono:
+        return await importar_dados(blocos_excel(file.file), mode=mode, dry_run=dry_run)
+    
+    fd, caminho = tempfile.mkstemp(prefix="import-", suffix=".xlsx")
+    with os.fdopen(fd, "wb") as destino:
+        await asyncio.to_thread(shutil.copyfileobj, file.file, destino)
+    
+    job = await criar_job("import_excel", user, ficheiro=file.filename, mode=mode, dry_run=dry_run)
+    background_tasks.add_task(executar_job_importacao, job["id"], caminho, mode, dry_run)
+    response.status_code = 202
+    return {"job_id": job["id"], "estado": job["estado"]}
+
+def sim_nao(valor) -> str:
+    return "Sim" if valor else "Não"
+
+# Folhas da exportação Excel: (folha, coleção, [(cabeçalho, campo[, conversor])])
+EXPORT_FOLHAS = [
+    ("Equipamentos", "equipamentos", [
+        ("Código", "codigo"), ("Descrição", "descricao"), ("Marca", "marca"), ("Modelo", "modelo"),
+        ("Categoria", "categoria"), ("Nº Série", "numero_serie"), ("Estado", "estado_conservacao"),
+        ("Ativo", "ativo", sim_nao),
+    ]),
+    ("Viaturas", "viaturas", [
+        ("Matrícula", "matricula"), ("Marca", "marca"), ("Modelo", "modelo"), ("Combustível", "combustivel"),
+        ("Data Vistoria", "data_vistoria"), ("Data Seguro", "data_seguro"), ("Ativa", "ativa", sim_nao),
+    ]),
+    ("Materiais", "materiais", [
+        ("Código", "codigo"), ("Descrição", "descricao"), ("Unidade", "unidade"),
+        ("Stock Atual", "stock_atual"), ("Stock Mínimo", "stock_minimo"), ("Ativo", "ativo", sim_nao),
+    ]),
+    ("Obras", "obras", [
+        ("Código", "codigo"), ("Nome", "nome"), ("Endereço", "endereco"), ("Cliente", "cliente"), ("Estado", "estado"),
+    ]),
+]
+EXPORT_BATCH = 2000
+
+def anexar_linhas(ws, linhas: list):
+    for linha in linhas:
+        ws.append(linha)
+
+async def gerar_excel(caminho: str):
+    """Escrever o workbook de exportação em `caminho` com memória limitada.
+    
+    Os cursores são lidos em lotes de EXPORT_BATCH e cada lote é acrescentado a um workbook
+    write_only numa thread; o openpyxl vai despejando as folhas para ficheiros temporários.
+    """
+    wb = Workbook(write_only=True)
+    for folha, colecao, colunas in EXPORT_FOLHAS:
+        ws = wb.create_sheet(folha)
+        ws.append([coluna[0] for coluna in colunas])
+        projecao = {"_id": 0, **{coluna[1]: 1 for coluna in colunas}}
+        conversores = [(coluna[1], coluna[2] if len(coluna) > 2 else None) for coluna in colunas]
+        
+        lote = []
+        async for doc in db[colecao].find({}, projecao).batch_size(EXPORT_BATCH):
+            lote.append([conversor(doc.get(campo)) if conversor else doc.get(campo) for campo, conversor in conversores])
+            if len(lote) >= EXPORT_BATCH:
+                await asyncio.to_thread(anexar_linhas, ws, lote)
+                lote = []
+        if lote:
+            await asyncio.to_thread(anexar_linhas, ws, lote)
+    await asyncio.to_thread(wb.save, caminho)
 
 @api_router.get("/export/excel")
 async def export_excel(user=Depends(get_current_user)):
-    equipamentos = await db.equipamentos.find({}, {"_id": 0}).to_list(1000)
-    viaturas = await db.viaturas.find({}, {"_id": 0}).to_list(1000)
-    materiais = await db.materiais.find({}, {"_id": 0}).to_list(1000)
-    obras = await db.obras.find({}, {"_id": 0}).to_list(1000)
-    
-    wb = Workbook()
-    
-    ws = wb.active
-    ws.title = "Equipamentos"
-    ws.append(["Código", "Descrição", "Marca", "Modelo", "Categoria", "Nº Série", "Estado", "Ativo"])
-    for e in equipamentos:
-        ws.append([e.get("codigo"), e.get("descricao"), e.get("marca"), e.get("modelo"), 
-                   e.get("categoria"), e.get("numero_serie"), e.get("estado_conservacao"),
-                   "Sim" if e.get("ativo") else "Não"])
-    
-    ws = wb.create_sheet("Viaturas")
-    ws.append(["Matrícula", "Marca", "Modelo", "Combustível", "Data Vistoria", "Data Seguro", "Ativa"])
-    for v in viaturas:
-        ws.append([v.get("matricula"), v.get("marca"), v.get("modelo"), v.get("combustivel"),
-                   v.get("data_vistoria"), v.get("data_seguro"), "Sim" if v.get("ativa") else "Não"])
-    
-    ws = wb.create_sheet("Materiais")
-    ws.append(["Código", "Descrição", "Unidade", "Stock Atual", "Stock Mínimo", "Ativo"])
-    for m in materiais:
-        ws.append([m.get("codigo"), m.get("descricao"), m.get("unidade"),
-                   m.get("stock_atual"), m.get("stock_minimo"), "Sim" if m.get("ativo") else "Não"])
-    
-    ws = wb.create_sheet("Obras")
-    ws.append(["Código", "Nome", "Endereço", "Cliente", "Estado"])
-    for o in obras:
-        ws.append([o.get("codigo"), o.get("nome"), o.get("endereco"), o.get("cliente"), o.get("estado")])
-    
-    buffer = BytesIO()
-    wb.save(buffer)
-    buffer.seek(0)
-    
-    return Response(
-        content=buffer.getvalue(),
+    fd, caminho = tempfile.mkstemp(prefix="export-", suffix=".xlsx")
+    os.close(fd)
+    try:
+        await gerar_excel(caminho)
+    except Exception:
+        Path(caminho).unlink(missing_ok=True)
+        raise
+    
+    # O ficheiro temporário é apagado depois de enviado
+    return FileResponse(
+        caminho,
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        headers={"Content-Disposition": "attachment; filename=dados_armazem.xlsx"}
+        filename="dados_armazem.xlsx",
+        background=BackgroundTask(os.unlink, caminho)
     )
 
-@api_router.get("/export/pdf")
-async def export_pdf(user=Depends(get_current_user)):
-    equipamentos = await db.equipamentos.find({}, {"_id": 0}).to_list(1000)
-    viaturas = await db.viaturas.find({}, {"_id": 0}).to_list(1000)
-    materiais = await db.materiais.find({}, {"_id": 0}).to_list(1000)
-    obras = await db.obras.find({}, {"_id": 0}).to_list(1000)
-    
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-    styles = getSampleStyleSheet()
-    elements = []
-    
-    elements.append(Paragraph("José Firmino - Gestão de Armazém", styles['Title']))
-    elements.append(Paragraph(f"Data: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-    elements.append(Spacer(1, 20))
-    
-    summary_data = [
-        ["Categoria", "Total", "Ativos/Ativas"],
-        ["Equipamentos", len(equipamentos), len([e for e in equipamentos if e.get("ativo")])],
-        ["Viaturas", len(viaturas), len([v for v in viaturas if v.get("ativa")])],
-        ["Materiais", len(materiais), "-"],
-        ["Obras", len(obras), len([o for o in obras if o.get("estado") == "Ativa"])]
+# Exportação de linhas em bruto (CSV / NDJSON): coleção -> (modelo com as colunas, campo de data)
+EXPORT_COLECOES = {
+    "equipamentos": (Equipamento, "created_at"),
+    "viaturas": (Viatura, "created_at"),
+    "materiais": (Material, "created_at"),
+    "obras": (Obra, "created_at"),
+    "movimentos": (Movimento, "created_at"),
+    "movimentos_stock": (MovimentoStock, "data_hora"),
+    "movimentos_viaturas": (MovimentoViatura, "created_at"),
+}
+EXPORT_FORMATOS = {"csv": "text/csv; charset=utf-8", "ndjson": "application/x-ndjson"}
+# Linhas acumuladas antes de cada escrita na resposta
+EXPORT_LINHAS_POR_ENVIO = 500
+
+def data_filtro(valor: str) -> str:
+    """Normalizar uma data/hora ISO do filtro para o formato guardado (UTC, isoformat)"""
+    try:
+        data = datetime.fromisoformat(valor.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Data inválida: {valor}")
+    if data.tzinfo is None:
+        data = data.replace(tzinfo=timezone.utc)
+    return data.astimezone(timezone.utc).isoformat()
+
+def valor_csv(valor):
+    if isinstance(valor, (dict, list)):
+        return json.dumps(valor, ensure_ascii=False, default=str)
+    return valor
+
+async def linhas_exportacao(cursor, formato: str, campos: list):
+    """Gerar o conteúdo da exportação à medida que o cursor é lido (memória constante)"""
+    buffer = StringIO()
+    if formato == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(campos)
+    n = 0
+    async for doc in cursor:
+        if formato == "csv":
+            writer.writerow([valor_csv(doc.get(campo)) for campo in campos])
+        else:
+            buffer.write(json.dumps(doc, ensure_ascii=False, default=str))
+            buffer.write("\n")
+        n += 1
+        if n % EXPORT_LINHAS_POR_ENVIO == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+@api_router.get("/export/{colecao}.{formato}")
+async def export_colecao(
+    colecao: str,
+    formato: str,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    fields: Optional[str] = None,
+    user=Depends(get_current_user)
+):
+    """Exportar as linhas de uma coleção em CSV ou NDJSON, em streaming a partir do cursor.
+    
+    since/until filtram pelo campo de data da coleção (created_at ou data_hora; until exclusivo);
+    fields é uma lista de campos separados por vírgulas (por omissão, todos os do modelo).
+    """
+    if colecao not in EXPORT_COLECOES:
+        raise HTTPException(status_code=404, detail="Coleção não encontrada")
+    if formato not in EXPORT_FORMATOS:
+        raise HTTPException(status_code=400, detail="Formato inválido (csv ou ndjson)")
+    
+    modelo, campo_data = EXPORT_COLECOES[colecao]
+    campos = list(modelo.model_fields)
+    if fields:
+        campos = [campo.strip() for campo in fields.split(",") if campo.strip()]
+        desconhecidos = [campo for campo in campos if campo not in modelo.model_fields]
+        if desconhecidos:
+            raise HTTPException(status_code=400, detail=f"Campos desconhecidos: {', '.join(desconhecidos)}")
+    
+    query = {}
+    if since or until:
+        query[campo_data] = {}
+        if since:
+            query[campo_data]["$gte"] = data_filtro(since)
+        if until:
+            query[campo_data]["$lt"] = data_filtro(until)
+    
+    cursor = db[colecao].find(query, {"_id": 0, **{campo: 1 for campo in campos}}).batch_size(EXPORT_BATCH)
+    return StreamingResponse(
+        linhas_exportacao(cursor, formato, campos),
+        media_type=EXPORT_FORMATOS[formato],
+        headers={"Content-Disposition": f"attachment; filename={colecao}.{formato}"}
+    )
+
+# Relatório PDF: renderizado num processo à parte e guardado enquanto os dados não mudarem
+PDF_COLECOES = ("equipamentos", "viaturas", "materiais", "obras")
+pdf_pool: Optional[ProcessPoolExecutor] = None
+pdf_cache = {"versao": None, "conteudo": None}
+pdf_lock = asyncio.Lock()
+
+def data_curta(valor: Optional[str]) -> str:
+    return valor[:10] if valor else ""
+
+async def contar_por_obra(colecao: str) -> dict:
+    grupos = db[colecao].aggregate([
+        {"$match": {"obra_id": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$obra_id", "n": {"$sum": 1}}}
+    ])
+    return {g["_id"]: g["n"] async for g in grupos}
+
+async def dados_relatorio_pdf() -> dict:
+    """Ler os dados do relatório: linhas já formatadas de cada secção, lidas dos cursores"""
+    stats_docs, obras = await asyncio.gather(
+        db.stats.find({"_id": {"$in": list(STATS_CAMPOS)}}).to_list(None),
+        db.obras.find({}, {"_id": 0, "id": 1, "codigo": 1, "nome": 1, "cliente": 1, "endereco": 1, "estado": 1})
+            .sort("codigo", ASCENDING).to_list(None)
+    )
+    stats = {doc["_id"]: doc for doc in stats_docs}
+    if len(stats) < len(STATS_CAMPOS):
+        stats = await rebuild_stats()
+    codigos_obra = {o["id"]: o["codigo"] for o in obras}
+    
+    def obra(doc):
+        return codigos_obra.get(doc.get("obra_id"), "Armazém")
+    
+    equipamentos = [
+        [e.get("codigo"), e.get("descricao"), f"{e.get('marca', '')} {e.get('modelo', '')}".strip(), e.get("categoria"),
+         e.get("estado_conservacao"), obra(e), sim_nao(e.get("ativo"))]
+        async for e in db.equipamentos.find({}, {
+            "_id": 0, "codigo": 1, "descricao": 1, "marca": 1, "modelo": 1, "categoria": 1,
+            "estado_conservacao": 1, "obra_id": 1, "ativo": 1
+        }).sort("codigo", ASCENDING)
+    ]
+    viaturas = [
+        [v.get("matricula"), f"{v.get('marca', '')} {v.get('modelo', '')}".strip(), v.get("combustivel"),
+         data_curta(v.get("data_vistoria")), data_curta(v.get("data_seguro")), data_curta(v.get("data_ipo")),
+         v.get("kms_atual"), obra(v), sim_nao(v.get("ativa"))]
+        async for v in db.viaturas.find({}, {
+            "_id": 0, "matricula": 1, "marca": 1, "modelo": 1, "combustivel": 1, "data_vistoria": 1,
+            "data_seguro": 1, "data_ipo": 1, "kms_atual": 1, "obra_id": 1, "ativa": 1
+        }).sort("matricula", ASCENDING)
+    ]
+    stock_baixo = [
+        [m.get("codigo"), m.get("descricao"), m.get("unidade"), m.get("stock_atual"), m.get("stock_minimo"),
+         (m.get("stock_minimo") or 0) - (m.get("stock_atual") or 0)]
+        async for m in db.materiais.find(
+            {"stock_minimo": {"$gt": 0}, "$expr": {"$lte": ["$stock_atual", "$stock_minimo"]}},
+            {"_id": 0, "codigo": 1, "descricao": 1, "unidade": 1, "stock_atual": 1, "stock_minimo": 1}
+        ).sort("codigo", ASCENDING)
+    ]
+    equipamentos_obra, viaturas_obra = await asyncio.gather(contar_por_obra("equipamentos"), contar_por_obra("viaturas"))
+    obras_ativas = [
+        [o.get("codigo"), o.get("nome"), o.get("cliente"), o.get("endereco"),
+         equipamentos_obra.get(o["id"], 0), viaturas_obra.get(o["id"], 0)]
+        for o in obras if o.get("estado") == "Ativa"
     ]
     
-    table = Table(summary_data)
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.Color(0.976, 0.451, 0.086)),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(table)
-    
-    doc.build(elements)
-    buffer.seek(0)
-    
-    return Response(content=buffer.getvalue(), media_type="application/pdf",
+    return {
+        "titulo": "José Firmino - Gestão de Armazém",
+        "gerado_em": datetime.now().strftime('%d/%m/%Y %H:%M'),
+        "resumo": [
+            ["Categoria", "Total", "Ativos/Ativas"],
+            ["Equipamentos", stats["equipamentos"].get("total", 0), stats["equipamentos"].get("ativos", 0)],
+            ["Viaturas", stats["viaturas"].get("total", 0), stats["viaturas"].get("ativas", 0)],
+            ["Materiais", stats["materiais"].get("total", 0), "-"],
+            ["Obras", stats["obras"].get("total", 0), stats["obras"].get("ativas", 0)],
+            ["Stock abaixo do mínimo", len(stock_baixo), "-"]
+        ],
+        "seccoes": [
+            {"titulo": "Equipamentos", "linhas": equipamentos, "larguras": [3, 7, 4.5, 3.5, 2.5, 3, 1.5],
+             "cabecalho": ["Código", "Descrição", "Marca / Modelo", "Categoria", "Estado", "Obra", "Ativo"]},
+            {"titulo": "Viaturas", "linhas": viaturas, "larguras": [2.5, 5, 2.5, 2.5, 2.5, 2.5, 2.5, 3, 1.5],
+             "cabecalho": ["Matrícula", "Marca / Modelo", "Combustível", "Vistoria", "Seguro", "IPO", "KMs", "Obra", "Ativa"]},
+            {"titulo": "Stock abaixo do mínimo", "linhas": stock_baixo, "larguras": [3, 10, 2.5, 2.5, 2.5, 2.5],
+             "cabecalho": ["Código", "Descrição", "Unidade", "Stock Atual", "Stock Mínimo", "Em falta"],
+             "vazio": "Nenhum material abaixo do stock mínimo"},
+            {"titulo": "Obras ativas", "linhas": obras_ativas, "larguras": [3, 6, 5, 6, 2.5, 2.5],
+             "cabecalho": ["Código", "Nome", "Cliente", "Endereço", "Equipamentos", "Viaturas"],
+             "vazio": "Nenhuma obra ativa"},
+        ]
+    }
+
+def criar_pdf_pool() -> ProcessPoolExecutor:
+    # spawn: os processos não herdam o event loop nem as threads do Motor
+    return ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+async def renderizar_pdf(dados: dict) -> bytes:
+    """Renderizar no pool de processos; se um processo morreu (pool inutilizado), recriar e repetir uma vez"""
+    global pdf_pool
+    args = (dados["titulo"], dados["gerado_em"], dados["resumo"], dados["seccoes"])
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(pdf_pool, gerar_pdf, *args)
+    except BrokenProcessPool:
+        logger.warning("Pool de processos PDF inutilizado, a recriar")
+        pdf_pool = criar_pdf_pool()
+        return await loop.run_in_executor(pdf_pool, gerar_pdf, *args)
+
+@api_router.get("/export/pdf")
+async def export_pdf(user=Depends(get_current_user)):
+    versao = await versoes_dados(*PDF_COLECOES)
+    conteudo = pdf_cache["conteudo"] if pdf_cache["versao"] == versao else None
+    if conteudo is None:
+        # Uma renderização de cada vez: downloads simultâneos do mesmo relatório esperam pela mesma
+        async with pdf_lock:
+            versao = await versoes_dados(*PDF_COLECOES)
+            if pdf_cache["versao"] != versao:
+                conteudo = await renderizar_pdf(await dados_relatorio_pdf())
+                pdf_cache.update(versao=versao, conteudo=conteudo)
+            conteudo = pdf_cache["conteudo"]
+    
+    return Response(content=conteudo, media_type="application/pdf",
                     headers={"Content-Disposition": "attachment; filename=relatorio_armazem.pdf"})
 
 # ==================== SUMMARY ROUTE ====================
 @api_router.get("/summary")
 async def get_summary(user=Depends(get_current_user)):
-    equipamentos = await db.equipamentos.find({}, {"_id": 0}).to_list(1000)
-    viaturas = await db.viaturas.find({}, {"_id": 0}).to_list(1000)
-    materiais = await db.materiais.find({}, {"_id": 0}).to_list(1000)
-    obras = await db.obras.find({}, {"_id": 0}).to_list(1000)
+    today = datetime.now(timezone.utc).date()
+    
+    stats_docs, viaturas_alerta, materiais_baixos = await asyncio.gather(
+        db.stats.find({"_id": {"$in": list(STATS_CAMPOS)}}).to_list(None),
+        viaturas_a_expirar(
+            ("vistoria", "seguro"), ALERT_DAYS_BEFORE, today,
+            {"_id": 0, "matricula": 1, "marca": 1, "modelo": 1, "data_vistoria": 1, "data_seguro": 1},
+            apenas_ativas=False
+        ),
+        db.materiais.find(
+            {"stock_minimo": {"$gt": 0}, "$expr": {"$lte": ["$stock_atual", "$stock_minimo"]}},
+            {"_id": 0, "codigo": 1, "descricao": 1, "stock_atual": 1, "unidade": 1}
+        ).to_list(None)
+    )
+    stats = {doc["_id"]: doc for doc in stats_docs}
+    if len(stats) < len(STATS_CAMPOS):
+        stats = await rebuild_stats()
     
     alerts = []
-    today = datetime.now(timezone.utc).date()
     
-    for v in viaturas:
-        for field, tipo, msg in [("data_vistoria", "vistoria", "Vistoria"), ("data_seguro", "seguro", "Seguro")]:
-            if v.get(field):
-                try:
-                    date = datetime.fromisoformat(v[field].replace("Z", "+00:00")).date()
-                    days_until = (date - today).days
-                    if days_until <= ALERT_DAYS_BEFORE:
-                        alerts.append({
-                            "type": tipo,
-                            "item": f"{v['marca']} {v['modelo']} ({v['matricula']})",
-                            "message": f"{msg} em {days_until} dias" if days_until >= 0 else f"{msg} expirado",
-                            "urgent": days_until < 0
-                        })
-                except:
-                    pass
-    
-    for m in materiais:
-        if m.get("stock_atual", 0) <= m.get("stock_minimo", 0) and m.get("stock_minimo", 0) > 0:
-            alerts.append({
-                "type": "stock",
-                "item": f"{m['codigo']} - {m['descricao']}",
-                "message": f"Stock baixo: {m.get('stock_atual', 0)} {m.get('unidade', 'un')}",
-                "urgent": m.get("stock_atual", 0) == 0
-            })
+    nomes = {"vistoria": "Vistoria", "seguro": "Seguro"}
+    for alerta in calcular_alertas(viaturas_alerta, today, ALERT_DAYS_BEFORE, tipos=("vistoria", "seguro")):
+        v = viaturas_alerta[alerta["indice"]]
+        msg, days_until = nomes[alerta["tipo"]], alerta["dias_restantes"]
+        alerts.append({
+            "type": alerta["tipo"],
+            "item": f"{v.get('marca', '')} {v.get('modelo', '')} ({v['matricula']})",
+            "message": f"{msg} em {days_until} dias" if days_until >= 0 else f"{msg} expirado",
+            "urgent": days_until < 0
+        })
+    
+    for m in materiais_baixos:
+        alerts.append({
+            "type": "stock",
+            "item": f"{m['codigo']} - {m['descricao']}",
+            "message": f"Stock baixo: {m.get('stock_atual', 0)} {m.get('unidade', 'un')}",
+            "urgent": m.get("stock_atual", 0) == 0
+        })
     
     return {
-        "equipamentos": {
-            "total": len(equipamentos),
-            "ativos": len([e for e in equipamentos if e.get("ativo", True)]),
-            "em_obra": len([e for e in equipamentos if e.get("obra_id")])
-        },
-        "viaturas": {
-            "total": len(viaturas),
-            "ativas": len([v for v in viaturas if v.get("ativa", True)]),
-            "em_obra": len([v for v in viaturas if v.get("obra_id")])
-        },
-        "materiais": {
-            "total": len(materiais),
-            "stock_total": sum(m.get("stock_atual", 0) for m in materiais)
-        },
-        "obras": {
-            "total": len(obras),
-            "ativas": len([o for o in obras if o.get("estado") == "Ativa"])
-        },
+        **{tipo: {campo: stats[tipo].get(campo, 0) for campo in campos} for tipo, campos in STATS_CAMPOS.items()},
         "alerts": alerts
     }
 
 # ==================== RELATÓRIOS AVANÇADOS ====================
+def periodo_range(mes: Optional[int], ano: Optional[int]) -> Optional[dict]:
+    """Intervalo ISO [início, fim) para filtrar por mês/ano (None sem filtro de período)"""
+    if mes and ano:
+        start_date = datetime(ano, mes, 1, tzinfo=timezone.utc)
+        if mes == 12:
+            end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
+        else:
+            end_date = datetime(ano, mes + 1, 1, tzinfo=timezone.utc)
+    elif ano:
+        start_date = datetime(ano, 1, 1, tzinfo=timezone.utc)
+        end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        return None
+    return {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
+
+def first_of(field: str):
+    """Primeiro elemento de um array resultante de $lookup"""
+    return {"$arrayElemAt": [field, 0]}
+
+def lookup_obra_stages() -> list:
+    """Etapas de agregação que acrescentam obra_codigo/obra_nome (apenas se a obra existir)"""
+    return [
+        {"$lookup": {"from": "obras", "localField": "obra_id", "foreignField": "id", "as": "_obra"}},
+        {"$addFields": {"_obra": first_of("$_obra")}},
+        {"$addFields": {
+            "obra_codigo": {"$cond": ["$_obra", {"$ifNull": ["$_obra.codigo", ""]}, "$$REMOVE"]},
+            "obra_nome": {"$cond": ["$_obra", {"$ifNull": ["$_obra.nome", ""]}, "$$REMOVE"]}
+        }},
+        {"$project": {"_obra": 0}}
+    ]
+
 @api_router.get("/relatorios/movimentos")
 async def get_relatorio_movimentos(
     obra_id: Optional[str] = None,
     mes: Optional[int] = None,
     ano: Optional[int] = None,
     tipo_recurso: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     user=Depends(get_current_user)
 ):
     """Relatório de movimentos de equipamentos e viaturas filtrado por obra e período"""
+    return json_pronto(await relatorio_em_cache(
+        "movimentos",
+        {
+            "obra_id": obra_id,
+            "mes": mes,
+            "ano": ano,
+            "tipo_recurso": tipo_recurso,
+            "limit": limit,
+            "offset": offset
+        },
+        ("movimentos", "equipamentos", "viaturas", "obras"),
+        lambda: calcular_relatorio_movimentos(obra_id, mes, ano, tipo_recurso, limit, offset)
+    ))
+
+async def calcular_relatorio_movimentos(
+    obra_id: Optional[str] = None,
+    mes: Optional[int] = None,
+    ano: Optional[int] = None,
+    tipo_recurso: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0
+):
     # Build query filter
     query = {}
     
@@ -1133,142 +2777,201 @@ async def get_relatorio_movimentos(
     if tipo_recurso:
         query["tipo_recurso"] = tipo_recurso
     
-    # Date filtering
-    if mes and ano:
-        start_date = datetime(ano, mes, 1, tzinfo=timezone.utc)
-        if mes == 12:
-            end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
-        else:
-            end_date = datetime(ano, mes + 1, 1, tzinfo=timezone.utc)
-        query["created_at"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-    elif ano:
-        start_date = datetime(ano, 1, 1, tzinfo=timezone.utc)
-        end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
-        query["created_at"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-    
-    movimentos = await db.movimentos.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    
-    # Enrich with resource and obra details
-    enriched = []
-    for mov in movimentos:
-        item = {**mov}
-        
-        # Get resource details
-        if mov.get("tipo_recurso") == "equipamento":
-            recurso = await db.equipamentos.find_one({"id": mov["recurso_id"]}, {"_id": 0, "codigo": 1, "descricao": 1})
-            if recurso:
-                item["recurso_codigo"] = recurso.get("codigo", "")
-                item["recurso_descricao"] = recurso.get("descricao", "")
-        elif mov.get("tipo_recurso") == "viatura":
-            recurso = await db.viaturas.find_one({"id": mov["recurso_id"]}, {"_id": 0, "matricula": 1, "marca": 1, "modelo": 1})
-            if recurso:
-                item["recurso_codigo"] = recurso.get("matricula", "")
-                item["recurso_descricao"] = f"{recurso.get('marca', '')} {recurso.get('modelo', '')}"
-        
-        # Get obra details
-        if mov.get("obra_id"):
-            obra = await db.obras.find_one({"id": mov["obra_id"]}, {"_id": 0, "codigo": 1, "nome": 1})
-            if obra:
-                item["obra_codigo"] = obra.get("codigo", "")
-                item["obra_nome"] = obra.get("nome", "")
-        
-        enriched.append(item)
+    periodo = periodo_range(mes, ano)
+    if periodo:
+        query["created_at"] = periodo
+    
+    # Uma só agregação: página de linhas enriquecidas ($lookup) + estatísticas ($facet)
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "movimentos": [
+                {"$sort": {"created_at": -1, "id": -1}},
+                {"$skip": offset},
+                {"$limit": limit},
+                {"$lookup": {"from": "equipamentos", "localField": "recurso_id", "foreignField": "id", "as": "_equipamento"}},
+                {"$lookup": {"from": "viaturas", "localField": "recurso_id", "foreignField": "id", "as": "_viatura"}},
+                {"$addFields": {
+                    "_equipamento": first_of("$_equipamento"),
+                    "_viatura": first_of("$_viatura")
+                }},
+                {"$addFields": {
+                    "recurso_codigo": {"$switch": {
+                        "branches": [
+                            {"case": {"$and": [{"$eq": ["$tipo_recurso", "equipamento"]}, "$_equipamento"]},
+                             "then": {"$ifNull": ["$_equipamento.codigo", ""]}},
+                            {"case": {"$and": [{"$eq": ["$tipo_recurso", "viatura"]}, "$_viatura"]},
+                             "then": {"$ifNull": ["$_viatura.matricula", ""]}}
+                        ],
+                        "default": "$$REMOVE"
+                    }},
+                    "recurso_descricao": {"$switch": {
+                        "branches": [
+                            {"case": {"$and": [{"$eq": ["$tipo_recurso", "equipamento"]}, "$_equipamento"]},
+                             "then": {"$ifNull": ["$_equipamento.descricao", ""]}},
+                            {"case": {"$and": [{"$eq": ["$tipo_recurso", "viatura"]}, "$_viatura"]},
+                             "then": {"$concat": [
+                                 {"$ifNull": ["$_viatura.marca", ""]}, " ", {"$ifNull": ["$_viatura.modelo", ""]}
+                             ]}}
+                        ],
+                        "default": "$$REMOVE"
+                    }}
+                }},
+                *lookup_obra_stages(),
+                {"$project": {"_id": 0, "_equipamento": 0, "_viatura": 0}}
+            ],
+            "totais": [
+                {"$group": {
+                    "_id": None,
+                    "total_movimentos": {"$sum": 1},
+                    "total_saidas": {"$sum": {"$cond": [{"$eq": ["$tipo_movimento", "Saida"]}, 1, 0]}},
+                    "total_devolucoes": {"$sum": {"$cond": [{"$eq": ["$tipo_movimento", "Devolucao"]}, 1, 0]}}
+                }}
+            ],
+            "recursos": [
+                {"$group": {"_id": {"tipo": "$tipo_recurso", "recurso_id": "$recurso_id"}}},
+                {"$group": {"_id": "$_id.tipo", "distintos": {"$sum": 1}}}
+            ]
+        }}
+    ]
     
-    # Statistics
-    total_saidas = len([m for m in movimentos if m.get("tipo_movimento") == "Saida"])
-    total_devolucoes = len([m for m in movimentos if m.get("tipo_movimento") == "Devolucao"])
-    equipamentos_movidos = len(set([m["recurso_id"] for m in movimentos if m.get("tipo_recurso") == "equipamento"]))
-    viaturas_movidas = len(set([m["recurso_id"] for m in movimentos if m.get("tipo_recurso") == "viatura"]))
+    resultado = (await db.movimentos.aggregate(pipeline).to_list(1))[0]
+    totais = resultado["totais"][0] if resultado["totais"] else {}
+    recursos = {r["_id"]: r["distintos"] for r in resultado["recursos"]}
+    total_movimentos = totais.get("total_movimentos", 0)
     
     return {
-        "movimentos": enriched,
+        "movimentos": resultado["movimentos"],
         "estatisticas": {
-            "total_movimentos": len(movimentos),
-            "total_saidas": total_saidas,
-            "total_devolucoes": total_devolucoes,
-            "equipamentos_movidos": equipamentos_movidos,
-            "viaturas_movidas": viaturas_movidas
+            "total_movimentos": total_movimentos,
+            "total_saidas": totais.get("total_saidas", 0),
+            "total_devolucoes": totais.get("total_devolucoes", 0),
+            "equipamentos_movidos": recursos.get("equipamento", 0),
+            "viaturas_movidas": recursos.get("viatura", 0)
+        },
+        "paginacao": {
+            "offset": offset,
+            "limit": limit,
+            "total": total_movimentos
         }
     }
 
+def consumo_por_material_stages(campos: dict) -> list:
+    """Agrupar movimentos de stock por material e juntar os dados do material.
+    
+    `campos` define os acumuladores do $group; materiais inexistentes são descartados.
+    """
+    return [
+        {"$group": {"_id": "$material_id", **campos}},
+        {"$lookup": {"from": "materiais", "localField": "_id", "foreignField": "id", "as": "_material"}},
+        {"$unwind": "$_material"},
+        {"$sort": {"_material.codigo": 1}},
+        {"$project": {
+            "_id": 0,
+            "codigo": {"$ifNull": ["$_material.codigo", ""]},
+            "descricao": {"$ifNull": ["$_material.descricao", ""]},
+            "unidade": {"$ifNull": ["$_material.unidade", "un"]},
+            **{campo: 1 for campo in campos}
+        }}
+    ]
+
+def soma_quantidade_se(tipo_movimento: str, negar: bool = False) -> dict:
+    """$sum da quantidade dos movimentos de um tipo (ou de todos os outros tipos)"""
+    condicao = {"$ne" if negar else "$eq": ["$tipo_movimento", tipo_movimento]}
+    return {"$sum": {"$cond": [condicao, "$quantidade", 0]}}
+
 @api_router.get("/relatorios/stock")
 async def get_relatorio_stock(
     obra_id: Optional[str] = None,
     mes: Optional[int] = None,
     ano: Optional[int] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     user=Depends(get_current_user)
 ):
     """Relatório de movimentos de stock (materiais) filtrado por obra e período"""
+    return json_pronto(await relatorio_em_cache(
+        "stock",
+        {
+            "obra_id": obra_id,
+            "mes": mes,
+            "ano": ano,
+            "limit": limit,
+            "offset": offset
+        },
+        ("movimentos_stock", "materiais", "obras"),
+        lambda: calcular_relatorio_stock(obra_id, mes, ano, limit, offset)
+    ))
+
+async def calcular_relatorio_stock(
+    obra_id: Optional[str] = None,
+    mes: Optional[int] = None,
+    ano: Optional[int] = None,
+    limit: int = 100,
+    offset: int = 0
+):
     query = {}
     
     if obra_id:
         query["obra_id"] = obra_id
     
-    if mes and ano:
-        start_date = datetime(ano, mes, 1, tzinfo=timezone.utc)
-        if mes == 12:
-            end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
-        else:
-            end_date = datetime(ano, mes + 1, 1, tzinfo=timezone.utc)
-        query["data_hora"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-    elif ano:
-        start_date = datetime(ano, 1, 1, tzinfo=timezone.utc)
-        end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
-        query["data_hora"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-    
-    movimentos = await db.movimentos_stock.find(query, {"_id": 0}).sort("data_hora", -1).to_list(1000)
-    
-    # Enrich with material and obra details
-    enriched = []
-    materiais_gastos = {}
-    
-    for mov in movimentos:
-        item = {**mov}
-        
-        # Get material details
-        material = await db.materiais.find_one({"id": mov["material_id"]}, {"_id": 0, "codigo": 1, "descricao": 1, "unidade": 1})
-        if material:
-            item["material_codigo"] = material.get("codigo", "")
-            item["material_descricao"] = material.get("descricao", "")
-            item["material_unidade"] = material.get("unidade", "un")
-            
-            # Track consumption by material
-            mat_id = mov["material_id"]
-            if mat_id not in materiais_gastos:
-                materiais_gastos[mat_id] = {
-                    "codigo": material.get("codigo", ""),
-                    "descricao": material.get("descricao", ""),
-                    "unidade": material.get("unidade", "un"),
-                    "entradas": 0,
-                    "saidas": 0
-                }
-            if mov.get("tipo_movimento") == "Entrada":
-                materiais_gastos[mat_id]["entradas"] += mov.get("quantidade", 0)
-            else:
-                materiais_gastos[mat_id]["saidas"] += mov.get("quantidade", 0)
-        
-        # Get obra details
-        if mov.get("obra_id"):
-            obra = await db.obras.find_one({"id": mov["obra_id"]}, {"_id": 0, "codigo": 1, "nome": 1})
-            if obra:
-                item["obra_codigo"] = obra.get("codigo", "")
-                item["obra_nome"] = obra.get("nome", "")
-        
-        enriched.append(item)
+    periodo = periodo_range(mes, ano)
+    if periodo:
+        query["data_hora"] = periodo
+    
+    # Resumo por material e totais calculados na base de dados; só a página de linhas é carregada
+    pipeline = [
+        {"$match": query},
+        {"$facet": {
+            "movimentos": [
+                {"$sort": {"data_hora": -1, "id": -1}},
+                {"$skip": offset},
+                {"$limit": limit},
+                {"$lookup": {"from": "materiais", "localField": "material_id", "foreignField": "id", "as": "_material"}},
+                {"$addFields": {"_material": first_of("$_material")}},
+                {"$addFields": {
+                    "material_codigo": {"$cond": ["$_material", {"$ifNull": ["$_material.codigo", ""]}, "$$REMOVE"]},
+                    "material_descricao": {"$cond": ["$_material", {"$ifNull": ["$_material.descricao", ""]}, "$$REMOVE"]},
+                    "material_unidade": {"$cond": ["$_material", {"$ifNull": ["$_material.unidade", "un"]}, "$$REMOVE"]}
+                }},
+                *lookup_obra_stages(),
+                {"$project": {"_id": 0, "_material": 0}}
+            ],
+            "materiais": consumo_por_material_stages({
+                "entradas": soma_quantidade_se("Entrada"),
+                "saidas": soma_quantidade_se("Entrada", negar=True)
+            }),
+            "totais": [
+                {"$group": {
+                    "_id": None,
+                    "total_movimentos": {"$sum": 1},
+                    "total_entradas": soma_quantidade_se("Entrada"),
+                    "total_saidas": soma_quantidade_se("Saida")
+                }}
+            ]
+        }}
+    ]
     
-    # Statistics
-    total_entradas = sum(m.get("quantidade", 0) for m in movimentos if m.get("tipo_movimento") == "Entrada")
-    total_saidas = sum(m.get("quantidade", 0) for m in movimentos if m.get("tipo_movimento") == "Saida")
+    resultado = (await db.movimentos_stock.aggregate(pipeline).to_list(1))[0]
+    totais = resultado["totais"][0] if resultado["totais"] else {}
+    total_entradas = totais.get("total_entradas", 0)
+    total_saidas = totais.get("total_saidas", 0)
+    total_movimentos = totais.get("total_movimentos", 0)
     
     return {
-        "movimentos": enriched,
-        "materiais_resumo": list(materiais_gastos.values()),
+        "movimentos": resultado["movimentos"],
+        "materiais_resumo": resultado["materiais"],
         "estatisticas": {
-            "total_movimentos": len(movimentos),
+            "total_movimentos": total_movimentos,
             "total_entradas": total_entradas,
             "total_saidas": total_saidas,
             "consumo_liquido": total_saidas - total_entradas,
-            "materiais_diferentes": len(materiais_gastos)
+            "materiais_diferentes": len(resultado["materiais"])
+        },
+        "paginacao": {
+            "offset": offset,
+            "limit": limit,
+            "total": total_movimentos
         }
     }
 
@@ -1280,50 +2983,56 @@ async def get_relatorio_obra(
     user=Depends(get_current_user)
 ):
     """Relatório completo de uma obra específica"""
-    obra = await db.obras.find_one({"id": obra_id}, {"_id": 0})
-    if not obra:
-        raise HTTPException(status_code=404, detail="Obra não encontrada")
-    
-    # Get resources currently assigned
-    equipamentos_atuais = await db.equipamentos.find({"obra_id": obra_id}, {"_id": 0}).to_list(100)
-    viaturas_atuais = await db.viaturas.find({"obra_id": obra_id}, {"_id": 0}).to_list(100)
-    
+    return json_pronto(await relatorio_em_cache(
+        "obra",
+        {"obra_id": obra_id, "mes": mes, "ano": ano},
+        ("obras", "equipamentos", "viaturas", "movimentos", "movimentos_stock", "materiais"),
+        lambda: calcular_relatorio_obra(obra_id, mes, ano)
+    ))
+
+async def calcular_relatorio_obra(
+    obra_id: str,
+    mes: Optional[int] = None,
+    ano: Optional[int] = None
+):
     # Get movement history for this obra
     mov_query = {"obra_id": obra_id}
     stock_query = {"obra_id": obra_id}
     
-    if mes and ano:
-        start_date = datetime(ano, mes, 1, tzinfo=timezone.utc)
-        if mes == 12:
-            end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
-        else:
-            end_date = datetime(ano, mes + 1, 1, tzinfo=timezone.utc)
-        mov_query["created_at"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-        stock_query["data_hora"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-    elif ano:
-        start_date = datetime(ano, 1, 1, tzinfo=timezone.utc)
-        end_date = datetime(ano + 1, 1, 1, tzinfo=timezone.utc)
-        mov_query["created_at"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
-        stock_query["data_hora"] = {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}
+    periodo = periodo_range(mes, ano)
+    if periodo:
+        mov_query["created_at"] = periodo
+        stock_query["data_hora"] = periodo
+    
+    mov_pipeline = [
+        {"$match": mov_query},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "saidas": {"$sum": {"$cond": [{"$eq": ["$tipo_movimento", "Saida"]}, 1, 0]}},
+            "devolucoes": {"$sum": {"$cond": [{"$eq": ["$tipo_movimento", "Devolucao"]}, 1, 0]}}
+        }}
+    ]
+    stock_pipeline = [
+        {"$match": stock_query},
+        {"$facet": {
+            "total": [{"$count": "n"}],
+            "consumo": consumo_por_material_stages({"quantidade_gasta": soma_quantidade_se("Saida")})
+        }}
+    ]
     
-    movimentos_ativos = await db.movimentos.find(mov_query, {"_id": 0}).sort("created_at", -1).to_list(500)
-    movimentos_stock = await db.movimentos_stock.find(stock_query, {"_id": 0}).sort("data_hora", -1).to_list(500)
+    obra, equipamentos_atuais, viaturas_atuais, mov_totais, stock = await asyncio.gather(
+        db.obras.find_one({"id": obra_id}, {"_id": 0}),
+        db.equipamentos.find({"obra_id": obra_id}, {"_id": 0}).to_list(100),
+        db.viaturas.find({"obra_id": obra_id}, {"_id": 0}).to_list(100),
+        db.movimentos.aggregate(mov_pipeline).to_list(1),
+        db.movimentos_stock.aggregate(stock_pipeline).to_list(1)
+    )
+    if not obra:
+        raise HTTPException(status_code=404, detail="Obra não encontrada")
     
-    # Calculate stock consumption by material
-    consumo_materiais = {}
-    for mov in movimentos_stock:
-        mat_id = mov["material_id"]
-        material = await db.materiais.find_one({"id": mat_id}, {"_id": 0, "codigo": 1, "descricao": 1, "unidade": 1})
-        if material:
-            if mat_id not in consumo_materiais:
-                consumo_materiais[mat_id] = {
-                    "codigo": material.get("codigo", ""),
-                    "descricao": material.get("descricao", ""),
-                    "unidade": material.get("unidade", "un"),
-                    "quantidade_gasta": 0
-                }
-            if mov.get("tipo_movimento") == "Saida":
-                consumo_materiais[mat_id]["quantidade_gasta"] += mov.get("quantidade", 0)
+    mov_totais = mov_totais[0] if mov_totais else {}
+    stock = stock[0]
     
     return {
         "obra": obra,
@@ -1338,12 +3047,12 @@ async def get_relatorio_obra(
         "estatisticas": {
             "equipamentos_atuais": len(equipamentos_atuais),
             "viaturas_atuais": len(viaturas_atuais),
-            "movimentos_ativos": len(movimentos_ativos),
-            "movimentos_stock": len(movimentos_stock),
-            "total_saidas_ativos": len([m for m in movimentos_ativos if m.get("tipo_movimento") == "Saida"]),
-            "total_devolucoes": len([m for m in movimentos_ativos if m.get("tipo_movimento") == "Devolucao"])
+            "movimentos_ativos": mov_totais.get("total", 0),
+            "movimentos_stock": stock["total"][0]["n"] if stock["total"] else 0,
+            "total_saidas_ativos": mov_totais.get("saidas", 0),
+            "total_devolucoes": mov_totais.get("devolucoes", 0)
         },
-        "consumo_materiais": list(consumo_materiais.values())
+        "consumo_materiais": stock["consumo"]
     }
 
 # ==================== NOVOS RELATÓRIOS ====================
@@ -1354,6 +3063,16 @@ async def get_relatorio_manutencoes(
     user=Depends(get_current_user)
 ):
     """Relatório de equipamentos e viaturas em manutenção/oficina"""
+    return json_pronto(await relatorio_em_cache(
+        "manutencoes",
+        {"tipo_recurso": tipo_recurso},
+        ("equipamentos", "viaturas"),
+        lambda: calcular_relatorio_manutencoes(tipo_recurso)
+    ))
+
+async def calcular_relatorio_manutencoes(
+    tipo_recurso: Optional[str] = None
+):
     equipamentos_manutencao = []
     viaturas_manutencao = []
     
@@ -1387,60 +3106,66 @@ async def get_relatorio_alertas(
     user=Depends(get_current_user)
 ):
     """Relatório de documentos a expirar (seguro, IPO, vistoria, revisão)"""
+    return json_pronto(await relatorio_em_cache(
+        "alertas",
+        {
+            "tipo_recurso": tipo_recurso,
+            "dias_antecedencia": dias_antecedencia,
+            "hoje": datetime.now(timezone.utc).date().isoformat()
+        },
+        ("viaturas",),
+        lambda: calcular_relatorio_alertas(tipo_recurso, dias_antecedencia)
+    ))
+
+async def calcular_relatorio_alertas(
+    tipo_recurso: Optional[str] = None,
+    dias_antecedencia: int = 30
+):
     alertas = []
     hoje = datetime.now(timezone.utc).date()
     
     if not tipo_recurso or tipo_recurso == "viatura":
-        viaturas = await db.viaturas.find({"ativa": True}, {"_id": 0}).to_list(1000)
+        # Datas pelo calendário de expirações; revisão por KMs diretamente nas viaturas
+        revisao_kms = {
+            "kms_atual": {"$gt": 0},
+            "kms_proxima_revisao": {"$gt": 0},
+            "$expr": {"$lte": [{"$subtract": ["$kms_proxima_revisao", "$kms_atual"]}, KMS_ANTECEDENCIA]}
+        }
+        viaturas = await viaturas_a_expirar(CAMPOS_DATA, dias_antecedencia, hoje, extra=revisao_kms)
+        nomes = {"seguro": "Seguro", "ipo": "IPO", "vistoria": "Vistoria", "revisao": "Revisão"}
         
-        for v in viaturas:
-            set_viatura_defaults(v)
-            
-            # Verificar datas de expiração
-            campos_data = [
-                ("data_seguro", "Seguro"),
-                ("data_ipo", "IPO"),
-                ("data_vistoria", "Vistoria"),
-                ("data_proxima_revisao", "Revisão")
-            ]
-            
-            for campo, nome in campos_data:
-                if v.get(campo):
-                    try:
-                        data_exp = datetime.fromisoformat(v[campo].replace("Z", "+00:00")).date()
-                        dias_restantes = (data_exp - hoje).days
-                        
-                        if dias_restantes <= dias_antecedencia:
-                            alertas.append({
-                                "tipo_recurso": "viatura",
-                                "recurso_id": v["id"],
-                                "identificador": v["matricula"],
-                                "descricao": f"{v.get('marca', '')} {v.get('modelo', '')}",
-                                "tipo_alerta": nome,
-                                "data_expiracao": data_exp.strftime("%Y-%m-%d"),
-                                "dias_restantes": dias_restantes,
-                                "urgente": dias_restantes <= 7,
-                                "expirado": dias_restantes < 0
-                            })
-                    except:
-                        pass
-            
-            # Verificar KMs para revisão
-            if v.get("kms_proxima_revisao") and v.get("kms_atual"):
-                kms_faltam = v["kms_proxima_revisao"] - v["kms_atual"]
-                if kms_faltam <= 1000:
-                    alertas.append({
-                        "tipo_recurso": "viatura",
-                        "recurso_id": v["id"],
-                        "identificador": v["matricula"],
-                        "descricao": f"{v.get('marca', '')} {v.get('modelo', '')}",
-                        "tipo_alerta": "Revisão KM",
-                        "data_expiracao": None,
-                        "dias_restantes": None,
-                        "kms_restantes": kms_faltam,
-                        "urgente": kms_faltam <= 500,
-                        "expirado": kms_faltam <= 0
-                    })
+        for alerta in calcular_alertas(
+            viaturas, hoje, dias_antecedencia,
+            tipos=("seguro", "ipo", "vistoria", "revisao"), kms_antecedencia=KMS_ANTECEDENCIA
+        ):
+            v = viaturas[alerta["indice"]]
+            base = {
+                "tipo_recurso": "viatura",
+                "recurso_id": v["id"],
+                "identificador": v["matricula"],
+                "descricao": f"{v.get('marca', '')} {v.get('modelo', '')}"
+            }
+            if alerta["tipo"] == "kms":
+                kms_faltam = alerta["kms_restantes"]
+                alertas.append({
+                    **base,
+                    "tipo_alerta": "Revisão KM",
+                    "data_expiracao": None,
+                    "dias_restantes": None,
+                    "kms_restantes": kms_faltam,
+                    "urgente": kms_faltam <= 500,
+                    "expirado": kms_faltam <= 0
+                })
+            else:
+                dias_restantes = alerta["dias_restantes"]
+                alertas.append({
+                    **base,
+                    "tipo_alerta": nomes[alerta["tipo"]],
+                    "data_expiracao": alerta["data"].strftime("%Y-%m-%d"),
+                    "dias_restantes": dias_restantes,
+                    "urgente": dias_restantes <= 7,
+                    "expirado": dias_restantes < 0
+                })
     
     # Ordenar por urgência e dias restantes
     alertas_ordenados = sorted(alertas, key=lambda x: (not x.get("expirado", False), not x.get("urgente", False), x.get("dias_restantes") or 999))
@@ -1455,140 +3180,247 @@ async def get_relatorio_alertas(
         }
     }
 
+ORDENACAO_UTILIZACAO = {
+    "movimentos": "total_movimentos",
+    "saidas": "total_saidas",
+    "devolucoes": "total_devolucoes"
+}
+
+def estado_query(estado: Optional[str]) -> dict:
+    """Filtro Mongo para o estado atual de um equipamento/viatura"""
+    if estado == "disponivel":
+        return {"obra_id": None, "em_manutencao": {"$ne": True}}
+    if estado == "em_obra":
+        return {"obra_id": {"$ne": None}}
+    if estado == "manutencao":
+        return {"em_manutencao": True}
+    return {}
+
+def estado_atual(item: dict) -> str:
+    if item.get("em_manutencao"):
+        return "manutencao"
+    if item.get("obra_id"):
+        return "em_obra"
+    return "disponivel"
+
+def estatisticas_estado(items: list) -> dict:
+    return {
+        "total": len(items),
+        "disponivel": len([i for i in items if i["estado_atual"] == "disponivel"]),
+        "em_obra": len([i for i in items if i["estado_atual"] == "em_obra"]),
+        "manutencao": len([i for i in items if i["estado_atual"] == "manutencao"])
+    }
+
 @api_router.get("/relatorios/utilizacao")
 async def get_relatorio_utilizacao(
     tipo_recurso: Optional[str] = None,
     estado: Optional[str] = None,
     data_inicio: Optional[str] = None,
     data_fim: Optional[str] = None,
+    ordenar: Optional[str] = Query(None, pattern="^(movimentos|saidas|devolucoes)$"),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
     user=Depends(get_current_user)
 ):
-    """Relatório de utilização por equipamento/viatura com filtros"""
-    resultado = {"equipamentos": [], "viaturas": []}
+    """Relatório de utilização por equipamento/viatura com filtros.
     
-    # Filtrar equipamentos
-    if not tipo_recurso or tipo_recurso == "equipamento":
-        query_eq = {}
-        if estado == "disponivel":
-            query_eq["obra_id"] = None
-            query_eq["em_manutencao"] = {"$ne": True}
-        elif estado == "em_obra":
-            query_eq["obra_id"] = {"$ne": None}
-        elif estado == "manutencao":
-            query_eq["em_manutencao"] = True
-        
-        equipamentos = await db.equipamentos.find(query_eq, {"_id": 0}).to_list(1000)
-        
-        for eq in equipamentos:
-            eq.setdefault("em_manutencao", False)
-            
-            # Contar movimentos
-            mov_query = {"recurso_id": eq["id"], "tipo_recurso": "equipamento"}
-            if data_inicio and data_fim:
-                mov_query["created_at"] = {"$gte": data_inicio, "$lte": data_fim}
-            
-            movimentos = await db.movimentos.find(mov_query, {"_id": 0}).to_list(1000)
-            
-            # Calcular estatísticas
-            eq["total_movimentos"] = len(movimentos)
-            eq["total_saidas"] = len([m for m in movimentos if m.get("tipo_movimento") == "Saida"])
-            eq["total_devolucoes"] = len([m for m in movimentos if m.get("tipo_movimento") == "Devolucao"])
-            
-            # Determinar estado
-            if eq.get("em_manutencao"):
-                eq["estado_atual"] = "manutencao"
-            elif eq.get("obra_id"):
-                obra = await db.obras.find_one({"id": eq["obra_id"]}, {"_id": 0, "nome": 1})
-                eq["estado_atual"] = "em_obra"
-                eq["obra_nome"] = obra.get("nome") if obra else ""
-            else:
-                eq["estado_atual"] = "disponivel"
-            
-            resultado["equipamentos"].append(eq)
+    As contagens de movimentos de todos os recursos saem de uma única agregação sobre
+    `movimentos`; `ordenar` ordena por utilização (decrescente) e `limit`/`offset`
+    paginam cada lista. As estatísticas cobrem sempre o conjunto filtrado completo.
+    """
+    return json_pronto(await relatorio_em_cache(
+        "utilizacao",
+        {
+            "tipo_recurso": tipo_recurso,
+            "estado": estado,
+            "data_inicio": data_inicio,
+            "data_fim": data_fim,
+            "ordenar": ordenar,
+            "limit": limit,
+            "offset": offset
+        },
+        ("movimentos", "equipamentos", "viaturas", "obras"),
+        lambda: calcular_relatorio_utilizacao(tipo_recurso, estado, data_inicio, data_fim, ordenar, limit, offset)
+    ))
+
+async def calcular_relatorio_utilizacao(
+    tipo_recurso: Optional[str] = None,
+    estado: Optional[str] = None,
+    data_inicio: Optional[str] = None,
+    data_fim: Optional[str] = None,
+    ordenar: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0
+):
+    incluir_eq = not tipo_recurso or tipo_recurso == "equipamento"
+    incluir_vt = not tipo_recurso or tipo_recurso == "viatura"
+    
+    mov_match = {"tipo_recurso": tipo_recurso} if tipo_recurso else {}
+    if data_inicio and data_fim:
+        mov_match["created_at"] = {"$gte": data_inicio, "$lte": data_fim}
+    
+    contagens_pipeline = [
+        {"$match": mov_match},
+        {"$group": {
+            "_id": {"tipo": "$tipo_recurso", "recurso_id": "$recurso_id"},
+            "total_movimentos": {"$sum": 1},
+            "total_saidas": {"$sum": {"$cond": [{"$eq": ["$tipo_movimento", "Saida"]}, 1, 0]}},
+            "total_devolucoes": {"$sum": {"$cond": [{"$eq": ["$tipo_movimento", "Devolucao"]}, 1, 0]}}
+        }}
+    ]
     
-    # Filtrar viaturas
-    if not tipo_recurso or tipo_recurso == "viatura":
-        query_vt = {}
-        if estado == "disponivel":
-            query_vt["obra_id"] = None
-            query_vt["em_manutencao"] = {"$ne": True}
-        elif estado == "em_obra":
-            query_vt["obra_id"] = {"$ne": None}
-        elif estado == "manutencao":
-            query_vt["em_manutencao"] = True
-        
-        viaturas = await db.viaturas.find(query_vt, {"_id": 0}).to_list(1000)
-        
-        for v in viaturas:
-            set_viatura_defaults(v)
-            
-            # Contar movimentos
-            mov_query = {"recurso_id": v["id"], "tipo_recurso": "viatura"}
-            if data_inicio and data_fim:
-                mov_query["created_at"] = {"$gte": data_inicio, "$lte": data_fim}
-            
-            movimentos = await db.movimentos.find(mov_query, {"_id": 0}).to_list(1000)
-            
-            v["total_movimentos"] = len(movimentos)
-            v["total_saidas"] = len([m for m in movimentos if m.get("tipo_movimento") == "Saida"])
-            v["total_devolucoes"] = len([m for m in movimentos if m.get("tipo_movimento") == "Devolucao"])
-            
-            # Determinar estado
-            if v.get("em_manutencao"):
-                v["estado_atual"] = "manutencao"
-            elif v.get("obra_id"):
-                obra = await db.obras.find_one({"id": v["obra_id"]}, {"_id": 0, "nome": 1})
-                v["estado_atual"] = "em_obra"
-                v["obra_nome"] = obra.get("nome") if obra else ""
-            else:
-                v["estado_atual"] = "disponivel"
-            
-            resultado["viaturas"].append(v)
+    async def sem_resultados():
+        return []
     
-    # Estatísticas gerais
-    total_eq = len(resultado["equipamentos"])
-    total_vt = len(resultado["viaturas"])
+    contagens_lista, equipamentos, viaturas = await asyncio.gather(
+        db.movimentos.aggregate(contagens_pipeline).to_list(None),
+        db.equipamentos.find(estado_query(estado), {"_id": 0}).sort("codigo", ASCENDING).to_list(None)
+            if incluir_eq else sem_resultados(),
+        db.viaturas.find(estado_query(estado), {"_id": 0}).sort("matricula", ASCENDING).to_list(None)
+            if incluir_vt else sem_resultados()
+    )
+    contagens = {(c["_id"]["tipo"], c["_id"]["recurso_id"]): c for c in contagens_lista}
+    
+    def preparar(items: list, tipo: str, defaults) -> list:
+        for item in items:
+            defaults(item)
+            c = contagens.get((tipo, item["id"]), {})
+            item["total_movimentos"] = c.get("total_movimentos", 0)
+            item["total_saidas"] = c.get("total_saidas", 0)
+            item["total_devolucoes"] = c.get("total_devolucoes", 0)
+            item["estado_atual"] = estado_atual(item)
+        if ordenar:
+            # sort estável: empates mantêm a ordem por código/matrícula
+            items.sort(key=lambda i: i[ORDENACAO_UTILIZACAO[ordenar]], reverse=True)
+        return items
+    
+    equipamentos = preparar(equipamentos, "equipamento", set_equipamento_defaults)
+    viaturas = preparar(viaturas, "viatura", set_viatura_defaults)
+    
+    estatisticas = {
+        "equipamentos": estatisticas_estado(equipamentos),
+        "viaturas": estatisticas_estado(viaturas)
+    }
     
-    eq_disponivel = len([e for e in resultado["equipamentos"] if e.get("estado_atual") == "disponivel"])
-    eq_obra = len([e for e in resultado["equipamentos"] if e.get("estado_atual") == "em_obra"])
-    eq_manut = len([e for e in resultado["equipamentos"] if e.get("estado_atual") == "manutencao"])
+    if limit is not None:
+        equipamentos = equipamentos[offset:offset + limit]
+        viaturas = viaturas[offset:offset + limit]
     
-    vt_disponivel = len([v for v in resultado["viaturas"] if v.get("estado_atual") == "disponivel"])
-    vt_obra = len([v for v in resultado["viaturas"] if v.get("estado_atual") == "em_obra"])
-    vt_manut = len([v for v in resultado["viaturas"] if v.get("estado_atual") == "manutencao"])
+    # Nomes das obras apenas para a página devolvida, numa só query
+    obras_map = await get_obras_map(
+        [i.get("obra_id") for i in equipamentos + viaturas if i["estado_atual"] == "em_obra"],
+        {"_id": 0, "nome": 1}
+    )
+    for item in equipamentos + viaturas:
+        if item["estado_atual"] == "em_obra":
+            obra = obras_map.get(item["obra_id"])
+            item["obra_nome"] = obra.get("nome") if obra else ""
     
     return {
-        **resultado,
-        "estatisticas": {
-            "equipamentos": {
-                "total": total_eq,
-                "disponivel": eq_disponivel,
-                "em_obra": eq_obra,
-                "manutencao": eq_manut
-            },
-            "viaturas": {
-                "total": total_vt,
-                "disponivel": vt_disponivel,
-                "em_obra": vt_obra,
-                "manutencao": vt_manut
-            }
+        "equipamentos": equipamentos,
+        "viaturas": viaturas,
+        "estatisticas": estatisticas,
+        "paginacao": {
+            "offset": offset,
+            "limit": limit
         }
     }
 
+# ==================== ADMIN ROUTES ====================
+@api_router.post("/admin/stats/rebuild")
+async def rebuild_stats_route(user=Depends(get_current_user)):
+    """Recalcular do zero os contadores do dashboard"""
+    return {"message": "Contadores recalculados", "stats": await rebuild_stats()}
+
+@api_router.post("/admin/expiracoes/rebuild")
+async def rebuild_expiracoes_route(user=Depends(get_current_user)):
+    """Reconstruir o calendário de expirações das viaturas"""
+    return {"message": "Expirações recalculadas", "total": await rebuild_expiracoes()}
+
+@api_router.get("/admin/cache")
+async def admin_cache(user=Depends(get_current_user)):
+    """Métricas da cache de relatórios (hits, misses, invalidações) para dimensionar RELATORIOS_CACHE_*"""
+    return {"relatorios": relatorios_cache.estado()}
+
+@api_router.delete("/admin/cache")
+async def admin_limpar_cache(user=Depends(get_current_user)):
+    """Esvaziar a cache de relatórios (as métricas mantêm-se)"""
+    relatorios_cache.limpar()
+    return {"message": "Cache limpa"}
+
+@api_router.get("/admin/indexes")
+async def get_indexes(user=Depends(get_current_user)):
+    """Índices existentes por coleção, com estatísticas de utilização ($indexStats)"""
+    resultado = {}
+    for collection_name, declarados in INDEXES.items():
+        collection = db[collection_name]
+        existentes = await collection.index_information()
+        
+        stats = {}
+        try:
+            async for stat in collection.aggregate([{"$indexStats": {}}]):
+                stats[stat["name"]] = {
+                    "ops": stat.get("accesses", {}).get("ops", 0),
+                    "since": stat["accesses"]["since"].isoformat() if stat.get("accesses", {}).get("since") else None
+                }
+        except OperationFailure as e:
+            logger.warning(f"$indexStats indisponível para {collection_name}: {e}")
+        
+        nomes_declarados = [index.document["name"] for index in declarados]
+        resultado[collection_name] = {
+            "indices": [
+                {
+                    "nome": nome,
+                    "campos": info["key"],
+                    "unico": info.get("unique", False),
+                    "declarado": nome in nomes_declarados,
+                    "utilizacao": stats.get(nome)
+                }
+                for nome, info in existentes.items()
+            ],
+            "em_falta": [nome for nome in nomes_declarados if nome not in existentes]
+        }
+    
+    return resultado
+
 @api_router.get("/")
 async def root():
     return {"message": "José Firmino - API de Gestão de Armazém"}
 
 app.include_router(api_router)
 
+app.add_middleware(CompressaoMiddleware, minimo=COMPRESSAO_MINIMO)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Truncated", "X-Total-Count"],
 )
 
+@app.on_event("startup")
+async def startup_db_indexes():
+    global TRANSACOES_DISPONIVEIS, pdf_pool
+    TRANSACOES_DISPONIVEIS = await detetar_transacoes()
+    pdf_pool = criar_pdf_pool()
+    await ensure_indexes()
+    if await db.stats.count_documents({"_id": {"$in": list(STATS_CAMPOS)}}) < len(STATS_CAMPOS):
+        await rebuild_stats()
+    # Calendário vazio ou de antes de incluir as viaturas inativas: preencher a partir das viaturas
+    calendario_antigo = not await db.expiracoes.find_one({}) or await db.expiracoes.find_one({"atualizado_em": {"$exists": False}})
+    if calendario_antigo and await db.viaturas.find_one({}):
+        await rebuild_expiracoes()
+    # Jobs que estavam a correr quando o servidor parou não vão terminar
+    await db.jobs.update_many(
+        {"estado": {"$in": list(JOB_ESTADOS_ATIVOS)}},
+        {"$set": {"estado": "erro", "erro": "Interrompido pelo reinício do servidor",
+                  "updated_at": datetime.now(timezone.utc).isoformat()}}
+    )
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+    if pdf_pool:
+        pdf_pool.shutdown(cancel_futures=True)
@@ -0,0 +1,83 @@
+"""
+Benchmark: motor de alertas vectorizado (alertas.calcular_alertas) vs ciclo por viatura
+com datetime.fromisoformat (implementação anterior de /api/relatorios/alertas).
+
+Uso: python backend/tests/bench_alertas.py [n_viaturas]
+"""
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from alertas import calcular_alertas, KMS_ANTECEDENCIA  # noqa: E402
+
+CAMPOS = [("data_seguro", "seguro"), ("data_ipo", "ipo"), ("data_vistoria", "vistoria"), ("data_proxima_revisao", "revisao")]
+
+
+def gerar_viaturas(n, hoje, seed=42):
+    rnd = random.Random(seed)
+    viaturas = []
+    for i in range(n):
+        v = {"id": str(i), "matricula": f"{i:06d}"}
+        for campo, _ in CAMPOS:
+            sorte = rnd.random()
+            if sorte < 0.1:
+                continue
+            data = hoje + timedelta(days=rnd.randint(-30, 730))
+            v[campo] = data.isoformat() if sorte < 0.6 else f"{data.isoformat()}T00:00:00Z"
+        if rnd.random() < 0.7:
+            v["kms_atual"] = rnd.randint(0, 200000)
+            v["kms_proxima_revisao"] = v["kms_atual"] + rnd.randint(-2000, 20000)
+        viaturas.append(v)
+    return viaturas
+
+
+def alertas_ciclo(viaturas, hoje, dias_antecedencia):
+    """Implementação anterior: fromisoformat por campo e por viatura"""
+    alertas = []
+    for i, v in enumerate(viaturas):
+        for campo, tipo in CAMPOS:
+            if v.get(campo):
+                try:
+                    data_exp = datetime.fromisoformat(v[campo].replace("Z", "+00:00")).date()
+                    dias_restantes = (data_exp - hoje).days
+                    if dias_restantes <= dias_antecedencia:
+                        alertas.append({"indice": i, "tipo": tipo, "data": data_exp, "dias_restantes": dias_restantes})
+                except ValueError:
+                    pass
+        if v.get("kms_proxima_revisao") and v.get("kms_atual"):
+            kms_faltam = v["kms_proxima_revisao"] - v["kms_atual"]
+            if kms_faltam <= KMS_ANTECEDENCIA:
+                alertas.append({"indice": i, "tipo": "kms", "kms_restantes": kms_faltam})
+    return alertas
+
+
+def alertas_motor(viaturas, hoje, dias_antecedencia):
+    return calcular_alertas(viaturas, hoje, dias_antecedencia,
+                            tipos=[t for _, t in CAMPOS], kms_antecedencia=KMS_ANTECEDENCIA)
+
+
+def medir(funcao, *args, repeticoes=5):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    hoje = date.today()
+    viaturas = gerar_viaturas(n, hoje)
+
+    t_ciclo, r_ciclo = medir(alertas_ciclo, viaturas, hoje, 30)
+    t_motor, r_motor = medir(alertas_motor, viaturas, hoje, 30)
+    assert r_ciclo == r_motor, "Resultados diferentes entre ciclo e motor"
+
+    print(f"{n} viaturas, {len(r_motor)} alertas")
+    print(f"ciclo fromisoformat: {t_ciclo * 1000:8.1f} ms")
+    print(f"motor vectorizado:   {t_motor * 1000:8.1f} ms  ({t_ciclo / t_motor:.1f}x)")
@@ -0,0 +1,125 @@
+"""
+Benchmark: serialização e tamanho transferido das respostas de /api/equipamentos (lista completa)
+e /api/relatorios/movimentos (limit=1000).
+
+Compara o caminho anterior (jsonable_encoder + JSONResponse) com json_pronto (orjson sem
+jsonable_encoder) e mede o corpo sem compressão, com gzip e com brotli (compressao.Compressor,
+com os níveis por omissão do CompressaoMiddleware).
+
+Uso: python backend/tests/bench_respostas.py [n_linhas]
+"""
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compressao import Compressor  # noqa: E402
+
+CATEGORIAS = ["Andaimes", "Betoneiras", "Compressores", "Geradores", "Martelos", "Rebarbadoras"]
+MARCAS = ["Hilti", "Makita", "Bosch", "DeWalt", "Atlas Copco", "Stihl"]
+
+
+def gerar_equipamentos(n, rnd):
+    inicio = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [{
+        "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+        "codigo": f"EQ-{i:05d}",
+        "descricao": f"{rnd.choice(CATEGORIAS)[:-1]} {rnd.choice(MARCAS)} modelo {rnd.randint(100, 999)}",
+        "marca": rnd.choice(MARCAS),
+        "modelo": f"M{rnd.randint(100, 999)}",
+        "data_aquisicao": (inicio - timedelta(days=rnd.randint(0, 2000))).date().isoformat(),
+        "ativo": rnd.random() < 0.9,
+        "disponivel": rnd.random() < 0.6,
+        "obra_id": str(uuid.UUID(int=rnd.getrandbits(128))) if rnd.random() < 0.4 else None,
+        "categoria": rnd.choice(CATEGORIAS),
+        "numero_serie": f"SN{rnd.getrandbits(40):012X}",
+        "responsavel": rnd.choice(["", "João Silva", "Maria Santos", "Rui Costa"]),
+        "foto": "",
+        "estado_conservacao": rnd.choice(["Bom", "Razoável", "Mau"]),
+        "manual_url": "",
+        "certificado_url": "",
+        "ficha_seguranca_url": "",
+        "em_manutencao": rnd.random() < 0.05,
+        "descricao_avaria": "",
+        "tipo": "Equipamento",
+        "created_at": (inicio + timedelta(seconds=rnd.randint(0, 60_000_000))).isoformat(),
+    } for i in range(n)]
+
+
+def gerar_relatorio_movimentos(n, rnd):
+    inicio = datetime(2025, 1, 1, tzinfo=timezone.utc)
+    movimentos = []
+    for _ in range(n):
+        equipamento = rnd.random() < 0.7
+        movimentos.append({
+            "id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "recurso_id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "tipo_recurso": "equipamento" if equipamento else "viatura",
+            "obra_id": str(uuid.UUID(int=rnd.getrandbits(128))),
+            "tipo_movimento": rnd.choice(["Saida", "Devolucao"]),
+            "responsavel_levantou": rnd.choice(["João Silva", "Maria Santos", "Rui Costa"]),
+            "responsavel_devolveu": "",
+            "observacoes": "",
+            "created_at": (inicio + timedelta(seconds=rnd.randint(0, 30_000_000))).isoformat(),
+            "recurso_codigo": f"EQ-{rnd.randint(0, 99999):05d}" if equipamento else f"{rnd.randint(10, 99)}-AB-{rnd.randint(10, 99)}",
+            "recurso_descricao": f"{rnd.choice(CATEGORIAS)[:-1]} {rnd.choice(MARCAS)}",
+            "obra_codigo": f"OB-{rnd.randint(1, 200):03d}",
+            "obra_nome": f"Obra {rnd.randint(1, 200)} - Lisboa",
+        })
+    return {
+        "movimentos": movimentos,
+        "estatisticas": {"total_movimentos": n, "total_saidas": n // 2, "total_devolucoes": n - n // 2,
+                         "equipamentos_movidos": n // 2, "viaturas_movidas": n // 4},
+        "paginacao": {"offset": 0, "limit": n, "total": n},
+    }
+
+
+def caminho_anterior(dados):
+    return JSONResponse(jsonable_encoder(dados)).body
+
+
+def caminho_orjson(dados):
+    return ORJSONResponse(dados).body
+
+
+def comprimir(corpo, codificacao):
+    return Compressor(codificacao, nivel_gzip=6, qualidade_brotli=4).comprimir(corpo, fim=True)
+
+
+def medir(funcao, *args, repeticoes=10):
+    melhor = float("inf")
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        resultado = funcao(*args)
+        melhor = min(melhor, time.perf_counter() - inicio)
+    return melhor, resultado
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rnd = random.Random(42)
+    casos = [
+        ("/api/equipamentos", gerar_equipamentos(n, rnd)),
+        ("/api/relatorios/movimentos", gerar_relatorio_movimentos(n, rnd)),
+    ]
+
+    for endpoint, dados in casos:
+        t_anterior, corpo_anterior = medir(caminho_anterior, dados)
+        t_orjson, corpo_orjson = medir(caminho_orjson, dados)
+        assert ORJSONResponse(None).render(jsonable_encoder(dados)) == corpo_orjson, "Conteúdo diferente"
+
+        print(f"{endpoint} ({n} linhas)")
+        print(f"  jsonable_encoder + json: {t_anterior * 1000:8.2f} ms")
+        print(f"  orjson direto:           {t_orjson * 1000:8.2f} ms  ({t_anterior / t_orjson:.1f}x)")
+        print(f"  sem compressão: {len(corpo_orjson) / 1024:8.1f} KiB")
+        for codificacao in ("gzip", "br"):
+            t_comp, comprimido = medir(comprimir, corpo_orjson, codificacao)
+            print(f"  {codificacao:<14} {len(comprimido) / 1024:8.1f} KiB  "
+                  f"({len(corpo_orjson) / len(comprimido):.1f}x menor, {t_comp * 1000:.2f} ms)")
@@ -0,0 +1,57 @@
+"""
+Test suite for the vectorised expiry-alert engine (backend/alertas.py)
+- Date alerts per tipo with dias_antecedencia threshold
+- KM revision alerts
+- Invalid / missing dates are ignored
+"""
+import sys
+from datetime import date
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from alertas import calcular_alertas, datas_para_array  # noqa: E402
+
+HOJE = date(2026, 3, 1)
+
+
+class TestAlertas:
+    """Test calcular_alertas"""
+
+    def test_date_alerts_within_threshold(self):
+        """Test only dates within dias_antecedencia (including expired) alert"""
+        viaturas = [
+            {"data_seguro": "2026-03-10", "data_vistoria": "2026-12-01"},
+            {"data_seguro": "2026-02-20T00:00:00Z"},
+        ]
+        alertas = calcular_alertas(viaturas, HOJE, 30, tipos=("vistoria", "seguro"))
+        assert alertas == [
+            {"indice": 0, "tipo": "seguro", "data": date(2026, 3, 10), "dias_restantes": 9},
+            {"indice": 1, "tipo": "seguro", "data": date(2026, 2, 20), "dias_restantes": -9},
+        ]
+        print("✓ Date alerts OK")
+
+    def test_order_follows_viatura_then_tipos(self):
+        """Test alerts are grouped by viatura in the order of tipos, kms last"""
+        viaturas = [{"data_ipo": "2026-03-02", "data_seguro": "2026-03-03",
+                     "kms_atual": 10000, "kms_proxima_revisao": 10500}]
+        alertas = calcular_alertas(viaturas, HOJE, 30, tipos=("seguro", "ipo"), kms_antecedencia=1000)
+        assert [a["tipo"] for a in alertas] == ["seguro", "ipo", "kms"]
+        assert alertas[2]["kms_restantes"] == 500
+        print("✓ Alert order OK")
+
+    def test_kms_ultrapassados(self):
+        """Test overdue KM revisions can be excluded"""
+        viaturas = [{"kms_atual": 12000, "kms_proxima_revisao": 11000}]
+        assert len(calcular_alertas(viaturas, HOJE, 30, tipos=(), kms_antecedencia=1000)) == 1
+        assert calcular_alertas(viaturas, HOJE, 30, tipos=(), kms_antecedencia=1000,
+                                incluir_kms_ultrapassados=False) == []
+        print("✓ Overdue KM filter OK")
+
+    def test_invalid_dates_ignored(self):
+        """Test missing, malformed and impossible dates become NaT"""
+        viaturas = [{"data_seguro": v} for v in [None, "", "lixo", "2026-02-30", "2026-13-01", "2024-02-29"]]
+        datas = datas_para_array(viaturas, ["data_seguro"]).ravel()
+        assert [str(d) for d in datas] == ["NaT", "NaT", "NaT", "NaT", "NaT", "2024-02-29"]
+        assert calcular_alertas([], HOJE, 30) == []
+        print("✓ Invalid dates ignored")
@@ -0,0 +1,101 @@
+"""
+Test suite for the response compression middleware (backend/compressao.py)
+- Accept-Encoding negotiation (brotli preferred, q-values respected)
+- Size threshold and non-compressible content types
+- Streaming responses compressed chunk by chunk
+"""
+import gzip
+import sys
+from pathlib import Path
+
+import brotli
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from compressao import CompressaoMiddleware, escolher_codificacao  # noqa: E402
+
+GRANDE = [{"codigo": f"EQ-{i:05d}", "descricao": "Equipamento de teste"} for i in range(200)]
+
+
+async def grande(request):
+    return JSONResponse(GRANDE)
+
+
+async def pequeno(request):
+    return JSONResponse({"ok": True})
+
+
+async def pdf(request):
+    return Response(b"%PDF" + b"0" * 5000, media_type="application/pdf")
+
+
+async def csv(request):
+    async def linhas():
+        for i in range(100):
+            yield f"EQ-{i:05d};Equipamento de teste\n"
+    return StreamingResponse(linhas(), media_type="text/csv")
+
+
+app = Starlette(routes=[Route("/grande", grande), Route("/pequeno", pequeno), Route("/pdf", pdf), Route("/csv", csv)])
+app.add_middleware(CompressaoMiddleware, minimo=1024)
+client = TestClient(app)
+
+
+def pedir(caminho, accept_encoding):
+    # stream=True para ler o corpo tal como veio, sem a descompressão automática do httpx
+    with client.stream("GET", caminho, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+class TestCompressao:
+    """Test CompressaoMiddleware"""
+
+    def test_negotiation(self):
+        """Test brotli is preferred and q=0 excludes an encoding"""
+        assert escolher_codificacao("gzip, deflate, br") == "br"
+        assert escolher_codificacao("gzip") == "gzip"
+        assert escolher_codificacao("br;q=0, gzip;q=0.5") == "gzip"
+        assert escolher_codificacao("gzip;q=1, br;q=0.8") == "gzip"
+        assert escolher_codificacao("*") == "br"
+        assert escolher_codificacao("identity") is None
+        assert escolher_codificacao("") is None
+        print("✓ Accept-Encoding negotiation OK")
+
+    def test_large_json_compressed(self):
+        """Test brotli and gzip bodies decode to the original JSON"""
+        original = client.get("/grande", headers={"Accept-Encoding": "identity"}).content
+
+        response, corpo = pedir("/grande", "br")
+        assert response.headers["content-encoding"] == "br"
+        assert response.headers["vary"] == "Accept-Encoding"
+        assert int(response.headers["content-length"]) == len(corpo)
+        assert brotli.decompress(corpo) == original
+
+        response, corpo = pedir("/grande", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert gzip.decompress(corpo) == original
+        print(f"✓ {len(original)} bytes -> {len(corpo)} gzip")
+
+    def test_small_and_binary_untouched(self):
+        """Test bodies under the threshold and PDFs are sent as is"""
+        response, corpo = pedir("/pequeno", "br")
+        assert "content-encoding" not in response.headers
+        assert corpo == b'{"ok":true}'
+
+        response, corpo = pedir("/pdf", "br, gzip")
+        assert "content-encoding" not in response.headers
+        assert corpo.startswith(b"%PDF") and len(corpo) == 5004
+        print("✓ Small and binary responses untouched")
+
+    def test_streaming_compressed(self):
+        """Test streamed CSV is compressed without Content-Length"""
+        response, corpo = pedir("/csv", "gzip")
+        assert response.headers["content-encoding"] == "gzip"
+        assert "content-length" not in response.headers
+        linhas = gzip.decompress(corpo).decode().splitlines()
+        assert len(linhas) == 100 and linhas[-1] == "EQ-00099;Equipamento de teste"
+        print("✓ Streaming response compressed")
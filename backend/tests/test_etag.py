@@ -0,0 +1,70 @@
+"""
+Test suite for conditional GETs on list and detail endpoints:
+- ETag and Cache-Control headers on 200 responses
+- If-None-Match with the current ETag returns 304 without body
+- Writes change the ETag
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestETag:
+    """Test ETag / If-None-Match"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def test_list_not_modified(self):
+        """Test repeating a list request with If-None-Match returns 304"""
+        for colecao in ("equipamentos", "viaturas", "materiais", "obras"):
+            response = requests.get(f"{BASE_URL}/api/{colecao}", headers=self.headers)
+            assert response.status_code == 200
+            etag = response.headers["ETag"]
+            assert "no-cache" in response.headers["Cache-Control"]
+
+            response = requests.get(f"{BASE_URL}/api/{colecao}", headers={**self.headers, "If-None-Match": etag})
+            assert response.status_code == 304
+            assert response.content == b""
+        print("✓ Lists return 304 when unchanged")
+
+    def test_write_changes_etag(self):
+        """Test creating and updating a material changes list and detail ETags"""
+        etag_lista = requests.get(f"{BASE_URL}/api/materiais", headers=self.headers).headers["ETag"]
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTET-{uuid.uuid4().hex[:6].upper()}", "descricao": "Material ETag"
+        }, headers=self.headers).json()
+        response = requests.get(f"{BASE_URL}/api/materiais", headers={**self.headers, "If-None-Match": etag_lista})
+        assert response.status_code == 200
+
+        url = f"{BASE_URL}/api/materiais/{material['id']}"
+        etag_detalhe = requests.get(url, headers=self.headers).headers["ETag"]
+        assert requests.get(url, headers={**self.headers, "If-None-Match": etag_detalhe}).status_code == 304
+        requests.post(f"{BASE_URL}/api/movimentos/stock", json={
+            "material_id": material["id"], "tipo_movimento": "Entrada", "quantidade": 1
+        }, headers=self.headers)
+        response = requests.get(url, headers={**self.headers, "If-None-Match": etag_detalhe})
+        assert response.status_code == 200
+        assert len(response.json()["historico"]) == 1
+
+        requests.delete(url, headers=self.headers)
+        print("✓ Writes change the ETag")
+
+    def test_not_modified_requires_auth(self):
+        """Test conditional requests are still authenticated"""
+        etag = requests.get(f"{BASE_URL}/api/obras", headers=self.headers).headers["ETag"]
+        response = requests.get(f"{BASE_URL}/api/obras", headers={"If-None-Match": etag})
+        assert response.status_code in (401, 403)
+        print("✓ Conditional request without token rejected")
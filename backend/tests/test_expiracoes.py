@@ -0,0 +1,86 @@
+"""
+Test suite for the derived expiry calendar (expiracoes collection):
+- Alerts follow create / update / delete of viaturas
+- POST /api/admin/expiracoes/rebuild
+"""
+import pytest
+import requests
+import os
+import uuid
+from datetime import date, timedelta
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestExpiracoes:
+    """Test alerts served from the expiracoes calendar"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def _alert_ids(self):
+        response = requests.get(f"{BASE_URL}/api/alerts/check", headers=self.headers)
+        assert response.status_code == 200
+        return {a["viatura_id"] for a in response.json()["alerts"]}
+
+    def test_calendar_follows_viatura_changes(self):
+        """Test create, update and delete keep /alerts/check in sync"""
+        payload = {
+            "matricula": f"TE-{uuid.uuid4().hex[:5].upper()}",
+            "marca": "Teste",
+            "data_seguro": (date.today() + timedelta(days=2)).isoformat()
+        }
+        created = requests.post(f"{BASE_URL}/api/viaturas", json=payload, headers=self.headers)
+        assert created.status_code == 200
+        viatura_id = created.json()["id"]
+        assert viatura_id in self._alert_ids()
+
+        payload["data_seguro"] = (date.today() + timedelta(days=365)).isoformat()
+        updated = requests.put(f"{BASE_URL}/api/viaturas/{viatura_id}", json=payload, headers=self.headers)
+        assert updated.status_code == 200
+        assert viatura_id not in self._alert_ids()
+
+        payload["data_seguro"] = (date.today() - timedelta(days=1)).isoformat()
+        requests.put(f"{BASE_URL}/api/viaturas/{viatura_id}", json=payload, headers=self.headers)
+        relatorio = requests.get(f"{BASE_URL}/api/relatorios/alertas", headers=self.headers).json()
+        assert any(a["recurso_id"] == viatura_id and a["expirado"] for a in relatorio["alertas"])
+
+        requests.delete(f"{BASE_URL}/api/viaturas/{viatura_id}", headers=self.headers)
+        assert viatura_id not in self._alert_ids()
+        print("✓ Expiry calendar follows viatura changes")
+
+    def test_inactive_viatura_only_in_summary(self):
+        """Test inactive viaturas are left out of /alerts/check but still shown in /summary"""
+        matricula = f"TE-{uuid.uuid4().hex[:5].upper()}"
+        created = requests.post(f"{BASE_URL}/api/viaturas", json={
+            "matricula": matricula,
+            "ativa": False,
+            "data_vistoria": date.today().isoformat()
+        }, headers=self.headers)
+        assert created.status_code == 200
+        viatura_id = created.json()["id"]
+        assert viatura_id not in self._alert_ids()
+
+        summary = requests.get(f"{BASE_URL}/api/summary", headers=self.headers).json()
+        assert any(matricula in a["item"] and a["type"] == "vistoria" for a in summary["alerts"])
+
+        requests.delete(f"{BASE_URL}/api/viaturas/{viatura_id}", headers=self.headers)
+        print("✓ Inactive viatura only in /summary alerts")
+
+    def test_rebuild_expiracoes(self):
+        """Test rebuilding the calendar keeps the same alerts"""
+        antes = self._alert_ids()
+        response = requests.post(f"{BASE_URL}/api/admin/expiracoes/rebuild", headers=self.headers)
+        assert response.status_code == 200
+        assert isinstance(response.json()["total"], int)
+        assert self._alert_ids() == antes
+        print(f"✓ Calendar rebuilt ({response.json()['total']} entries)")
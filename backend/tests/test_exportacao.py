@@ -0,0 +1,119 @@
+"""
+Test suite for exports:
+- GET /api/export/excel streams a workbook with every row (no 1000-row cap)
+- GET /api/export/{colecao}.csv|.ndjson with since/until and field selection
+- GET /api/export/pdf detailed report, cached while the data is unchanged
+"""
+import pytest
+import requests
+import csv
+import json
+import os
+import uuid
+from io import BytesIO
+from openpyxl import load_workbook
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestExportacao:
+    """Test streaming exports"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def test_excel_export_has_all_rows(self):
+        """Test every material is exported and the workbook has the four sheets"""
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTEXP-{uuid.uuid4().hex[:6].upper()}",
+            "descricao": "Material de teste de exportação",
+            "stock_minimo": 3
+        }, headers=self.headers).json()
+
+        response = requests.get(f"{BASE_URL}/api/export/excel", headers=self.headers)
+        assert response.status_code == 200
+        assert "attachment" in response.headers.get("content-disposition", "")
+        wb = load_workbook(BytesIO(response.content), read_only=True)
+        assert wb.sheetnames == ["Equipamentos", "Viaturas", "Materiais", "Obras"]
+
+        linhas = list(wb["Materiais"].iter_rows(values_only=True))
+        assert linhas[0][0] == "Código"
+        total = len(requests.get(f"{BASE_URL}/api/materiais", headers=self.headers).json())
+        assert len(linhas) - 1 == total
+        assert any(linha[0] == material["codigo"] and linha[4] == 3 for linha in linhas[1:])
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        print(f"✓ Excel export with {total} materiais")
+
+    def test_csv_export_with_fields(self):
+        """Test CSV export has a header row and only the selected fields"""
+        codigo = f"TESTEXP-{uuid.uuid4().hex[:6].upper()}"
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": codigo, "descricao": "Descrição, com vírgula"
+        }, headers=self.headers).json()
+
+        response = requests.get(f"{BASE_URL}/api/export/materiais.csv?fields=codigo,descricao", headers=self.headers)
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        linhas = list(csv.reader(response.text.splitlines()))
+        assert linhas[0] == ["codigo", "descricao"]
+        assert [codigo, "Descrição, com vírgula"] in linhas[1:]
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        print(f"✓ CSV export with {len(linhas) - 1} rows")
+
+    def test_ndjson_export_since(self):
+        """Test NDJSON export filtered by since returns one JSON object per line"""
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTEXP-{uuid.uuid4().hex[:6].upper()}", "descricao": "Material NDJSON"
+        }, headers=self.headers).json()
+
+        response = requests.get(f"{BASE_URL}/api/export/materiais.ndjson",
+                                params={"since": material["created_at"]}, headers=self.headers)
+        assert response.status_code == 200
+        docs = [json.loads(linha) for linha in response.text.splitlines()]
+        assert material["id"] in {d["id"] for d in docs}
+        assert all(d["created_at"] >= material["created_at"] for d in docs)
+
+        response = requests.get(f"{BASE_URL}/api/export/materiais.ndjson",
+                                params={"until": "2000-01-01"}, headers=self.headers)
+        assert response.text == ""
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        print("✓ NDJSON export filtered by date")
+
+    def test_export_invalid_requests(self):
+        """Test unknown collection, format, field or date are rejected"""
+        assert requests.get(f"{BASE_URL}/api/export/users.csv", headers=self.headers).status_code == 404
+        assert requests.get(f"{BASE_URL}/api/export/materiais.xml", headers=self.headers).status_code == 400
+        assert requests.get(f"{BASE_URL}/api/export/materiais.csv?fields=password", headers=self.headers).status_code == 400
+        assert requests.get(f"{BASE_URL}/api/export/movimentos.csv?since=ontem", headers=self.headers).status_code == 400
+        print("✓ Invalid export requests rejected")
+
+    def test_pdf_cached_until_data_changes(self):
+        """Test repeated PDF downloads return the cached file and a write invalidates it"""
+        primeiro = requests.get(f"{BASE_URL}/api/export/pdf", headers=self.headers)
+        assert primeiro.status_code == 200
+        assert primeiro.content.startswith(b"%PDF")
+        segundo = requests.get(f"{BASE_URL}/api/export/pdf", headers=self.headers)
+        assert segundo.content == primeiro.content
+
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTEXP-{uuid.uuid4().hex[:6].upper()}", "descricao": "Material PDF",
+            "stock_minimo": 5, "stock_atual": 1
+        }, headers=self.headers).json()
+        terceiro = requests.get(f"{BASE_URL}/api/export/pdf", headers=self.headers)
+        assert terceiro.status_code == 200
+        assert terceiro.content != primeiro.content
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        print(f"✓ PDF report cached ({len(primeiro.content)} bytes)")
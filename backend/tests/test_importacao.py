@@ -0,0 +1,185 @@
+"""
+Test suite for Excel import (POST /api/import/excel):
+- New rows are inserted and counted per sheet
+- Existing keys, repeated keys, missing keys and invalid values are rejected per row
+- Background job mode (assincrono=true) with progress in GET /api/jobs/{id}
+- mode=upsert updates changed fields; dry_run=true reports the diff without writing
+"""
+import pytest
+import requests
+import os
+import time
+import uuid
+from io import BytesIO
+from openpyxl import Workbook
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestImportacao:
+    """Test set-based Excel import"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def _workbook(self, sufixo):
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Equipamentos"
+        ws.append(["Código", "Descrição", "Ativo"])
+        ws.append([f"TESTIMP-{sufixo}-1", "Equipamento importado", "Sim"])
+        ws.append([f"TESTIMP-{sufixo}-2", "Equipamento importado", "Não"])
+        ws.append([None, "Sem código", "Sim"])
+        ws.append([f"TESTIMP-{sufixo}-1", "Repetido", "Sim"])
+        ws = wb.create_sheet("Materiais")
+        ws.append(["Codigo", "Descricao", "Stock_Minimo"])
+        ws.append([f"TESTIMP-{sufixo}-M", "Material importado", 5])
+        ws.append([f"TESTIMP-{sufixo}-X", "Stock inválido", "abc"])
+        buffer = BytesIO()
+        wb.save(buffer)
+        return buffer.getvalue()
+
+    def _importar(self, conteudo):
+        return requests.post(f"{BASE_URL}/api/import/excel", files={
+            "file": ("importacao.xlsx", conteudo, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        }, headers=self.headers)
+
+    def _limpar(self, sufixo):
+        for colecao in ("equipamentos", "materiais"):
+            for item in requests.get(f"{BASE_URL}/api/{colecao}", headers=self.headers).json():
+                if item["codigo"].startswith(f"TESTIMP-{sufixo}"):
+                    requests.delete(f"{BASE_URL}/api/{colecao}/{item['id']}", headers=self.headers)
+
+    def test_import_counts_and_rejections(self):
+        """Test new rows are imported and invalid rows reported with sheet and line"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        response = self._importar(self._workbook(sufixo))
+        assert response.status_code == 200
+        data = response.json()
+        assert data["imported"]["equipamentos"] == 2
+        assert data["imported"]["materiais"] == 1
+        assert data["total_rejeitados"] == 3
+        motivos = {(r["folha"], r["linha"]): r["motivo"] for r in data["rejeitados"]}
+        assert motivos[("Equipamentos", 4)] == "Código em falta"
+        assert motivos[("Equipamentos", 5)] == "Código repetido no ficheiro"
+        assert "stock_minimo" in motivos[("Materiais", 3)]
+
+        self._limpar(sufixo)
+        print("✓ Import counts and per-row rejections")
+
+    def test_reimport_rejects_existing(self):
+        """Test importing the same workbook twice inserts nothing the second time"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        conteudo = self._workbook(sufixo)
+        self._importar(conteudo)
+        response = self._importar(conteudo)
+        assert response.status_code == 200
+        data = response.json()
+        assert all(n == 0 for n in data["imported"].values())
+        assert sum(r["motivo"] == "Código já existe" for r in data["rejeitados"]) == 3
+
+        self._limpar(sufixo)
+        print("✓ Re-import rejects existing keys")
+
+    def test_import_background_job(self):
+        """Test async import returns 202 with a job that finishes with the same result"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        response = requests.post(f"{BASE_URL}/api/import/excel?assincrono=true", files={
+            "file": ("importacao.xlsx", self._workbook(sufixo), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        }, headers=self.headers)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        for _ in range(60):
+            job = requests.get(f"{BASE_URL}/api/jobs/{job_id}", headers=self.headers).json()
+            if job["estado"] in ("concluido", "erro"):
+                break
+            time.sleep(0.5)
+        assert job["estado"] == "concluido"
+        # Progresso em linhas da folha (incluindo as rejeitadas na leitura)
+        assert job["progresso"]["processadas"] == job["progresso"]["total"] == 6
+        assert job["resultado"]["imported"]["equipamentos"] == 2
+        assert job["resultado"]["total_rejeitados"] == 3
+
+        self._limpar(sufixo)
+        print("✓ Background import job completed")
+
+    def test_job_visible_only_to_owner(self):
+        """Test another user gets 404 for a job they did not create"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        response = requests.post(f"{BASE_URL}/api/import/excel?assincrono=true&dry_run=true", files={
+            "file": ("importacao.xlsx", self._workbook(sufixo), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+        }, headers=self.headers)
+        job_id = response.json()["job_id"]
+
+        outro = requests.post(f"{BASE_URL}/api/auth/register", json={
+            "name": "Outro utilizador", "email": f"testjob-{sufixo.lower()}@test.com", "password": "test123"
+        }).json()
+        response = requests.get(f"{BASE_URL}/api/jobs/{job_id}", headers={"Authorization": f"Bearer {outro['access_token']}"})
+        assert response.status_code == 404
+        assert requests.get(f"{BASE_URL}/api/jobs/{job_id}", headers=self.headers).status_code == 200
+        print("✓ Job hidden from other users")
+
+    def test_upsert_dry_run_then_apply(self):
+        """Test dry run reports new/changed/unchanged and upsert applies only the changes"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        self._importar(self._workbook(sufixo))
+
+        wb = Workbook()
+        ws = wb.active
+        ws.title = "Equipamentos"
+        ws.append(["Código", "Descrição", "Categoria"])
+        ws.append([f"TESTIMP-{sufixo}-1", "Equipamento importado", "Nova categoria"])
+        ws.append([f"TESTIMP-{sufixo}-2", "Equipamento importado", None])
+        ws.append([f"TESTIMP-{sufixo}-3", "Equipamento novo", "Outra"])
+        buffer = BytesIO()
+        wb.save(buffer)
+
+        def importar(params):
+            return requests.post(f"{BASE_URL}/api/import/excel?{params}", files={
+                "file": ("upsert.xlsx", buffer.getvalue(), "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+            }, headers=self.headers)
+
+        response = importar("mode=upsert&dry_run=true")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["resumo"]["equipamentos"] == {"novos": 1, "alterados": 1, "inalterados": 1}
+        exemplo = data["exemplos"]["equipamentos"][0]
+        assert exemplo["chave"] == f"TESTIMP-{sufixo}-1"
+        assert exemplo["alteracoes"]["categoria"]["depois"] == "Nova categoria"
+        codigos = {e["codigo"] for e in requests.get(f"{BASE_URL}/api/equipamentos", headers=self.headers).json()}
+        assert f"TESTIMP-{sufixo}-3" not in codigos
+
+        data = importar("mode=upsert").json()
+        assert data["imported"]["equipamentos"] == 1
+        assert data["atualizados"]["equipamentos"] == 1
+        assert data["inalterados"]["equipamentos"] == 1
+        equipamentos = {e["codigo"]: e for e in requests.get(f"{BASE_URL}/api/equipamentos", headers=self.headers).json()}
+        assert equipamentos[f"TESTIMP-{sufixo}-1"]["categoria"] == "Nova categoria"
+        assert equipamentos[f"TESTIMP-{sufixo}-3"]["id"]
+
+        self._limpar(sufixo)
+        print("✓ Upsert dry run and apply")
+
+    def test_unknown_job(self):
+        """Test unknown job id returns 404"""
+        response = requests.get(f"{BASE_URL}/api/jobs/non-existent-id", headers=self.headers)
+        assert response.status_code == 404
+        print("✓ Unknown job returns 404")
+
+    def test_import_rejects_non_excel(self):
+        """Test non-Excel upload returns 400"""
+        response = requests.post(f"{BASE_URL}/api/import/excel", files={
+            "file": ("dados.txt", b"texto", "text/plain")
+        }, headers=self.headers)
+        assert response.status_code == 400
+        print("✓ Non-Excel file rejected")
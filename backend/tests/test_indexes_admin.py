@@ -0,0 +1,104 @@
+"""
+Test suite for database index bootstrap:
+- GET /api/admin/indexes - Declared indexes exist on every collection
+- Unique codigo index rejects duplicates with 400
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestIndexesAdmin:
+    """Test index manager admin endpoint"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def test_admin_indexes_returns_200(self):
+        """Test GET /api/admin/indexes returns 200"""
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=self.headers)
+        assert response.status_code == 200
+        print("✓ GET /api/admin/indexes returns 200")
+
+    def test_admin_indexes_structure(self):
+        """Test every collection reports its indexes and none are missing"""
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=self.headers)
+        data = response.json()
+
+        for collection in ["equipamentos", "viaturas", "materiais", "obras",
+                           "movimentos", "movimentos_stock", "movimentos_viaturas"]:
+            assert collection in data
+            assert "indices" in data[collection]
+            assert "em_falta" in data[collection]
+            assert data[collection]["em_falta"] == [], f"{collection} missing {data[collection]['em_falta']}"
+
+            nomes = [i["nome"] for i in data[collection]["indices"]]
+            assert "id_unique" in nomes
+            for index in data[collection]["indices"]:
+                assert "campos" in index
+                assert "unico" in index
+                assert "utilizacao" in index
+        print("✓ All declared indexes exist")
+
+    def test_admin_indexes_compound_movimentos(self):
+        """Test compound index on movimentos(recurso_id, tipo_recurso, created_at)"""
+        response = requests.get(f"{BASE_URL}/api/admin/indexes", headers=self.headers)
+        indices = {i["nome"]: i for i in response.json()["movimentos"]["indices"]}
+
+        assert "recurso_created_at" in indices
+        campos = [c[0] for c in indices["recurso_created_at"]["campos"]]
+        assert campos == ["recurso_id", "tipo_recurso", "created_at"]
+        print("✓ Compound movimentos index present")
+
+    def test_duplicate_codigo_rejected(self):
+        """Test unique codigo index keeps returning 400 on duplicates"""
+        codigo = f"TEST-IDX-{uuid.uuid4().hex[:6].upper()}"
+        payload = {"codigo": codigo, "descricao": "Teste índice único"}
+
+        first = requests.post(f"{BASE_URL}/api/equipamentos", json=payload, headers=self.headers)
+        assert first.status_code == 200
+
+        second = requests.post(f"{BASE_URL}/api/equipamentos", json=payload, headers=self.headers)
+        assert second.status_code == 400
+
+        requests.delete(f"{BASE_URL}/api/equipamentos/{first.json()['id']}", headers=self.headers)
+        print("✓ Duplicate codigo rejected")
+
+    def test_duplicate_codigo_rejected_on_update(self):
+        """Test a PUT that changes codigo to one in use returns 400, not 500"""
+        codigos = [f"TEST-IDX-{uuid.uuid4().hex[:6].upper()}" for _ in range(2)]
+        ids = []
+        for codigo in codigos:
+            created = requests.post(f"{BASE_URL}/api/equipamentos", json={
+                "codigo": codigo, "descricao": "Teste índice único"
+            }, headers=self.headers)
+            assert created.status_code == 200
+            ids.append(created.json()["id"])
+
+        response = requests.put(f"{BASE_URL}/api/equipamentos/{ids[1]}", json={
+            "codigo": codigos[0], "descricao": "Teste índice único"
+        }, headers=self.headers)
+        assert response.status_code == 400
+        assert response.json()["detail"] == "Código já existe"
+
+        for equipamento_id in ids:
+            requests.delete(f"{BASE_URL}/api/equipamentos/{equipamento_id}", headers=self.headers)
+        print("✓ Duplicate codigo rejected on update")
+
+    def test_admin_indexes_unauthorized(self):
+        """Test endpoint requires authentication"""
+        response = requests.get(f"{BASE_URL}/api/admin/indexes")
+        assert response.status_code in [401, 403]
+        print("✓ Unauthorized access correctly rejected")
@@ -0,0 +1,175 @@
+"""
+Test suite for bulk movement endpoints:
+- POST /api/movimentos/stock/bulk
+- POST /api/movimentos/atribuir/bulk
+- POST /api/movimentos/devolver/bulk
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestMovimentosStockBulk:
+    """Test bulk stock movements (one guia in one request)"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def _criar_material(self, stock):
+        return requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTBK-{uuid.uuid4().hex[:6].upper()}",
+            "descricao": "Material de teste bulk",
+            "stock_atual": stock
+        }, headers=self.headers).json()
+
+    def test_bulk_applies_all_lines(self):
+        """Test every line is recorded and stock deltas are summed per material"""
+        m1, m2 = self._criar_material(10), self._criar_material(20)
+        linhas = [
+            {"material_id": m1["id"], "tipo_movimento": "Entrada", "quantidade": 5},
+            {"material_id": m2["id"], "tipo_movimento": "Saida", "quantidade": 4},
+            {"material_id": m1["id"], "tipo_movimento": "Saida", "quantidade": 2},
+        ]
+        response = requests.post(f"{BASE_URL}/api/movimentos/stock/bulk", json=linhas, headers=self.headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["criados"] == 3
+        assert data["rejeitados"] == 0
+        assert [r["linha"] for r in data["resultados"]] == [0, 1, 2]
+        assert all(r["status"] == "ok" and r["movimento"]["id"] for r in data["resultados"])
+
+        stocks = {m["id"]: m["stock_atual"] for m in requests.get(f"{BASE_URL}/api/materiais", headers=self.headers).json()}
+        assert stocks[m1["id"]] == 13
+        assert stocks[m2["id"]] == 16
+
+        for m in (m1, m2):
+            requests.delete(f"{BASE_URL}/api/materiais/{m['id']}", headers=self.headers)
+        print("✓ Bulk stock movements applied")
+
+    def test_bulk_reports_unknown_material_per_line(self):
+        """Test invalid lines are rejected without blocking the others"""
+        m1 = self._criar_material(1)
+        response = requests.post(f"{BASE_URL}/api/movimentos/stock/bulk", json=[
+            {"material_id": "non-existent-id", "tipo_movimento": "Entrada", "quantidade": 1},
+            {"material_id": m1["id"], "tipo_movimento": "Entrada", "quantidade": 1},
+        ], headers=self.headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["criados"] == 1
+        assert data["rejeitados"] == 1
+        assert data["resultados"][0]["status"] == "erro"
+        assert data["resultados"][0]["erro"] == "Material não encontrado"
+
+        requests.delete(f"{BASE_URL}/api/materiais/{m1['id']}", headers=self.headers)
+        print("✓ Unknown material rejected per line")
+
+    def test_bulk_empty_rejected(self):
+        """Test empty list returns 400"""
+        response = requests.post(f"{BASE_URL}/api/movimentos/stock/bulk", json=[], headers=self.headers)
+        assert response.status_code == 400
+        print("✓ Empty bulk rejected")
+
+
+class TestRecursosBulk:
+    """Test bulk assign / return of equipamentos and viaturas"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token and create two obras, two equipamentos and one viatura"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code != 200:
+            pytest.skip("Authentication failed - skipping tests")
+        self.headers = {"Authorization": f"Bearer {response.json().get('access_token')}"}
+
+        sufixo = uuid.uuid4().hex[:6].upper()
+        self.obras = [
+            requests.post(f"{BASE_URL}/api/obras", json={"codigo": f"TESTBK-{sufixo}-{i}", "nome": f"Obra bulk {i}"},
+                          headers=self.headers).json()
+            for i in range(2)
+        ]
+        self.equipamentos = [
+            requests.post(f"{BASE_URL}/api/equipamentos", json={"codigo": f"TESTBK-{sufixo}-{i}", "descricao": "Equipamento bulk"},
+                          headers=self.headers).json()
+            for i in range(2)
+        ]
+        self.viatura = requests.post(f"{BASE_URL}/api/viaturas", json={"matricula": f"BK-{sufixo}"},
+                                     headers=self.headers).json()
+        yield
+        for e in self.equipamentos:
+            requests.delete(f"{BASE_URL}/api/equipamentos/{e['id']}", headers=self.headers)
+        requests.delete(f"{BASE_URL}/api/viaturas/{self.viatura['id']}", headers=self.headers)
+        for o in self.obras:
+            requests.delete(f"{BASE_URL}/api/obras/{o['id']}", headers=self.headers)
+
+    def test_atribuir_bulk_reports_conflicts(self):
+        """Test mixed assign: free resources assigned, resource in another obra reported"""
+        e1, e2 = self.equipamentos
+        requests.post(f"{BASE_URL}/api/movimentos/atribuir", json={
+            "recurso_id": e2["id"], "tipo_recurso": "equipamento", "obra_id": self.obras[1]["id"]
+        }, headers=self.headers)
+
+        response = requests.post(f"{BASE_URL}/api/movimentos/atribuir/bulk", json={
+            "obra_id": self.obras[0]["id"],
+            "recursos": [
+                {"recurso_id": e1["id"], "tipo_recurso": "equipamento"},
+                {"recurso_id": e2["id"], "tipo_recurso": "equipamento"},
+                {"recurso_id": self.viatura["id"], "tipo_recurso": "viatura"},
+                {"recurso_id": "non-existent-id", "tipo_recurso": "viatura"},
+            ]
+        }, headers=self.headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["criados"] == 2
+        assert data["rejeitados"] == 2
+        status = [r["status"] for r in data["resultados"]]
+        assert status == ["ok", "erro", "ok", "erro"]
+        assert "Obra bulk 1" in data["resultados"][1]["erro"]
+
+        obra = requests.get(f"{BASE_URL}/api/obras/{self.obras[0]['id']}", headers=self.headers).json()
+        assert {e["id"] for e in obra["equipamentos"]} == {e1["id"]}
+        assert {v["id"] for v in obra["viaturas"]} == {self.viatura["id"]}
+        print("✓ Bulk assign with per-item conflicts")
+
+    def test_devolver_bulk(self):
+        """Test returning several resources at once"""
+        recursos = [{"recurso_id": e["id"], "tipo_recurso": "equipamento"} for e in self.equipamentos]
+        requests.post(f"{BASE_URL}/api/movimentos/atribuir/bulk", json={
+            "obra_id": self.obras[0]["id"], "recursos": recursos
+        }, headers=self.headers)
+
+        response = requests.post(f"{BASE_URL}/api/movimentos/devolver/bulk", json={
+            "recursos": recursos + [{"recurso_id": self.viatura["id"], "tipo_recurso": "viatura"}],
+            "responsavel_devolveu": "Teste"
+        }, headers=self.headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["criados"] == 2
+        assert data["resultados"][2]["erro"] == "Este recurso não está atribuído a nenhuma obra"
+
+        obra = requests.get(f"{BASE_URL}/api/obras/{self.obras[0]['id']}", headers=self.headers).json()
+        assert obra["equipamentos"] == []
+        print("✓ Bulk return")
+
+    def test_atribuir_bulk_unknown_obra(self):
+        """Test assigning to a non-existent obra returns 404"""
+        response = requests.post(f"{BASE_URL}/api/movimentos/atribuir/bulk", json={
+            "obra_id": "non-existent-id",
+            "recursos": [{"recurso_id": self.equipamentos[0]["id"], "tipo_recurso": "equipamento"}]
+        }, headers=self.headers)
+        assert response.status_code == 404
+        print("✓ Unknown obra returns 404")
@@ -0,0 +1,94 @@
+"""
+Test suite for keyset pagination on list endpoints:
+- limit / after / total query parameters
+- Pages do not overlap and cover the whole collection
+- Without limit the full list is returned (no 1000-row cap)
+"""
+import pytest
+import requests
+import os
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+LIST_ENDPOINTS = [
+    "/api/equipamentos",
+    "/api/viaturas",
+    "/api/materiais",
+    "/api/obras",
+    "/api/movimentos",
+    "/api/movimentos/stock",
+    "/api/movimentos/viaturas",
+]
+
+class TestPaginacao:
+    """Test cursor pagination on list endpoints"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    @pytest.mark.parametrize("endpoint", LIST_ENDPOINTS)
+    def test_without_limit_returns_list(self, endpoint):
+        """Test legacy behaviour: no limit returns a plain list"""
+        response = requests.get(f"{BASE_URL}{endpoint}", headers=self.headers)
+        assert response.status_code == 200
+        assert isinstance(response.json(), list)
+        print(f"✓ {endpoint} returns list without limit")
+
+    @pytest.mark.parametrize("endpoint", LIST_ENDPOINTS)
+    def test_page_structure(self, endpoint):
+        """Test paginated response structure"""
+        response = requests.get(f"{BASE_URL}{endpoint}?limit=5&total=true", headers=self.headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert "items" in data
+        assert "next_cursor" in data
+        assert "total" in data
+        assert len(data["items"]) <= 5
+        assert isinstance(data["total"], int)
+        print(f"✓ {endpoint} page structure OK (total={data['total']})")
+
+    @pytest.mark.parametrize("endpoint", LIST_ENDPOINTS)
+    def test_pages_cover_collection(self, endpoint):
+        """Test walking every page yields each document once"""
+        full = requests.get(f"{BASE_URL}{endpoint}", headers=self.headers).json()
+
+        ids = []
+        params = {"limit": 50}
+        while True:
+            data = requests.get(f"{BASE_URL}{endpoint}", params=params, headers=self.headers).json()
+            ids.extend(item["id"] for item in data["items"])
+            if not data["next_cursor"]:
+                break
+            params["after"] = data["next_cursor"]
+
+        assert len(ids) == len(set(ids))
+        assert set(ids) == {item["id"] for item in full}
+        print(f"✓ {endpoint} pages cover {len(ids)} documents")
+
+    def test_total_omitted_by_default(self):
+        """Test total is only counted when requested"""
+        response = requests.get(f"{BASE_URL}/api/equipamentos?limit=5", headers=self.headers)
+        assert response.json()["total"] is None
+        print("✓ total omitted by default")
+
+    def test_limit_above_max_rejected(self):
+        """Test limit is capped at 200"""
+        response = requests.get(f"{BASE_URL}/api/equipamentos?limit=1000", headers=self.headers)
+        assert response.status_code == 422
+        print("✓ limit > 200 rejected")
+
+    def test_invalid_cursor_rejected(self):
+        """Test malformed cursor returns 400"""
+        response = requests.get(f"{BASE_URL}/api/equipamentos?limit=5&after=invalido", headers=self.headers)
+        assert response.status_code == 400
+        print("✓ Invalid cursor rejected")
@@ -80,6 +80,66 @@ class TestPdfUpload(TestAuth):
         assert response.status_code in [401, 403], f"Should require auth: {response.status_code}"
         print("✓ PDF upload correctly requires authentication")
 
+    def test_upload_pdf_checks_content_not_content_type(self, headers):
+        """Test that the file signature decides, not the declared content type"""
+        files = {"file": ("fake.pdf", io.BytesIO(b"not really a pdf" * 10), "application/pdf")}
+        response = requests.post(f"{BASE_URL}/api/upload/pdf", files=files, headers=headers)
+        assert response.status_code == 400, f"Should reject fake PDF: {response.status_code}"
+
+        files = {"file": ("manual.bin", io.BytesIO(b"%PDF-1.4\ntest"), "application/octet-stream")}
+        response = requests.post(f"{BASE_URL}/api/upload/pdf", files=files, headers=headers)
+        assert response.status_code == 200, f"PDF with generic content type should be accepted: {response.text}"
+        assert response.json()["url"].endswith(".pdf")
+        print("✓ PDF detected by signature")
+
+    def test_upload_pdf_rejects_too_large(self, headers):
+        """Test that files over 10MB are rejected"""
+        big_content = b"%PDF-1.4\n" + b"0" * (10 * 1024 * 1024 + 1)
+        files = {"file": ("big.pdf", io.BytesIO(big_content), "application/pdf")}
+        response = requests.post(f"{BASE_URL}/api/upload/pdf", files=files, headers=headers)
+
+        assert response.status_code == 400, f"Should reject large PDF: {response.status_code}"
+        assert "10MB" in response.json()["detail"]
+        print("✓ Large PDF rejected")
+
+    def test_upload_image_by_signature(self, headers):
+        """Test that image uploads get the extension of the detected format"""
+        png_content = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+        files = {"file": ("photo.jpg", io.BytesIO(png_content), "image/jpeg")}
+        response = requests.post(f"{BASE_URL}/api/upload", files=files, headers=headers)
+        assert response.status_code == 200, f"Image upload failed: {response.text}"
+        assert response.json()["url"].endswith(".png")
+
+        files = {"file": ("photo.jpg", io.BytesIO(b"%PDF-1.4\ntest"), "image/jpeg")}
+        response = requests.post(f"{BASE_URL}/api/upload", files=files, headers=headers)
+        assert response.status_code == 400, f"Should reject non-image: {response.status_code}"
+        print("✓ Image detected by signature")
+
+    def test_get_upload_range_and_caching(self, headers):
+        """Test uploaded files are served with Range, ETag and immutable caching"""
+        pdf_content = b"%PDF-1.4\n" + bytes(range(256)) * 100
+        files = {"file": ("manual.pdf", io.BytesIO(pdf_content), "application/pdf")}
+        url = requests.post(f"{BASE_URL}/api/upload/pdf", files=files, headers=headers).json()["url"]
+
+        response = requests.get(f"{BASE_URL}{url}")
+        assert response.status_code == 200
+        assert response.content == pdf_content
+        assert "immutable" in response.headers["Cache-Control"]
+        assert response.headers["Accept-Ranges"] == "bytes"
+        etag = response.headers["ETag"]
+
+        response = requests.get(f"{BASE_URL}{url}", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+
+        response = requests.get(f"{BASE_URL}{url}", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.headers["Content-Range"] == f"bytes 100-199/{len(pdf_content)}"
+        assert response.content == pdf_content[100:200]
+
+        response = requests.get(f"{BASE_URL}{url}", headers={"Range": f"bytes={len(pdf_content)}-"})
+        assert response.status_code == 416
+        print("✓ Upload served with Range and caching headers")
+
 
 class TestManutencaoEndpoint(TestAuth):
     """Test PATCH /api/equipamentos/{id}/manutencao endpoint"""
@@ -114,6 +114,33 @@ class TestRelatoriosMovimentos:
             assert "tipo_movimento" in mov
             print(f"✓ Movimentos enriched with resource details")
 
+    def test_relatorio_movimentos_pagination(self, auth_token):
+        """Test rows are paginated while statistics cover the whole filter"""
+        response = requests.get(f"{BASE_URL}/api/relatorios/movimentos?limit=2&offset=0", headers={
+            "Authorization": f"Bearer {auth_token}"
+        })
+        assert response.status_code == 200
+        data = response.json()
+
+        assert "paginacao" in data
+        assert data["paginacao"]["limit"] == 2
+        assert data["paginacao"]["total"] == data["estatisticas"]["total_movimentos"]
+        assert len(data["movimentos"]) <= 2
+
+        stats = data["estatisticas"]
+        assert stats["total_saidas"] + stats["total_devolucoes"] <= stats["total_movimentos"]
+        print(f"✓ Relatorio movimentos paginated: {len(data['movimentos'])} of {data['paginacao']['total']}")
+
+    def test_relatorio_default_limit(self, auth_token):
+        """Test clients that send no limit keep getting up to 1000 rows"""
+        for endpoint in ("movimentos", "stock"):
+            response = requests.get(f"{BASE_URL}/api/relatorios/{endpoint}", headers={
+                "Authorization": f"Bearer {auth_token}"
+            })
+            assert response.status_code == 200
+            assert response.json()["paginacao"]["limit"] == 1000
+        print("✓ Relatorios default limit is 1000")
+
 
 class TestRelatoriosStock:
     """Tests for /api/relatorios/stock endpoint"""
@@ -0,0 +1,92 @@
+"""
+Test suite for the report result cache:
+- Repeated report requests are served from cache (GET /api/admin/cache metrics)
+- Writes to a collection invalidate the cached reports that depend on it
+"""
+import pytest
+import requests
+import os
+import uuid
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+class TestRelatoriosCache:
+    """Test cached relatório endpoints"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def _metricas(self):
+        response = requests.get(f"{BASE_URL}/api/admin/cache", headers=self.headers)
+        assert response.status_code == 200
+        return response.json()["relatorios"]
+
+    def test_repeated_report_is_a_hit(self):
+        """Test the same endpoint and filters twice counts one hit"""
+        filtros = {"ano": 2000 + uuid.uuid4().int % 50}
+        requests.get(f"{BASE_URL}/api/relatorios/movimentos", params=filtros, headers=self.headers)
+        antes = self._metricas()
+        response = requests.get(f"{BASE_URL}/api/relatorios/movimentos", params=filtros, headers=self.headers)
+        assert response.status_code == 200
+        assert self._metricas()["hits"] == antes["hits"] + 1
+        print("✓ Repeated report served from cache")
+
+    def test_write_invalidates_report(self):
+        """Test a stock movement shows up in the cached obra report"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        obra = requests.post(f"{BASE_URL}/api/obras", json={"codigo": f"TESTRC-{sufixo}", "nome": "Obra cache"},
+                             headers=self.headers).json()
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTRC-{sufixo}", "descricao": "Material cache", "stock_atual": 10
+        }, headers=self.headers).json()
+
+        url = f"{BASE_URL}/api/relatorios/obra/{obra['id']}"
+        assert requests.get(url, headers=self.headers).json()["estatisticas"]["movimentos_stock"] == 0
+        requests.post(f"{BASE_URL}/api/movimentos/stock", json={
+            "material_id": material["id"], "tipo_movimento": "Saida", "quantidade": 2, "obra_id": obra["id"]
+        }, headers=self.headers)
+        assert requests.get(url, headers=self.headers).json()["estatisticas"]["movimentos_stock"] == 1
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        requests.delete(f"{BASE_URL}/api/obras/{obra['id']}", headers=self.headers)
+        print("✓ Write invalidates cached report")
+
+    def test_obra_rename_invalidates_utilizacao(self):
+        """Test a renamed obra shows its new name in the cached utilização report"""
+        sufixo = uuid.uuid4().hex[:6].upper()
+        obra = requests.post(f"{BASE_URL}/api/obras", json={"codigo": f"TESTRC-{sufixo}", "nome": "Obra antiga"},
+                             headers=self.headers).json()
+        equipamento = requests.post(f"{BASE_URL}/api/equipamentos", json={
+            "codigo": f"TESTRC-{sufixo}", "descricao": "Equipamento cache"
+        }, headers=self.headers).json()
+        requests.post(f"{BASE_URL}/api/movimentos/atribuir", json={
+            "recurso_id": equipamento["id"], "tipo_recurso": "equipamento", "obra_id": obra["id"]
+        }, headers=self.headers)
+
+        def obra_nome():
+            relatorio = requests.get(f"{BASE_URL}/api/relatorios/utilizacao",
+                                     params={"tipo_recurso": "equipamento", "estado": "em_obra"},
+                                     headers=self.headers).json()
+            return next(e["obra_nome"] for e in relatorio["equipamentos"] if e["id"] == equipamento["id"])
+
+        assert obra_nome() == "Obra antiga"
+        requests.put(f"{BASE_URL}/api/obras/{obra['id']}", json={"codigo": obra["codigo"], "nome": "Obra nova"},
+                     headers=self.headers)
+        assert obra_nome() == "Obra nova"
+
+        requests.post(f"{BASE_URL}/api/movimentos/devolver", json={
+            "recurso_id": equipamento["id"], "tipo_recurso": "equipamento"
+        }, headers=self.headers)
+        requests.delete(f"{BASE_URL}/api/equipamentos/{equipamento['id']}", headers=self.headers)
+        requests.delete(f"{BASE_URL}/api/obras/{obra['id']}", headers=self.headers)
+        print("✓ Obra rename invalidates cached utilização report")
@@ -283,6 +283,42 @@ class TestRelatoriosNovos:
             assert "total_devolucoes" in vt, "Missing 'total_devolucoes' in viatura"
             assert "estado_atual" in vt, "Missing 'estado_atual' in viatura"
     
+    def test_relatorio_utilizacao_sorted_by_usage(self):
+        """ordenar=movimentos should sort resources by total_movimentos descending"""
+        response = requests.get(
+            f"{BASE_URL}/api/relatorios/utilizacao?ordenar=movimentos",
+            headers=self.headers
+        )
+        assert response.status_code == 200
+        
+        data = response.json()
+        for lista in (data["equipamentos"], data["viaturas"]):
+            totais = [r["total_movimentos"] for r in lista]
+            assert totais == sorted(totais, reverse=True)
+    
+    def test_relatorio_utilizacao_pagination(self):
+        """limit/offset should page the lists while statistics cover everything"""
+        completo = requests.get(f"{BASE_URL}/api/relatorios/utilizacao", headers=self.headers).json()
+        response = requests.get(
+            f"{BASE_URL}/api/relatorios/utilizacao?limit=1&offset=0",
+            headers=self.headers
+        )
+        assert response.status_code == 200
+        
+        data = response.json()
+        assert len(data["equipamentos"]) <= 1
+        assert len(data["viaturas"]) <= 1
+        assert data["estatisticas"] == completo["estatisticas"]
+        assert data["paginacao"]["limit"] == 1
+    
+    def test_relatorio_utilizacao_invalid_ordenar(self):
+        """Unknown ordenar value should be rejected"""
+        response = requests.get(
+            f"{BASE_URL}/api/relatorios/utilizacao?ordenar=invalido",
+            headers=self.headers
+        )
+        assert response.status_code == 422
+    
     # ==================== EXISTING REPORTS (Regression) ====================
     
     def test_relatorio_movimentos_returns_200(self):
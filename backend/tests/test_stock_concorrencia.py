@@ -0,0 +1,83 @@
+"""
+Test suite for atomic stock movements (POST /api/movimentos/stock):
+- 1000 parallel movements on one material lose no update
+- Unknown material returns 404
+"""
+import pytest
+import requests
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+N_MOVIMENTOS = 1000
+
+class TestStockConcorrencia:
+    """Test concurrent stock movements"""
+
+    @pytest.fixture(autouse=True)
+    def setup(self):
+        """Get auth token before each test"""
+        response = requests.post(f"{BASE_URL}/api/auth/login", json={
+            "email": "test@test.com",
+            "password": "test123"
+        })
+        if response.status_code == 200:
+            self.token = response.json().get("access_token")
+            self.headers = {"Authorization": f"Bearer {self.token}"}
+        else:
+            pytest.skip("Authentication failed - skipping tests")
+
+    def test_parallel_movements_no_lost_updates(self):
+        """Test final stock equals initial stock plus every movement"""
+        stock_inicial = 10 * N_MOVIMENTOS
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTCC-{uuid.uuid4().hex[:6].upper()}",
+            "descricao": "Material de teste de concorrência",
+            "stock_atual": stock_inicial
+        }, headers=self.headers).json()
+
+        def movimento(i):
+            return requests.post(f"{BASE_URL}/api/movimentos/stock", json={
+                "material_id": material["id"],
+                "tipo_movimento": "Entrada" if i % 2 else "Saida",
+                "quantidade": 3 if i % 2 else 1
+            }, headers=self.headers).status_code
+
+        with ThreadPoolExecutor(max_workers=50) as pool:
+            status = list(pool.map(movimento, range(N_MOVIMENTOS)))
+        assert status.count(200) == N_MOVIMENTOS
+
+        esperado = stock_inicial + (N_MOVIMENTOS // 2) * 3 - (N_MOVIMENTOS // 2) * 1
+        materiais = requests.get(f"{BASE_URL}/api/materiais", headers=self.headers).json()
+        final = next(m for m in materiais if m["id"] == material["id"])
+        assert final["stock_atual"] == esperado
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        print(f"✓ {N_MOVIMENTOS} parallel movements: stock {stock_inicial} -> {final['stock_atual']}")
+
+    def test_movement_returns_new_stock(self):
+        """Test response carries the stock level after the movement"""
+        material = requests.post(f"{BASE_URL}/api/materiais", json={
+            "codigo": f"TESTCC-{uuid.uuid4().hex[:6].upper()}",
+            "descricao": "Material de teste",
+            "stock_atual": 5
+        }, headers=self.headers).json()
+
+        response = requests.post(f"{BASE_URL}/api/movimentos/stock", json={
+            "material_id": material["id"], "tipo_movimento": "Entrada", "quantidade": 2
+        }, headers=self.headers)
+        assert response.status_code == 200
+        assert response.json()["stock_atual"] == 7
+
+        requests.delete(f"{BASE_URL}/api/materiais/{material['id']}", headers=self.headers)
+        print("✓ Movement returns new stock level")
+
+    def test_unknown_material_rejected(self):
+        """Test movement for a non-existent material returns 404"""
+        response = requests.post(f"{BASE_URL}/api/movimentos/stock", json={
+            "material_id": "non-existent-id", "tipo_movimento": "Entrada", "quantidade": 1
+        }, headers=self.headers)
+        assert response.status_code == 404
+        print("✓ Unknown material returns 404")
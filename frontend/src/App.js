@@ -2,7 +2,7 @@ import { useState, useEffect, createContext, useContext } from "react";
 import "@/App.css";
 import { BrowserRouter, Routes, Route, Navigate } from "react-router-dom";
 import axios from "axios";
-import { Toaster } from "@/components/ui/sonner";
+import { Toaster, toast } from "@/components/ui/sonner";
 
 // Pages
 import Login from "@/pages/Login";
@@ -24,6 +24,17 @@ import Layout from "@/components/Layout";
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL;
 export const API = `${BACKEND_URL}/api`;
 
+// Listas completas cortadas pelo servidor (LISTA_COMPLETA_MAX): avisar em vez de mostrar dados em falta
+axios.interceptors.response.use((response) => {
+  if (response.headers["x-truncated"] === "true") {
+    toast.warning(
+      `Lista incompleta: a mostrar ${response.data.length} de ${response.headers["x-total-count"]} registos`,
+      { id: response.config.url }
+    );
+  }
+  return response;
+});
+
 // Register Service Worker for PWA
 if ('serviceWorker' in navigator) {
   window.addEventListener('load', () => {
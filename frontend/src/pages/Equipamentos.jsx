@@ -38,6 +38,7 @@ import ImageUpload from "@/components/ImageUpload";
 import PdfUpload from "@/components/PdfUpload";
 
 const estadoOptions = ["Bom", "Razoável", "Mau"];
+const PAGE_SIZE = 100;
 
 export default function Equipamentos() {
   const { token } = useAuth();
@@ -53,6 +54,8 @@ export default function Equipamentos() {
   const [atribuirDialogOpen, setAtribuirDialogOpen] = useState(false);
   const [selectedItem, setSelectedItem] = useState(null);
   const [searchTerm, setSearchTerm] = useState("");
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [formData, setFormData] = useState({
     codigo: "",
     descricao: "",
@@ -77,17 +80,35 @@ export default function Equipamentos() {
   });
 
   useEffect(() => {
-    fetchData();
+    const fetchObras = async () => {
+      try {
+        const response = await axios.get(`${API}/obras`, { headers: { Authorization: `Bearer ${token}` } });
+        setObras(response.data);
+      } catch (error) {
+        toast.error("Erro ao carregar obras");
+      }
+    };
+    fetchObras();
   }, []);
 
+  // Pesquisa no servidor (com debounce) em vez de filtrar o catálogo completo no browser
+  useEffect(() => {
+    const timeout = setTimeout(() => fetchData(), searchTerm ? 300 : 0);
+    return () => clearTimeout(timeout);
+  }, [searchTerm]);
+
+  const fetchEquipamentosPage = (after = null) => {
+    const term = searchTerm.trim();
+    const url = term ? `${API}/equipamentos/search` : `${API}/equipamentos`;
+    const params = { limit: PAGE_SIZE, ...(term && { q: term }), ...(after && { after }) };
+    return axios.get(url, { params, headers: { Authorization: `Bearer ${token}` } });
+  };
+
   const fetchData = async () => {
     try {
-      const [eqRes, obrasRes] = await Promise.all([
-        axios.get(`${API}/equipamentos`, { headers: { Authorization: `Bearer ${token}` } }),
-        axios.get(`${API}/obras`, { headers: { Authorization: `Bearer ${token}` } })
-      ]);
-      setEquipamentos(eqRes.data);
-      setObras(obrasRes.data);
+      const response = await fetchEquipamentosPage();
+      setEquipamentos(response.data.items);
+      setNextCursor(response.data.next_cursor);
     } catch (error) {
       toast.error("Erro ao carregar dados");
     } finally {
@@ -95,6 +116,19 @@ export default function Equipamentos() {
     }
   };
 
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const response = await fetchEquipamentosPage(nextCursor);
+      setEquipamentos((prev) => [...prev, ...response.data.items]);
+      setNextCursor(response.data.next_cursor);
+    } catch (error) {
+      toast.error("Erro ao carregar dados");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     try {
@@ -204,18 +238,6 @@ export default function Equipamentos() {
     });
   };
 
-  const filtered = equipamentos.filter(e => {
-    const search = searchTerm.toLowerCase();
-    return (
-      e.codigo?.toLowerCase().includes(search) ||
-      e.descricao?.toLowerCase().includes(search) ||
-      e.marca?.toLowerCase().includes(search) ||
-      e.modelo?.toLowerCase().includes(search) ||
-      e.categoria?.toLowerCase().includes(search) ||
-      e.numero_serie?.toLowerCase().includes(search)
-    );
-  });
-
   const getObraName = (obraId) => {
     const obra = obras.find(o => o.id === obraId);
     return obra ? obra.nome : null;
@@ -260,7 +282,7 @@ export default function Equipamentos() {
         />
       </div>
 
-      {filtered.length === 0 ? (
+      {equipamentos.length === 0 ? (
         <div className={`text-center py-12 rounded-lg border ${isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}`}>
           <Wrench className={`h-12 w-12 mx-auto mb-4 ${isDark ? 'text-neutral-600' : 'text-gray-300'}`} />
           <p className={isDark ? 'text-neutral-400' : 'text-gray-500'}>{searchTerm ? "Nenhum resultado encontrado" : "Nenhum equipamento registado"}</p>
@@ -282,7 +304,7 @@ export default function Equipamentos() {
                 </tr>
               </thead>
               <tbody>
-                {filtered.map((item) => (
+                {equipamentos.map((item) => (
                   <tr 
                     key={item.id} 
                     className={`border-b cursor-pointer transition-colors ${item.em_manutencao ? (isDark ? 'bg-amber-500/5' : 'bg-amber-50') : ''} ${isDark ? 'border-neutral-700/50 hover:bg-neutral-700/30' : 'border-gray-100 hover:bg-gray-50'}`}
@@ -363,7 +385,7 @@ export default function Equipamentos() {
 
           {/* Mobile Cards */}
           <div className="md:hidden space-y-3">
-            {filtered.map((item) => (
+            {equipamentos.map((item) => (
               <div 
                 key={item.id}
                 className={`p-4 rounded-lg border cursor-pointer ${item.em_manutencao ? (isDark ? 'bg-red-500/5 border-red-500/30' : 'bg-red-50 border-red-200') : isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}`}
@@ -439,6 +461,14 @@ export default function Equipamentos() {
               </div>
             ))}
           </div>
+
+          {nextCursor && (
+            <div className="flex justify-center mt-6">
+              <Button variant="outline" onClick={loadMore} disabled={loadingMore} className={isDark ? 'border-neutral-600 text-neutral-300' : 'border-gray-300'} data-testid="load-more-btn">
+                {loadingMore ? "A carregar..." : "Carregar mais"}
+              </Button>
+            </div>
+          )}
         </>
       )}
 
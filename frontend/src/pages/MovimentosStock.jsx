@@ -78,7 +78,7 @@ export default function MovimentosStock() {
       resetForm();
       fetchData();
     } catch (error) {
-      toast.error("Erro ao registar movimento");
+      toast.error(error.response?.data?.detail || "Erro ao registar movimento");
     }
   };
 
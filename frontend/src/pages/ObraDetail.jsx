@@ -5,13 +5,14 @@ import axios from "axios";
 import { toast } from "sonner";
 import { 
   ArrowLeft, Building2, Wrench, Truck, Eye, Plus, Package, 
-  ArrowRightLeft, TrendingDown, TrendingUp, RotateCcw, User, Calendar
+  ArrowRightLeft, TrendingDown, TrendingUp, RotateCcw, User, Calendar, Trash2
 } from "lucide-react";
 import { Button } from "@/components/ui/button";
 import { Input } from "@/components/ui/input";
 import { Label } from "@/components/ui/label";
 import { Card, CardContent, CardHeader, CardTitle, CardDescription } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
+import { Checkbox } from "@/components/ui/checkbox";
 import { Tabs, TabsContent, TabsList, TabsTrigger } from "@/components/ui/tabs";
 import {
   Dialog,
@@ -53,12 +54,11 @@ export default function ObraDetail() {
   const [devolverDialog, setDevolverDialog] = useState(false);
   
   // Form data
-  const [selectedEquipamento, setSelectedEquipamento] = useState("");
-  const [selectedViatura, setSelectedViatura] = useState("");
-  const [selectedMaterial, setSelectedMaterial] = useState("");
+  const [selectedEquipamentos, setSelectedEquipamentos] = useState([]);
+  const [selectedViaturas, setSelectedViaturas] = useState([]);
+  const [linhasStock, setLinhasStock] = useState([{ material_id: "", quantidade: "" }]);
   const [responsavel, setResponsavel] = useState("");
   const [observacoes, setObservacoes] = useState("");
-  const [quantidade, setQuantidade] = useState("");
   const [tipoMovStock, setTipoMovStock] = useState("Saida");
   const [recursoDevolver, setRecursoDevolver] = useState(null);
 
@@ -88,71 +88,81 @@ export default function ObraDetail() {
     }
   };
 
-  const handleAtribuirEquipamento = async () => {
-    if (!selectedEquipamento) {
-      toast.error("Selecione um equipamento");
-      return;
-    }
-    try {
-      await axios.post(`${API}/movimentos/atribuir`, {
-        recurso_id: selectedEquipamento,
-        tipo_recurso: "equipamento",
-        obra_id: id,
-        responsavel_levantou: responsavel,
-        observacoes: observacoes
-      }, { headers: { Authorization: `Bearer ${token}` } });
-      
-      toast.success("Equipamento atribuído com sucesso");
-      setAtribuirEquipDialog(false);
-      resetForms();
-      fetchAllData();
-    } catch (error) {
-      toast.error(error.response?.data?.detail || "Erro ao atribuir equipamento");
+  const toggleSelecao = (lista, setLista, recursoId) => {
+    setLista(lista.includes(recursoId) ? lista.filter(x => x !== recursoId) : [...lista, recursoId]);
+  };
+
+  // Resposta dos endpoints /bulk: avisa dos recursos rejeitados e devolve se algum foi processado
+  const mostrarResultadoBulk = (data, mensagemSucesso) => {
+    const { criados, rejeitados, resultados } = data;
+    if (rejeitados > 0) {
+      const erros = [...new Set(resultados.filter(r => r.status === "erro").map(r => r.erro))];
+      toast.error(`${rejeitados} recurso(s) não processado(s): ${erros.join("; ")}`);
     }
+    if (criados > 0) toast.success(mensagemSucesso(criados));
+    return criados > 0;
   };
 
-  const handleAtribuirViatura = async () => {
-    if (!selectedViatura) {
-      toast.error("Selecione uma viatura");
+  const handleAtribuir = async (tipo, ids) => {
+    if (ids.length === 0) {
+      toast.error(tipo === "equipamento" ? "Selecione um equipamento" : "Selecione uma viatura");
       return;
     }
     try {
-      await axios.post(`${API}/movimentos/atribuir`, {
-        recurso_id: selectedViatura,
-        tipo_recurso: "viatura",
+      const res = await axios.post(`${API}/movimentos/atribuir/bulk`, {
+        recursos: ids.map(recurso_id => ({ recurso_id, tipo_recurso: tipo })),
         obra_id: id,
         responsavel_levantou: responsavel,
         observacoes: observacoes
       }, { headers: { Authorization: `Bearer ${token}` } });
       
-      toast.success("Viatura atribuída com sucesso");
-      setAtribuirViaturaDialog(false);
-      resetForms();
-      fetchAllData();
+      const sucesso = mostrarResultadoBulk(res.data, n => 
+        tipo === "equipamento" ? `${n} equipamento(s) atribuído(s) com sucesso` : `${n} viatura(s) atribuída(s) com sucesso`
+      );
+      if (sucesso) {
+        setAtribuirEquipDialog(false);
+        setAtribuirViaturaDialog(false);
+        resetForms();
+        fetchAllData();
+      }
     } catch (error) {
-      toast.error(error.response?.data?.detail || "Erro ao atribuir viatura");
+      toast.error(error.response?.data?.detail || `Erro ao atribuir ${tipo}`);
     }
   };
 
+  const linhasValidas = linhasStock.filter(l => l.material_id && l.quantidade);
+
+  const updateLinhaStock = (index, campo, valor) => {
+    setLinhasStock(linhasStock.map((l, i) => i === index ? { ...l, [campo]: valor } : l));
+  };
+
   const handleMovimentoStock = async () => {
-    if (!selectedMaterial || !quantidade) {
+    if (linhasValidas.length === 0) {
       toast.error("Preencha todos os campos obrigatórios");
       return;
     }
     try {
-      await axios.post(`${API}/movimentos/stock`, {
-        material_id: selectedMaterial,
+      // Todas as linhas da guia num só pedido
+      const res = await axios.post(`${API}/movimentos/stock/bulk`, linhasValidas.map(l => ({
+        material_id: l.material_id,
         tipo_movimento: tipoMovStock,
-        quantidade: parseFloat(quantidade),
+        quantidade: parseFloat(l.quantidade),
         obra_id: id,
         responsavel: responsavel,
         observacoes: observacoes
-      }, { headers: { Authorization: `Bearer ${token}` } });
+      })), { headers: { Authorization: `Bearer ${token}` } });
       
-      toast.success(`Movimento de stock registado (${tipoMovStock})`);
-      setMovimentoStockDialog(false);
-      resetForms();
-      fetchAllData();
+      const { criados, rejeitados, resultados } = res.data;
+      if (rejeitados > 0) {
+        const erros = resultados.filter(r => r.status === "erro").map(r => `Linha ${r.linha + 1}: ${r.erro}`);
+        toast.error(`${rejeitados} linha(s) rejeitada(s) - ${erros.join("; ")}`);
+      }
+      if (criados > 0) {
+        toast.success(`${criados} movimento(s) de stock registado(s) (${tipoMovStock})`);
+        setMovimentoStockDialog(false);
+        resetForms();
+        fetchAllData();
+      }
     } catch (error) {
       toast.error(error.response?.data?.detail || "Erro ao registar movimento");
     }
@@ -161,14 +171,22 @@ export default function ObraDetail() {
   const handleDevolver = async () => {
     if (!recursoDevolver) return;
     try {
-      await axios.post(`${API}/movimentos/devolver`, {
-        recurso_id: recursoDevolver.id,
-        tipo_recurso: recursoDevolver.tipo,
-        responsavel_devolveu: responsavel,
-        observacoes: observacoes
-      }, { headers: { Authorization: `Bearer ${token}` } });
-      
-      toast.success(`${recursoDevolver.tipo === "equipamento" ? "Equipamento" : "Viatura"} devolvido(a) com sucesso`);
+      if (recursoDevolver.todos) {
+        const res = await axios.post(`${API}/movimentos/devolver/bulk`, {
+          recursos: recursoDevolver.itens.map(r => ({ recurso_id: r.id, tipo_recurso: recursoDevolver.tipo })),
+          responsavel_devolveu: responsavel,
+          observacoes: observacoes
+        }, { headers: { Authorization: `Bearer ${token}` } });
+        if (!mostrarResultadoBulk(res.data, n => `${n} recurso(s) devolvido(s) com sucesso`)) return;
+      } else {
+        await axios.post(`${API}/movimentos/devolver`, {
+          recurso_id: recursoDevolver.id,
+          tipo_recurso: recursoDevolver.tipo,
+          responsavel_devolveu: responsavel,
+          observacoes: observacoes
+        }, { headers: { Authorization: `Bearer ${token}` } });
+        toast.success(`${recursoDevolver.tipo === "equipamento" ? "Equipamento" : "Viatura"} devolvido(a) com sucesso`);
+      }
       setDevolverDialog(false);
       setRecursoDevolver(null);
       resetForms();
@@ -183,13 +201,17 @@ export default function ObraDetail() {
     setDevolverDialog(true);
   };
 
+  const openDevolverTodosDialog = (itens, tipo) => {
+    setRecursoDevolver({ todos: true, itens, tipo });
+    setDevolverDialog(true);
+  };
+
   const resetForms = () => {
-    setSelectedEquipamento("");
-    setSelectedViatura("");
-    setSelectedMaterial("");
+    setSelectedEquipamentos([]);
+    setSelectedViaturas([]);
+    setLinhasStock([{ material_id: "", quantidade: "" }]);
     setResponsavel("");
     setObservacoes("");
-    setQuantidade("");
     setTipoMovStock("Saida");
   };
 
@@ -298,13 +320,28 @@ export default function ObraDetail() {
         <TabsContent value="equipamentos">
           <Card className={isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}>
             <CardHeader className="pb-3">
-              <CardTitle className={`flex items-center gap-2 text-lg ${isDark ? 'text-white' : 'text-gray-900'}`}>
-                <Wrench className="h-5 w-5 text-orange-500" />
-                Equipamentos na Obra
-              </CardTitle>
-              <CardDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
-                Equipamentos atualmente atribuídos a esta obra
-              </CardDescription>
+              <div className="flex items-start justify-between gap-2">
+                <div>
+                  <CardTitle className={`flex items-center gap-2 text-lg ${isDark ? 'text-white' : 'text-gray-900'}`}>
+                    <Wrench className="h-5 w-5 text-orange-500" />
+                    Equipamentos na Obra
+                  </CardTitle>
+                  <CardDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
+                    Equipamentos atualmente atribuídos a esta obra
+                  </CardDescription>
+                </div>
+                {equipamentos?.length > 1 && (
+                  <Button 
+                    size="sm" 
+                    variant="outline"
+                    onClick={() => openDevolverTodosDialog(equipamentos, "equipamento")}
+                    className="border-amber-500/50 text-amber-500 hover:bg-amber-500/10"
+                    data-testid="devolver-todos-equipamentos-btn"
+                  >
+                    <RotateCcw className="h-4 w-4 mr-1" /> Devolver todos
+                  </Button>
+                )}
+              </div>
             </CardHeader>
             <CardContent>
               {equipamentos?.length === 0 ? (
@@ -365,13 +402,28 @@ export default function ObraDetail() {
         <TabsContent value="viaturas">
           <Card className={isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}>
             <CardHeader className="pb-3">
-              <CardTitle className={`flex items-center gap-2 text-lg ${isDark ? 'text-white' : 'text-gray-900'}`}>
-                <Truck className="h-5 w-5 text-orange-500" />
-                Viaturas na Obra
-              </CardTitle>
-              <CardDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
-                Viaturas atualmente atribuídas a esta obra
-              </CardDescription>
+              <div className="flex items-start justify-between gap-2">
+                <div>
+                  <CardTitle className={`flex items-center gap-2 text-lg ${isDark ? 'text-white' : 'text-gray-900'}`}>
+                    <Truck className="h-5 w-5 text-orange-500" />
+                    Viaturas na Obra
+                  </CardTitle>
+                  <CardDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
+                    Viaturas atualmente atribuídas a esta obra
+                  </CardDescription>
+                </div>
+                {viaturas?.length > 1 && (
+                  <Button 
+                    size="sm" 
+                    variant="outline"
+                    onClick={() => openDevolverTodosDialog(viaturas, "viatura")}
+                    className="border-amber-500/50 text-amber-500 hover:bg-amber-500/10"
+                    data-testid="devolver-todos-viaturas-btn"
+                  >
+                    <RotateCcw className="h-4 w-4 mr-1" /> Devolver todos
+                  </Button>
+                )}
+              </div>
             </CardHeader>
             <CardContent>
               {viaturas?.length === 0 ? (
@@ -435,28 +487,24 @@ export default function ObraDetail() {
           <DialogHeader>
             <DialogTitle className={isDark ? 'text-white' : 'text-gray-900'}>Atribuir Equipamento à Obra</DialogTitle>
             <DialogDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
-              Selecione um equipamento disponível para atribuir a "{obra.nome}"
+              Selecione os equipamentos disponíveis para atribuir a "{obra.nome}"
             </DialogDescription>
           </DialogHeader>
           <div className="space-y-4 py-4">
             <div className="space-y-2">
-              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Equipamento *</Label>
-              <Select value={selectedEquipamento} onValueChange={setSelectedEquipamento}>
-                <SelectTrigger className={isDark ? 'bg-neutral-800 border-neutral-700 text-white' : 'bg-white border-gray-300 text-gray-900'}>
-                  <SelectValue placeholder="Selecione um equipamento" />
-                </SelectTrigger>
-                <SelectContent className={isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}>
-                  {equipamentosDisponiveis.length === 0 ? (
-                    <div className={`p-3 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-500'}`}>Nenhum equipamento disponível</div>
-                  ) : (
-                    equipamentosDisponiveis.map(e => (
-                      <SelectItem key={e.id} value={e.id} className={isDark ? 'text-white' : 'text-gray-900'}>
-                        {e.codigo} - {e.descricao}
-                      </SelectItem>
-                    ))
-                  )}
-                </SelectContent>
-              </Select>
+              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Equipamentos *</Label>
+              <div className={`max-h-60 overflow-y-auto rounded-md border p-2 space-y-1 ${isDark ? 'border-neutral-700 bg-neutral-800' : 'border-gray-300 bg-white'}`} data-testid="lista-equipamentos-disponiveis">
+                {equipamentosDisponiveis.length === 0 ? (
+                  <div className={`p-3 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-500'}`}>Nenhum equipamento disponível</div>
+                ) : (
+                  equipamentosDisponiveis.map(r => (
+                    <label key={r.id} className={`flex items-center gap-2 p-1 rounded cursor-pointer text-sm ${isDark ? 'text-white hover:bg-neutral-700' : 'text-gray-900 hover:bg-gray-50'}`}>
+                      <Checkbox checked={selectedEquipamentos.includes(r.id)} onCheckedChange={() => toggleSelecao(selectedEquipamentos, setSelectedEquipamentos, r.id)} />
+                      {r.codigo} - {r.descricao}
+                    </label>
+                  ))
+                )}
+              </div>
             </div>
             <div className="space-y-2">
               <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Responsável pelo Levantamento</Label>
@@ -481,8 +529,8 @@ export default function ObraDetail() {
             <Button type="button" variant="outline" onClick={() => setAtribuirEquipDialog(false)} className={isDark ? 'border-neutral-600 text-neutral-300 hover:bg-neutral-800' : ''}>
               Cancelar
             </Button>
-            <Button onClick={handleAtribuirEquipamento} className="bg-orange-500 hover:bg-orange-600 text-black font-semibold" disabled={!selectedEquipamento}>
-              Atribuir
+            <Button onClick={() => handleAtribuir("equipamento", selectedEquipamentos)} className="bg-orange-500 hover:bg-orange-600 text-black font-semibold" disabled={selectedEquipamentos.length === 0}>
+              Atribuir{selectedEquipamentos.length > 1 ? ` (${selectedEquipamentos.length})` : ""}
             </Button>
           </DialogFooter>
         </DialogContent>
@@ -494,28 +542,24 @@ export default function ObraDetail() {
           <DialogHeader>
             <DialogTitle className={isDark ? 'text-white' : 'text-gray-900'}>Atribuir Viatura à Obra</DialogTitle>
             <DialogDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
-              Selecione uma viatura disponível para atribuir a "{obra.nome}"
+              Selecione as viaturas disponíveis para atribuir a "{obra.nome}"
             </DialogDescription>
           </DialogHeader>
           <div className="space-y-4 py-4">
             <div className="space-y-2">
-              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Viatura *</Label>
-              <Select value={selectedViatura} onValueChange={setSelectedViatura}>
-                <SelectTrigger className={isDark ? 'bg-neutral-800 border-neutral-700 text-white' : 'bg-white border-gray-300 text-gray-900'}>
-                  <SelectValue placeholder="Selecione uma viatura" />
-                </SelectTrigger>
-                <SelectContent className={isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}>
-                  {viaturasDisponiveis.length === 0 ? (
-                    <div className={`p-3 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-500'}`}>Nenhuma viatura disponível</div>
-                  ) : (
-                    viaturasDisponiveis.map(v => (
-                      <SelectItem key={v.id} value={v.id} className={isDark ? 'text-white' : 'text-gray-900'}>
-                        {v.matricula} - {v.marca} {v.modelo}
-                      </SelectItem>
-                    ))
-                  )}
-                </SelectContent>
-              </Select>
+              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Viaturas *</Label>
+              <div className={`max-h-60 overflow-y-auto rounded-md border p-2 space-y-1 ${isDark ? 'border-neutral-700 bg-neutral-800' : 'border-gray-300 bg-white'}`} data-testid="lista-viaturas-disponiveis">
+                {viaturasDisponiveis.length === 0 ? (
+                  <div className={`p-3 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-500'}`}>Nenhuma viatura disponível</div>
+                ) : (
+                  viaturasDisponiveis.map(r => (
+                    <label key={r.id} className={`flex items-center gap-2 p-1 rounded cursor-pointer text-sm ${isDark ? 'text-white hover:bg-neutral-700' : 'text-gray-900 hover:bg-gray-50'}`}>
+                      <Checkbox checked={selectedViaturas.includes(r.id)} onCheckedChange={() => toggleSelecao(selectedViaturas, setSelectedViaturas, r.id)} />
+                      {r.matricula} - {r.marca} {r.modelo}
+                    </label>
+                  ))
+                )}
+              </div>
             </div>
             <div className="space-y-2">
               <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Responsável pelo Levantamento</Label>
@@ -540,8 +584,8 @@ export default function ObraDetail() {
             <Button type="button" variant="outline" onClick={() => setAtribuirViaturaDialog(false)} className={isDark ? 'border-neutral-600 text-neutral-300 hover:bg-neutral-800' : ''}>
               Cancelar
             </Button>
-            <Button onClick={handleAtribuirViatura} className="bg-orange-500 hover:bg-orange-600 text-black font-semibold" disabled={!selectedViatura}>
-              Atribuir
+            <Button onClick={() => handleAtribuir("viatura", selectedViaturas)} className="bg-orange-500 hover:bg-orange-600 text-black font-semibold" disabled={selectedViaturas.length === 0}>
+              Atribuir{selectedViaturas.length > 1 ? ` (${selectedViaturas.length})` : ""}
             </Button>
           </DialogFooter>
         </DialogContent>
@@ -574,35 +618,44 @@ export default function ObraDetail() {
               </Select>
             </div>
             <div className="space-y-2">
-              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Material *</Label>
-              <Select value={selectedMaterial} onValueChange={setSelectedMaterial}>
-                <SelectTrigger className={isDark ? 'bg-neutral-800 border-neutral-700 text-white' : 'bg-white border-gray-300 text-gray-900'}>
-                  <SelectValue placeholder="Selecione um material" />
-                </SelectTrigger>
-                <SelectContent className={isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}>
-                  {materiais.length === 0 ? (
-                    <div className={`p-3 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-500'}`}>Nenhum material registado</div>
-                  ) : (
-                    materiais.map(m => (
-                      <SelectItem key={m.id} value={m.id} className={isDark ? 'text-white' : 'text-gray-900'}>
-                        {m.codigo} - {m.descricao} ({m.stock_atual || 0} {m.unidade})
-                      </SelectItem>
-                    ))
+              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Materiais *</Label>
+              {linhasStock.map((linha, index) => (
+                <div key={index} className="flex gap-2">
+                  <Select value={linha.material_id} onValueChange={(v) => updateLinhaStock(index, "material_id", v)}>
+                    <SelectTrigger className={`flex-1 ${isDark ? 'bg-neutral-800 border-neutral-700 text-white' : 'bg-white border-gray-300 text-gray-900'}`}>
+                      <SelectValue placeholder="Selecione um material" />
+                    </SelectTrigger>
+                    <SelectContent className={isDark ? 'bg-neutral-800 border-neutral-700' : 'bg-white border-gray-200'}>
+                      {materiais.length === 0 ? (
+                        <div className={`p-3 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-500'}`}>Nenhum material registado</div>
+                      ) : (
+                        materiais.map(m => (
+                          <SelectItem key={m.id} value={m.id} className={isDark ? 'text-white' : 'text-gray-900'}>
+                            {m.codigo} - {m.descricao} ({m.stock_atual || 0} {m.unidade})
+                          </SelectItem>
+                        ))
+                      )}
+                    </SelectContent>
+                  </Select>
+                  <Input 
+                    type="number"
+                    value={linha.quantidade} 
+                    onChange={(e) => updateLinhaStock(index, "quantidade", e.target.value)} 
+                    placeholder="Qtd."
+                    min="0"
+                    step="0.01"
+                    className={`w-24 ${isDark ? 'bg-neutral-800 border-neutral-700 text-white' : 'bg-white border-gray-300 text-gray-900'}`}
+                  />
+                  {linhasStock.length > 1 && (
+                    <Button type="button" variant="ghost" size="sm" onClick={() => setLinhasStock(linhasStock.filter((_, i) => i !== index))}>
+                      <Trash2 className="h-4 w-4 text-red-500" />
+                    </Button>
                   )}
-                </SelectContent>
-              </Select>
-            </div>
-            <div className="space-y-2">
-              <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Quantidade *</Label>
-              <Input 
-                type="number"
-                value={quantidade} 
-                onChange={(e) => setQuantidade(e.target.value)} 
-                placeholder="Quantidade"
-                min="0"
-                step="0.01"
-                className={isDark ? 'bg-neutral-800 border-neutral-700 text-white' : 'bg-white border-gray-300 text-gray-900'}
-              />
+                </div>
+              ))}
+              <Button type="button" variant="link" onClick={() => setLinhasStock([...linhasStock, { material_id: "", quantidade: "" }])} className="text-orange-500 px-0">
+                <Plus className="h-4 w-4 mr-1" /> Adicionar linha
+              </Button>
             </div>
             <div className="space-y-2">
               <Label className={isDark ? 'text-neutral-300' : 'text-gray-700'}>Responsável</Label>
@@ -627,8 +680,8 @@ export default function ObraDetail() {
             <Button type="button" variant="outline" onClick={() => setMovimentoStockDialog(false)} className={isDark ? 'border-neutral-600 text-neutral-300 hover:bg-neutral-800' : ''}>
               Cancelar
             </Button>
-            <Button onClick={handleMovimentoStock} className="bg-orange-500 hover:bg-orange-600 text-black font-semibold" disabled={!selectedMaterial || !quantidade}>
-              Registar
+            <Button onClick={handleMovimentoStock} className="bg-orange-500 hover:bg-orange-600 text-black font-semibold" disabled={linhasValidas.length === 0}>
+              Registar{linhasValidas.length > 1 ? ` (${linhasValidas.length})` : ""}
             </Button>
           </DialogFooter>
         </DialogContent>
@@ -638,9 +691,17 @@ export default function ObraDetail() {
       <Dialog open={devolverDialog} onOpenChange={setDevolverDialog}>
         <DialogContent className={`sm:max-w-lg ${isDark ? 'bg-neutral-900 border-neutral-700' : 'bg-white'}`}>
           <DialogHeader>
-            <DialogTitle className={isDark ? 'text-white' : 'text-gray-900'}>Devolver {recursoDevolver?.tipo === "equipamento" ? "Equipamento" : "Viatura"}</DialogTitle>
+            <DialogTitle className={isDark ? 'text-white' : 'text-gray-900'}>
+              Devolver {recursoDevolver?.todos
+                ? (recursoDevolver.tipo === "equipamento" ? "Equipamentos" : "Viaturas")
+                : (recursoDevolver?.tipo === "equipamento" ? "Equipamento" : "Viatura")}
+            </DialogTitle>
             <DialogDescription className={isDark ? 'text-neutral-400' : 'text-gray-500'}>
-              Confirmar devolução de: <span className="text-orange-500 font-medium">{recursoDevolver?.codigo || recursoDevolver?.matricula}</span>
+              Confirmar devolução de: <span className="text-orange-500 font-medium">
+                {recursoDevolver?.todos
+                  ? recursoDevolver.itens.map(r => r.codigo || r.matricula).join(", ")
+                  : recursoDevolver?.codigo || recursoDevolver?.matricula}
+              </span>
             </DialogDescription>
           </DialogHeader>
           <div className="space-y-4 py-4">
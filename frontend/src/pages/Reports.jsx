@@ -36,6 +36,11 @@ const anos = Array.from({ length: 5 }, (_, i) => {
   return { value: String(ano), label: String(ano) };
 });
 
+// Espera pelo job de importação: intervalo entre consultas a crescer até ao máximo, com limite total
+const JOB_INTERVALO_INICIAL_MS = 500;
+const JOB_INTERVALO_MAXIMO_MS = 5000;
+const JOB_ESPERA_MAXIMA_MS = 10 * 60 * 1000;
+
 export default function Reports() {
   const { token } = useAuth();
   const { theme } = useTheme();
@@ -93,6 +98,7 @@ export default function Reports() {
       if (filtroMes && filtroMes !== "all") params.append("mes", filtroMes);
       if (filtroAno) params.append("ano", filtroAno);
       if (filtroTipoRecurso && filtroTipoRecurso !== "all") params.append("tipo_recurso", filtroTipoRecurso);
+      params.append("limit", "20");
       
       const response = await axios.get(`${API}/relatorios/movimentos?${params}`, {
         headers: { Authorization: `Bearer ${token}` }
@@ -269,14 +275,20 @@ export default function Reports() {
     formData.append('file', file);
 
     try {
-      const response = await axios.post(`${API}/import/excel`, formData, {
+      const response = await axios.post(`${API}/import/excel?assincrono=true`, formData, {
         headers: { 
           Authorization: `Bearer ${token}`,
           'Content-Type': 'multipart/form-data'
         }
       });
       
-      const { imported } = response.data;
+      const job = await aguardarJob(response.data.job_id);
+      if (job.estado === "erro") {
+        toast.error(job.erro || "Erro ao importar ficheiro");
+        return;
+      }
+      
+      const { imported, total_rejeitados } = job.resultado;
       const total = (imported.equipamentos || 0) + (imported.viaturas || 0) + (imported.materiais || 0) + (imported.obras || 0);
       
       if (total > 0) {
@@ -285,6 +297,9 @@ export default function Reports() {
       } else {
         toast.info("Nenhum registo novo importado. Verifique se os códigos já existem no sistema.");
       }
+      if (total_rejeitados > 0) {
+        toast.warning(`${total_rejeitados} linha(s) rejeitada(s) na importação`);
+      }
     } catch (error) {
       toast.error(error.response?.data?.detail || "Erro ao importar ficheiro");
     } finally {
@@ -295,6 +310,23 @@ export default function Reports() {
     }
   };
 
+  // Consultar o job de importação até terminar (ou até se esgotar a espera máxima)
+  const aguardarJob = async (jobId) => {
+    const limite = Date.now() + JOB_ESPERA_MAXIMA_MS;
+    let intervalo = JOB_INTERVALO_INICIAL_MS;
+    while (Date.now() < limite) {
+      const response = await axios.get(`${API}/jobs/${jobId}`, {
+        headers: { Authorization: `Bearer ${token}` }
+      });
+      if (response.data.estado === "concluido" || response.data.estado === "erro") {
+        return response.data;
+      }
+      await new Promise((resolve) => setTimeout(resolve, intervalo));
+      intervalo = Math.min(intervalo * 2, JOB_INTERVALO_MAXIMO_MS);
+    }
+    return { estado: "erro", erro: "A importação está a demorar demasiado. Verifique mais tarde se os dados foram importados." };
+  };
+
   const formatDate = (dateStr) => {
     if (!dateStr) return "-";
     try {
@@ -637,9 +669,9 @@ export default function Reports() {
                         ))}
                       </tbody>
                     </table>
-                    {relatorioMovimentos.movimentos.length > 20 && (
+                    {relatorioMovimentos.paginacao.total > relatorioMovimentos.movimentos.length && (
                       <p className={`text-center py-2 text-sm ${isDark ? 'text-neutral-500' : 'text-gray-400'}`}>
-                        A mostrar 20 de {relatorioMovimentos.movimentos.length} movimentos
+                        A mostrar {relatorioMovimentos.movimentos.length} de {relatorioMovimentos.paginacao.total} movimentos
                       </p>
                     )}
                   </div>